@@ -58,6 +58,11 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from tmdb.loader import load_movies
+from tmdb.correlation import corr_matrix
+from tmdb.groupby import group_count, group_mean
+from tmdb.multivalue import MultiValueIndex, build_indexes
+from tmdb import dates, regression, topk
 
 pd.options.display.float_format = '{:.2f}'.format
 
@@ -72,7 +77,8 @@ pd.options.display.float_format = '{:.2f}'.format
 # In[2]:
 
 
-df = pd.read_csv('tmdb-movies.csv')   
+# typed read: fixed numeric dtypes, categorical director and release_date parsed in the same pass
+df = load_movies('tmdb-movies.csv')
 pd.set_option('display.max_columns', None)  # to display all columns for a better view of the data
 
 
@@ -125,11 +131,12 @@ print("Afetr Removing Unnecessary Columns (Rows,Columns) : ",df.shape)
 
 
 # <b>2. Changing format of release date to datetime</b>
+# 
+# > `load_movies` already parses the release date while reading the csv, so no extra `to_datetime` pass is needed.
 
 # In[6]:
 
 
-df['release_date'] = pd.to_datetime(df['release_date'])
 df['release_date'].head()
 
 
@@ -181,6 +188,9 @@ df.replace(0, np.nan , inplace=True)
 #calculate Profit for each of the movie and add a new column in the dataframe named 'Profit'
 df['Profit'] = df['revenue'] - df['budget']
 
+# split the pipe separated columns (cast, genres, production_companies) once into integer coded indexes
+split_index = build_indexes(df)
+
 # this function sets the attribue of the graph so we dont have to write the same code again and again
 def set_data(ax,title , x,y):
     plt.title(title,fontsize=13)
@@ -193,22 +203,18 @@ def set_data(ax,title , x,y):
 
    # this function finds mimimum and maximum of any given column     
 def find_minmax(x):
-    #use the function 'idmin' to find the index of lowest profit movie.
-    min_index = df[x].idxmin()
-    #use the function 'idmax' to find the index of Highest profit movie.
-    high_index = df[x].idxmax()
-    high = pd.DataFrame(df.loc[high_index,:])
-    low = pd.DataFrame(df.loc[min_index,:])
+    #the highest and the lowest movie come from the sorted index of the column (sorted once, reused by top_10 and small_10)
+    minmax = topk.minmax(df, x)
     #print the movie with high and low profit
-    print("Movie Which Has Highest "+ x + " : ",df['original_title'][high_index])
-    print("Movie Which Has Lowest "+ x + "  : ",df['original_title'][min_index])
-    return pd.concat([high,low],axis = 1)
+    print("Movie Which Has Highest "+ x + " : ",minmax.iloc[:, 0]['original_title'])
+    print("Movie Which Has Lowest "+ x + "  : ",minmax.iloc[:, 1]['original_title'])
+    return minmax
 
 
 # this function returns 10 largest values from a particular column
 # this function also takes x as argument then finds 10 highest values and plots a graph.
 def top_10(x):
-    top_10 = df.nlargest(10, x)
+    top_10 = topk.top(df, x, 10)
     print(top_10[[ x , 'original_title']])
     data = list(map(str,(top_10['original_title'])))
     x_axis = list(data[:10])
@@ -226,7 +232,7 @@ def top_10(x):
 # this function returns 10 largest values from a particular column
 # this function also takes x as argument then finds 10 highest values and plots a graph.
 def small_10(x):
-    small_10 = df.nsmallest(10, x)
+    small_10 = topk.bottom(df, x, 10)
     print(small_10[[ x , 'original_title']])
     data = list(map(str,(small_10['original_title'])))
     x_axis = list(data[:10])
@@ -242,7 +248,7 @@ def small_10(x):
     
 # this function compartes two columnns and plots the graph of it    
 def compare_two_y(x,y):
-    df.groupby(x)[y].mean().plot(figsize = (13,5),xticks=np.arange(0,1000,100))
+    group_mean(df,x,y).plot(figsize = (13,5),xticks=np.arange(0,1000,100))
     #setup the title of the figure
     plt.title(x + " Vs " + y,fontsize = 14)
     #setup the x-label and y-label of the plot.
@@ -255,7 +261,8 @@ def compare_two_y(x,y):
   # this function compartes two columnns and plots the graph of it    
 
 def compare_two_x(x,y):
-    df.groupby(x).mean()[y].plot(figsize = (13,5))
+    #only y is averaged, not every column of the frame.
+    group_mean(df,x,y).plot(figsize = (13,5))
     #setup the figure size.
     sns.set(rc={'figure.figsize':(10,5)})
     #setup the title of the figure
@@ -268,19 +275,19 @@ def compare_two_x(x,y):
     
 # this function plots reg i simplified the code in just 2 lines    
 def reg_plot(x,y):
-    ax = sns.regplot(x=df[x], y=df[y],color='c')
+    #closed-form fit and band instead of seaborn's 1000 bootstrap refits; large tables are drawn from a sample.
+    ax = regression.plot(plt.gca(), df[x], df[y], color='c')
     set_data(ax,x,y)
 
     # this function finds correlation between two objects
 def corr(x,y):
-    data_corr = df.corr()
-    print("Correlation Between " + x + " And "   + y,data_corr.loc[x,y])
+    #the matrix is computed on the first call and looked up afterwards.
+    data_corr = corr_matrix(df)
+    print("Correlation Between " + x + " And "   + y,data_corr.get(x,y))
     
 def Month_Release():
-    #extract the month number from the release date.
-    month_release = df['release_date'].dt.month
-    #count the movies in each month using value_counts().
-    number_of_release = month_release.value_counts().sort_index()
+    #count the movies in each month from the month numbers of the release date index (built once per frame).
+    number_of_release = dates.date_index(df).month_counts()
     months=['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
     number_of_release = pd.DataFrame(number_of_release)
     number_of_release['month'] = months
@@ -291,12 +298,11 @@ def Month_Release():
     set_data_mat(plt,'Month','Number Of Movie Release')
     
 def count_split_data(x):
-    #concatenate all the rows of the genrs.
-    data_plot = df[x].str.cat(sep = '|')
-    data = pd.Series(data_plot.split('|'))
-    #conts each of the genre and return.
-    info = data.value_counts(ascending=False)
-    return info
+    #columns that were not indexed after cleaning are split on first use.
+    if x not in split_index:
+        split_index[x] = MultiValueIndex.from_series(df[x])
+    #counts each of the values (largest first) and return.
+    return split_index[x].counts()
 
 def count_genre():
     #call the function for counting the movies of each genre.
@@ -352,7 +358,7 @@ def frequent_actor():
  
 
 def plot_correlation_map( df ):
-    corr = df.corr()
+    corr = corr_matrix(df).matrix
     _ , ax = plt.subplots( figsize =( 12 , 10 ) )
     cmap = sns.diverging_palette( 240 , 10 , as_cmap = True )
     _ = sns.heatmap(corr,cmap = cmap,square=True, cbar_kws={ 'shrink' : .9 }, ax=ax, annot = True, annot_kws = { 'fontsize' : 12 })
@@ -372,8 +378,9 @@ def plot_correlation_map( df ):
 
 
 # calculate max for setting upper bound of the graph
-max_movies=df.groupby('release_year').count()['id'].max()
-df.groupby('release_year').count()['id'].plot(ylim=(0,max_movies))
+movies_per_year=group_count(df,'release_year','id')
+max_movies=movies_per_year.max()
+movies_per_year.plot(ylim=(0,max_movies))
 
 #set the figure size and labels
 sns.set(rc={'figure.figsize':(8,5)})
@@ -0,0 +1,35 @@
+# Shared fixtures: the movie csv the tests run on.
+#
+# tmdb-movies.csv is used when it sits in the repository root; otherwise a synthetic csv of the
+# same shape (tmdb.synthetic) is written once per test session.
+
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def movies_csv(tmp_path_factory):
+    path = os.path.join(ROOT, 'tmdb-movies.csv')
+    if os.path.exists(path):
+        return path
+    from tmdb.synthetic import write_csv
+
+    return write_csv(str(tmp_path_factory.mktemp('data') / 'tmdb-movies.csv'))
+
+
+# the cleaned movie table of movies_csv
+@pytest.fixture(scope='session')
+def movies(movies_csv):
+    from tmdb.cleaning import clean_movies
+    from tmdb.loader import load_movies
+
+    return clean_movies(load_movies(movies_csv))
+
+
+# environment for a python subprocess that imports tmdb from this checkout
+@pytest.fixture
+def repo_env():
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
@@ -0,0 +1,40 @@
+# tmdb.cache: the snapshot gives back the table clean_table builds, and every write goes through a
+# temporary file of its own that is moved into place only when the write completes.
+
+import os
+
+import pandas as pd
+import pytest
+
+from tmdb.cache import atomic_path, clean_table, load_clean
+
+
+def test_snapshot_like_clean_table(movies_csv, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    expected = clean_table(movies_csv)
+    pd.testing.assert_frame_equal(load_clean(movies_csv, cache_dir), expected)
+    # the second call reads the snapshot
+    pd.testing.assert_frame_equal(load_clean(movies_csv, cache_dir), expected)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith('.tmp')]
+
+
+def test_atomic_path(tmp_path):
+    path = str(tmp_path / 'table.feather')
+    with atomic_path(path) as first, atomic_path(path) as second:
+        # two writers at once each get their own file
+        assert first != second
+        assert os.path.dirname(first) == os.path.dirname(path)
+        with open(first, 'w') as f:
+            f.write('first')
+        with open(second, 'w') as f:
+            f.write('second')
+    with open(path) as f:
+        assert f.read() == 'first'
+    with pytest.raises(RuntimeError):
+        with atomic_path(path) as tmp:
+            with open(tmp, 'w') as f:
+                f.write('partial')
+            raise RuntimeError
+    with open(path) as f:
+        assert f.read() == 'first'
+    assert os.listdir(str(tmp_path)) == ['table.feather']
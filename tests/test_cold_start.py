@@ -0,0 +1,46 @@
+# Cold start of python -m tmdb: the compute only imports stay within a budget and --no-plots never
+# imports the plotting stack.
+
+import subprocess
+import sys
+
+from tmdb.cli import COMPUTE_IMPORTS, importtime, import_report
+
+# measured at about 460 ms (pandas ~190 ms, numpy ~90 ms) on a one core container; the budget leaves
+# room for slower machines, not for a new eager import of seaborn or pyplot (~700 ms more)
+IMPORT_BUDGET_MS = 1000
+
+PLOTTING = ('matplotlib', 'seaborn')
+
+
+def _plotting(modules):
+    return sorted({module.split('.')[0] for module in modules} & set(PLOTTING))
+
+
+def test_compute_imports_within_budget():
+    total, slowest = import_report(COMPUTE_IMPORTS)
+    assert total < IMPORT_BUDGET_MS, "compute imports took %.0f ms: %s" % (total, slowest)
+
+
+def test_compute_imports_skip_plotting():
+    assert _plotting(module for module, _, _, _ in importtime(COMPUTE_IMPORTS)) == []
+
+
+def test_import_budget_flag(tmp_path, repo_env):
+    missing = str(tmp_path / 'missing.csv')
+    ok = subprocess.run([sys.executable, '-m', 'tmdb', missing, '--no-plots', '--import-budget', str(IMPORT_BUDGET_MS)],
+                        capture_output=True, text=True, env=repo_env)
+    assert ok.returncode == 0, ok.stdout + ok.stderr
+    over = subprocess.run([sys.executable, '-m', 'tmdb', missing, '--no-plots', '--import-budget', '0'],
+                          capture_output=True, text=True, env=repo_env)
+    assert over.returncode == 1
+    assert 'over the budget' in over.stdout
+
+
+def test_no_plots_run_skips_plotting(tmp_path, movies_csv, repo_env):
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'tmdb', movies_csv, '--no-plots', '--quiet'],
+                          capture_output=True, text=True, env=repo_env, cwd=tmp_path)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert 'answered' in proc.stdout
+    modules = [line.rsplit('|', 1)[-1].strip() for line in proc.stderr.splitlines() if line.startswith('import time:')]
+    assert _plotting(modules) == []
@@ -0,0 +1,22 @@
+# tmdb.compact: every column keeps its values and never takes more memory than before.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.compact import compact, memory_report
+
+
+def test_columns_only_shrink(movies):
+    df = compact(movies)
+    report = memory_report(movies, df)
+    assert (report['ratio'] >= 1).all()
+    # Int64 with a mask is larger than float64; a categorical of strings seen once is larger too
+    assert df['revenue'].dtype == movies['revenue'].dtype
+    assert df['cast'].dtype == movies['cast'].dtype
+    assert isinstance(df['genres'].dtype, pd.CategoricalDtype)
+    for name in movies.columns:
+        if pd.api.types.is_numeric_dtype(movies[name]):
+            np.testing.assert_array_equal(df[name].to_numpy(dtype=np.float64, na_value=np.nan),
+                                          movies[name].to_numpy(dtype=np.float64, na_value=np.nan))
+        else:
+            pd.testing.assert_series_equal(df[name].astype(object), movies[name].astype(object))
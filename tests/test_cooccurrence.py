@@ -0,0 +1,101 @@
+# tmdb.cooccurrence: the pair counts, partners and per-pair aggregates match a brute force count over
+# the exploded columns, for the pairs of one column and of two columns, also after save/load.
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.cooccurrence import Cooccurrence
+
+
+def tokens(series):
+    return series.astype(object).where(series.notna(), '').str.split('|').map(lambda t: set(filter(None, t)))
+
+
+# {(first value, second value): [row positions]} by exploding the columns; one column gives the
+# unordered pairs of distinct values, both orders as keys
+def brute_pairs(df, first, second=None):
+    pairs = {}
+    a = tokens(df[first]).tolist()
+    b = a if second is None else tokens(df[second]).tolist()
+    for row, (left, right) in enumerate(zip(a, b)):
+        for x in left:
+            for y in right:
+                if second is None and x == y:
+                    continue
+                pairs.setdefault((x, y), []).append(row)
+    return pairs
+
+
+@pytest.fixture(scope='module')
+def sample(movies):
+    df = movies.head(400).reset_index(drop=True)
+    # a value listed twice in a movie counts the movie once
+    df.loc[0, 'cast'] = df.loc[0, 'cast'] + '|' + df.loc[0, 'cast'].split('|')[0]
+    return df
+
+
+@pytest.mark.parametrize('columns', [('cast', None), ('genres', None), ('director', 'production_companies'),
+                                     ('genres', 'cast')])
+def test_counts_like_explode(sample, columns):
+    pairs = Cooccurrence.build(sample, *columns)
+    expected = brute_pairs(sample, *columns)
+    single = columns[1] is None
+    assert len(pairs) == (len(expected) // 2 if single else len(expected))
+    table = pairs.top(len(pairs))
+    for x, y, count in zip(table['first'], table['second'], table['count']):
+        assert count == len(expected[(x, y)])
+        assert pairs.count(x, y) == count
+        if single:
+            assert pairs.count(y, x) == count
+    if single:
+        # a value is not paired with itself
+        assert pairs.count(table['first'].iloc[0], table['first'].iloc[0]) == 0
+    # the pairs seen in the most movies come first
+    assert list(table['count']) == sorted(table['count'], reverse=True)
+
+
+@pytest.mark.parametrize('columns', [('cast', None), ('director', 'production_companies')])
+def test_partners_like_explode(sample, columns):
+    pairs = Cooccurrence.build(sample, *columns)
+    expected = brute_pairs(sample, *columns)
+    for value in pairs.first[:50]:
+        counts = Counter({y: len(rows) for (x, y), rows in expected.items() if x == value})
+        partners = pairs.partners(value)
+        assert partners.to_dict() == dict(counts)
+        assert list(partners) == sorted(partners, reverse=True)
+
+
+@pytest.mark.parametrize('how', ['count', 'sum', 'mean', 'min', 'max'])
+def test_top_by_like_explode(sample, how):
+    pairs = Cooccurrence.build(sample, 'genres')
+    revenue = sample['revenue'].to_numpy(dtype=np.float64)
+    table = pairs.top_by(sample['revenue'], n=15, how=how, min_count=2)
+    expected = {}
+    for (x, y), rows in brute_pairs(sample, 'genres').items():
+        values = pd.Series(revenue[rows])
+        if len(rows) >= 2:
+            expected[tuple(sorted((x, y)))] = getattr(values, how)()
+    best = sorted((v for v in expected.values() if not np.isnan(v)), reverse=True)[:15]
+    np.testing.assert_allclose(table['revenue_' + how], best)
+    for x, y, value in zip(table['first'], table['second'], table['revenue_' + how]):
+        assert np.isclose(expected[tuple(sorted((x, y)))], value)
+
+
+@pytest.mark.parametrize('columns', [('cast', None), ('director', 'production_companies')])
+def test_save_load_round_trip(sample, columns, tmp_path):
+    pairs = Cooccurrence.build(sample, *columns)
+    loaded = Cooccurrence.load(pairs.save(str(tmp_path / 'pairs')))
+    assert (loaded.second is loaded.first) == (columns[1] is None)
+    pd.testing.assert_index_equal(loaded.first, pairs.first)
+    pd.testing.assert_index_equal(loaded.second, pairs.second)
+    for name in ('indptr', 'indices', 'counts', 'row_indptr', 'rows'):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(pairs, name))
+    assert isinstance(loaded.counts, np.memmap)
+    pd.testing.assert_frame_equal(loaded.top(20), pairs.top(20))
+    value = pairs.first[0]
+    # the loaded counts are memory-mapped, so compare the pairs rather than the array types
+    assert list(loaded.partners(value).items()) == list(pairs.partners(value).items())
+    pd.testing.assert_frame_equal(loaded.top_by(sample['revenue'], 10), pairs.top_by(sample['revenue'], 10))
@@ -0,0 +1,23 @@
+# tmdb.correlation: the remembered matrix follows edits of the frame, and agrees with df.corr().
+
+import numpy as np
+import pandas as pd
+
+from tmdb.correlation import corr, corr_matrix
+
+
+def test_matrix_like_pandas(movies):
+    pd.testing.assert_frame_equal(corr_matrix(movies).matrix, movies.corr(numeric_only=True), rtol=1e-9)
+
+
+def test_edit_in_place_is_seen(movies):
+    df = movies.copy()
+    before = corr(df, 'budget', 'revenue')
+    df.loc[df['budget'] > df['budget'].median(), 'budget'] = 1.0
+    after = corr(df, 'budget', 'revenue')
+    assert after != before
+    assert np.isclose(after, df['budget'].corr(df['revenue']))
+    # an edit of another column leaves the pair alone, the whole matrix is computed again
+    df.loc[df.index[:100], 'runtime'] = 500
+    assert corr(df, 'budget', 'revenue') == after
+    pd.testing.assert_frame_equal(corr_matrix(df).matrix, df.corr(numeric_only=True), rtol=1e-9)
@@ -0,0 +1,27 @@
+# tmdb.dedup: duplicates are dropped like DataFrame.drop_duplicates, and clean_movies reports them.
+
+import logging
+
+import pandas as pd
+
+from tmdb.cleaning import clean_movies, prepare
+from tmdb.dedup import drop_duplicates
+from tmdb.loader import load_movies
+
+
+def test_drop_duplicates_like_pandas(movies_csv):
+    df = prepare(load_movies(movies_csv)).drop_duplicates()
+    df = pd.concat([df, df.iloc[[3, 1, 3]]])
+    result, duplicates = drop_duplicates(df)
+    pd.testing.assert_frame_equal(result, df.drop_duplicates())
+    assert list(duplicates['duplicate']) == list(df.index[-3:])
+    assert list(duplicates['first']) == list(df.index[[3, 1, 3]])
+
+
+def test_clean_movies_logs_duplicates(movies_csv, caplog):
+    raw = load_movies(movies_csv)
+    raw = raw[~raw.duplicated()].head(100)
+    raw = pd.concat([raw, raw.iloc[[0, 2]]], ignore_index=True)
+    with caplog.at_level(logging.INFO, logger='tmdb.cleaning'):
+        clean_movies(raw)
+    assert "dropped 2 duplicate rows: 100 (of 0), 101 (of 2)" in caplog.text
@@ -0,0 +1,29 @@
+# tmdb.groupby: the dense group-by gives what pandas gives, for integer keys up to the limits of their dtype.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tmdb.groupby import group_aggregate
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint64'])
+def test_keys_at_dtype_limits(dtype):
+    info = np.iinfo(dtype)
+    if info.max - info.min < 1 << 16:
+        keys = [info.min, info.max, info.min, info.max - 1]
+    else:
+        keys = [info.max - 3, info.max, info.max - 1, info.max - 3]
+    df = pd.DataFrame({'key': np.array(keys, dtype=dtype), 'value': [1.0, 2.0, np.nan, 4.0]})
+    spec = {'value': ['sum', 'count', 'max']}
+    expected = df.groupby('key').agg(spec)
+    result = group_aggregate(df, 'key', spec)
+    pd.testing.assert_index_equal(result.index, expected.index)
+    np.testing.assert_allclose(result.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64))
+
+
+def test_release_year(movies):
+    spec = {'runtime': ['mean', 'count'], 'id': 'count'}
+    expected = movies.groupby('release_year').agg(spec)
+    result = group_aggregate(movies, 'release_year', spec)
+    np.testing.assert_allclose(result.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64))
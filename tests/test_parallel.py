@@ -0,0 +1,21 @@
+# tmdb.parallel: the pool answers like the serial run, and the parent does not keep the table.
+
+import pandas as pd
+
+from tmdb import parallel
+from tmdb.aggregates import in_memory_results
+
+
+def test_parallel_like_serial(movies):
+    expected = in_memory_results(movies)
+    for workers in (1, 2):
+        results = parallel.run_parallel(movies, workers=workers, partitions=3)
+        assert parallel._frame is None
+        for name, table in expected.items():
+            if isinstance(table, pd.Series):
+                pd.testing.assert_series_equal(results[name], table, check_dtype=False, check_names=False,
+                                               check_index_type=False, rtol=1e-9)
+            elif name == 'corr':
+                pd.testing.assert_frame_equal(results[name], table, rtol=1e-9)
+            else:
+                pd.testing.assert_frame_equal(results[name].astype(object), table.astype(object))
@@ -0,0 +1,38 @@
+# tmdb.planner: the one-pass scans answer like the notebook's functions, and a column without any
+# value has no highest or lowest movie.
+
+import numpy as np
+import pandas as pd
+
+from tmdb import analysis
+from tmdb.aggregates import MinMax
+from tmdb.planner import run_plan
+
+
+def test_find_minmax_like_notebook(movies):
+    for column in ('Profit', 'revenue', 'budget', 'runtime'):
+        pd.testing.assert_frame_equal(run_plan(movies, ['find_minmax:' + column])['find_minmax:' + column],
+                                      analysis.find_minmax(movies, column))
+
+
+def test_find_minmax_of_all_missing_column(movies):
+    df = movies.assign(budget=np.nan)
+    results = run_plan(df, ['find_minmax:budget', 'top_10:budget', 'small_10:budget'])
+    table = results['find_minmax:budget']
+    assert list(table.index) == list(df.columns)
+    assert table.isna().all().all()
+    # top_10/small_10 fill up with the rows without a value, like nlargest/nsmallest
+    pd.testing.assert_frame_equal(results['top_10:budget'], df.nlargest(10, 'budget'))
+    pd.testing.assert_frame_equal(results['small_10:budget'], df.nsmallest(10, 'budget'))
+    # the streaming aggregate answers the same
+    agg = MinMax('budget')
+    agg.update(df)
+    pd.testing.assert_frame_equal(agg.result(), table)
+
+
+def test_top_10_fills_up_with_missing_rows(movies):
+    df = movies.head(30).copy()
+    df.loc[df.index[5:], 'revenue'] = np.nan
+    results = run_plan(df, ['top_10:revenue', 'small_10:revenue'])
+    pd.testing.assert_frame_equal(results['top_10:revenue'], df.nlargest(10, 'revenue'))
+    pd.testing.assert_frame_equal(results['small_10:revenue'], df.nsmallest(10, 'revenue'))
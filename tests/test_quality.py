@@ -0,0 +1,22 @@
+# tmdb.quality: every rule's bit matches what the rule finds, and the zero rules agree with the
+# notebook's replace(0, np.nan) on their columns.
+
+import numpy as np
+
+from tmdb.cleaning import prepare
+from tmdb.loader import load_movies
+from tmdb.quality import QUALITY, ZeroAsMissing, default_rules, validate
+
+
+def test_bits_match_rules(movies_csv):
+    raw = prepare(load_movies(movies_csv))
+    df = validate(raw)
+    flags = df[QUALITY].to_numpy()
+    values = {column: raw[column].to_numpy(dtype=np.float64) for column in ('budget', 'revenue', 'runtime')}
+    for rule in default_rules():
+        found = rule.check(values)
+        assert found.dtype == bool
+        np.testing.assert_array_equal((flags & rule.flag) != 0, found)
+        if isinstance(rule, ZeroAsMissing):
+            np.testing.assert_array_equal(df[rule.column].to_numpy(dtype=np.float64),
+                                          raw[rule.column].replace(0, np.nan).to_numpy(dtype=np.float64))
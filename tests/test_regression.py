@@ -0,0 +1,74 @@
+# tmdb.regression: the fit of LinearFit matches np.polyfit and its band the textbook band of the
+# mean computed from the design matrix, on the sample and on a small hand-made one.
+
+import numpy as np
+import pytest
+
+from tmdb.regression import LinearFit, t_quantile
+
+# the 0.975 quantiles of Student's t distribution
+T_975 = {7: 2.3646242515927844, 10: 2.2281388519649385, 30: 2.0422724563012373, 100: 1.983971518523552}
+
+
+def complete(df, x, y):
+    rows = df[[x, y]].dropna().to_numpy(dtype=np.float64)
+    return rows[:, 0], rows[:, 1]
+
+
+# lower and upper edge of the 95% band of the mean at x0: t * sqrt(x0' s^2 (X'X)^-1 x0) around the
+# least squares line of the design matrix X = [1, x]
+def reference_band(x, y, x0, t):
+    X = np.column_stack([np.ones_like(x), x])
+    beta, rss, _, _ = np.linalg.lstsq(X, y, rcond=None)
+    cov = rss[0] / (len(x) - 2) * np.linalg.inv(X.T @ X)
+    X0 = np.column_stack([np.ones_like(x0), x0])
+    half = t * np.sqrt(np.einsum('ij,jk,ik->i', X0, cov, X0))
+    return X0 @ beta - half, X0 @ beta + half
+
+
+@pytest.mark.parametrize('df', sorted(T_975))
+def test_t_quantile(df):
+    assert t_quantile(0.975, df) == pytest.approx(T_975[df], abs=1e-4)
+
+
+@pytest.mark.parametrize('columns', [('revenue', 'budget'), ('budget', 'revenue'), ('vote_count', 'vote_average')])
+def test_fit_like_polyfit(movies, columns):
+    x, y = complete(movies, *columns)
+    slope, intercept = np.polyfit(x, y, 1)
+    fit = LinearFit.from_frame(movies, *columns)
+    assert fit.n == len(x)
+    assert fit.slope == pytest.approx(slope, rel=1e-9)
+    assert fit.intercept == pytest.approx(intercept, rel=1e-9, abs=1e-9 * np.abs(y).max())
+    # fits of two halves merge into the fit of the whole
+    half = len(movies) // 2
+    merged = LinearFit.from_frame(movies.iloc[:half], *columns)
+    merged.merge(LinearFit.from_frame(movies.iloc[half:], *columns))
+    assert merged.slope == pytest.approx(slope, rel=1e-9)
+
+
+def test_band_like_design_matrix(movies):
+    x, y = complete(movies, 'revenue', 'budget')
+    fit = LinearFit.from_arrays(x, y)
+    grid = fit.grid()
+    low, high = fit.band(grid)
+    ref_low, ref_high = reference_band(x, y, grid, t_quantile(0.975, len(x) - 2))
+    scale = np.abs(y).max()
+    np.testing.assert_allclose(low, ref_low, rtol=1e-7, atol=1e-9 * scale)
+    np.testing.assert_allclose(high, ref_high, rtol=1e-7, atol=1e-9 * scale)
+
+
+def test_band_of_small_sample():
+    rng = np.random.default_rng(7)
+    x = rng.uniform(0, 10, 12)
+    y = 3 * x - 2 + rng.normal(0, 2, 12)
+    fit = LinearFit.from_arrays(x, y)
+    np.testing.assert_allclose([fit.slope, fit.intercept], np.polyfit(x, y, 1), rtol=1e-10)
+    x0 = np.array([-5.0, x.mean(), 4.0, 20.0])
+    low, high = fit.band(x0)
+    # 10 degrees of freedom: the only difference is the approximated t quantile
+    ref_low, ref_high = reference_band(x, y, x0, T_975[10])
+    np.testing.assert_allclose(low, ref_low, rtol=1e-5)
+    np.testing.assert_allclose(high, ref_high, rtol=1e-5)
+    # the band is narrowest at the mean of x
+    widths = high - low
+    assert widths[1] == widths.min()
@@ -0,0 +1,48 @@
+# tmdb.server: bad paths are answered with 400, and a request body does not break the connection.
+
+import asyncio
+
+import pytest
+
+from tmdb.server import LocalClient, QueryServer, QueryService
+
+
+@pytest.fixture(scope='module')
+def server(movies):
+    server = QueryServer(QueryService(movies))
+    yield server
+    asyncio.run(server.close())
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/top_10/Profit', 200),
+    ('/top_10/Profit/extra', 400),
+    ('/top_10', 400),
+    ('/month_release/x', 400),
+    ('/month_release?n=3', 400),
+    ('/corr/revenue', 400),
+    ('/top_tokens/director/revenue', 200),
+    ('/top_tokens/director/revenue/mean', 200),
+    ('/top_tokens/director/revenue/mean/x', 400),
+    ('/nothing', 404),
+])
+def test_path_arguments(server, path, status):
+    assert asyncio.run(LocalClient(server).get(path))[0] == status
+
+
+def test_body_of_other_methods_is_skipped(server, tmp_path):
+    async def exchange():
+        await server.start(unix=str(tmp_path / 'tmdb.sock'))
+        reader, writer = await asyncio.open_unix_connection(str(tmp_path / 'tmdb.sock'))
+        writer.write(b'POST /top_10/Profit HTTP/1.1\r\nContent-Length: 11\r\n\r\nhello world'
+                     b'GET /corr/revenue/budget HTTP/1.1\r\nConnection: close\r\n\r\n')
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        server.server.close()
+        await server.server.wait_closed()
+        return response
+
+    response = asyncio.run(exchange())
+    assert response.startswith(b'HTTP/1.1 405 ')
+    assert b'HTTP/1.1 200 OK' in response
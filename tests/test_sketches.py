@@ -0,0 +1,74 @@
+# The approximate counts of tmdb.sketches against the exact path (count_split_data) on the sample
+# dataset, within the error bounds the sketches promise.
+
+import numpy as np
+import pytest
+
+from tmdb.analysis import count_split_data
+from tmdb.sketches import (DISTINCT_COLUMNS, HEAVY_HITTER_COLUMNS, CountMinSketch, DistinctCount, HeavyHitters,
+                           HyperLogLog, check, hash_values)
+
+
+@pytest.mark.parametrize('epsilon', [1e-4, 1e-3])
+@pytest.mark.parametrize('column', HEAVY_HITTER_COLUMNS)
+def test_count_min_within_error_bound(movies, column, epsilon):
+    exact = count_split_data(movies, column)
+    sketch = CountMinSketch(epsilon, delta=0.01)
+    sketch.add(hash_values(exact.index), exact.to_numpy())
+    over = sketch.estimate(hash_values(exact.index)) - exact.to_numpy()
+    # never under, and over by more than epsilon * total for at most a delta share of the values
+    assert (over >= 0).all()
+    assert np.mean(over > sketch.error_bound) <= sketch.delta
+
+
+@pytest.mark.parametrize('column', HEAVY_HITTER_COLUMNS)
+def test_heavy_hitters_match_exact_top(movies, column):
+    agg = HeavyHitters(column, n=20)
+    agg.update(movies)
+    found = agg.result()
+    exact = count_split_data(movies, column)
+    top = exact.iloc[:agg.n]
+    allowed = agg.sketch.error_bound
+    assert len(found) == len(top)
+    assert (found - exact.reindex(found.index)).abs().max() <= allowed
+    # every value beating the n-th count by more than the error is found, and nothing far below it
+    cut = top.iloc[-1]
+    assert top[top > cut + allowed].index.isin(found.index).all()
+    assert (exact.reindex(found.index) >= cut - allowed).all()
+
+
+@pytest.mark.parametrize('precision', [10, 14])
+@pytest.mark.parametrize('column', DISTINCT_COLUMNS)
+def test_distinct_count_within_error(movies, column, precision):
+    agg = DistinctCount(column, precision)
+    agg.update(movies)
+    exact = len(count_split_data(movies, column))
+    assert abs(agg.result() - exact) / exact <= 3 * agg.sketch.relative_error
+
+
+# sketches of two partitions merge into the sketch of the whole table
+def test_merged_partitions_equal_whole(movies):
+    half = len(movies) // 2
+    for make in (lambda: HeavyHitters('cast', n=20), lambda: DistinctCount('cast')):
+        whole, first, second = make(), make(), make()
+        whole.update(movies)
+        first.update(movies.iloc[:half])
+        second.update(movies.iloc[half:])
+        first.merge(second)
+        if isinstance(whole, HeavyHitters):
+            np.testing.assert_array_equal(first.sketch.table, whole.sketch.table)
+            # values tied at the n-th count may differ, their counts may not
+            np.testing.assert_array_equal(first.result().to_numpy(), whole.result().to_numpy())
+        else:
+            np.testing.assert_array_equal(first.sketch.registers, whole.sketch.registers)
+
+
+def test_merge_rejects_other_shapes():
+    with pytest.raises(ValueError):
+        CountMinSketch(1e-3).merge(CountMinSketch(1e-4))
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+def test_check_reports_ok(movies):
+    assert check(movies)['ok'].all()
@@ -0,0 +1,30 @@
+# tmdb.sqlbackend: the SQL answers are the tables the pandas path (tmdb.planner) returns, missing
+# text included.
+
+import pandas as pd
+
+from tmdb.cleaning import clean_movies
+from tmdb.loader import load_movies
+from tmdb.planner import notebook_questions, run_plan
+from tmdb.sqlbackend import open_database, run_sql, supported
+
+
+def test_sql_like_pandas(movies_csv, tmp_path):
+    raw = pd.read_csv(movies_csv, dtype=str, keep_default_na=False)
+    # the movies with the highest revenue have no keywords and no director
+    top = load_movies(movies_csv)['revenue'].nlargest(3).index
+    raw.loc[top, ['keywords', 'director']] = ''
+    raw.loc[raw.index[::50], 'cast'] = ''
+    path = str(tmp_path / 'movies.csv')
+    raw.to_csv(path, index=False)
+    database = open_database(path, str(tmp_path))
+    requests = [name for name in notebook_questions() if supported(name)] + [
+        'small_10:revenue', 'compare_two_x:release_year,budget', 'count_split_data:keywords']
+    expected = run_plan(clean_movies(load_movies(path)), requests)
+    results = run_sql(database, requests)
+    assert results['find_minmax:revenue'].loc['keywords'].iloc[0] is not None
+    for name, table in results.items():
+        if isinstance(table, pd.Series):
+            pd.testing.assert_series_equal(table, expected[name], check_names=False, rtol=1e-9)
+        else:
+            pd.testing.assert_frame_equal(table, expected[name])
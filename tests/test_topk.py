@@ -0,0 +1,26 @@
+# tmdb.topk: the cached sorted index answers like nlargest/nsmallest, also after the column is edited
+# in place.
+
+import numpy as np
+import pandas as pd
+
+from tmdb import topk
+
+
+def test_top_and_bottom_like_nlargest(movies):
+    for column in ('Profit', 'budget', 'runtime'):
+        pd.testing.assert_frame_equal(topk.top(movies, column, 25), movies.nlargest(25, column))
+        pd.testing.assert_frame_equal(topk.bottom(movies, column, 25), movies.nsmallest(25, column))
+
+
+def test_edit_in_place_rebuilds_index(movies):
+    df = movies.copy()
+    topk.top(df, 'budget')
+    topk.bottom(df, 'budget')
+    df.loc[df.index[:3], 'budget'] = [1e12, 1.0, np.nan]
+    pd.testing.assert_frame_equal(topk.top(df, 'budget'), df.nlargest(10, 'budget'))
+    pd.testing.assert_frame_equal(topk.bottom(df, 'budget'), df.nsmallest(10, 'budget'))
+    df.iloc[5, df.columns.get_loc('budget')] = 2e12
+    assert topk.top(df, 'budget', 1).index[0] == df.index[5]
+    df['budget'] = -df['budget']
+    pd.testing.assert_frame_equal(topk.top(df, 'budget'), df.nlargest(10, 'budget'))
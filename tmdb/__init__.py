@@ -0,0 +1,4 @@
+# Helpers behind the TMDb analysis script.
+#
+# The modules in this package are imported directly (e.g. `from tmdb.loader import load_movies`)
+# so that importing the package itself stays cheap and does not pull in pandas or the plotting stack.
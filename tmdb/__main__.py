@@ -0,0 +1,5 @@
+import sys
+
+from tmdb.cli import main
+
+sys.exit(main())
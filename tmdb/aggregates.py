@@ -0,0 +1,333 @@
+# Mergeable partial aggregates for the research questions.
+#
+# Every aggregate is fed with consecutive pieces of the cleaned table through update(), and two
+# aggregates over consecutive pieces can be combined with merge(), where `other` covers the rows
+# that come after the rows of `self`. result() returns the same table as the in-memory function of
+# tmdb.analysis it is named after. Ties are resolved in row order, as idxmax/nlargest/value_counts do.
+#
+# remove(df) takes rows that were added before back out (tmdb.incremental, when a movie changes);
+# inputs are the columns it reads, so df only needs those. An aggregate without remove() has to be
+# computed again over the remaining rows. TopK and MinMax keep more rows than they show, and the
+# next one fills in for a kept row that is taken out; when they run out they raise RuntimeError.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.correlation import CorrelationMatrix
+from tmdb.multivalue import MultiValueIndex
+from tmdb.topk import no_minmax
+
+
+# n largest (top_10) or smallest (small_10) rows of a column.
+# Only the `depth` best rows are kept between updates (the candidates), so the state is bounded
+# whatever the size of the data; n of them are the result and the others fill in when a kept row is
+# taken back out. Rows outside the candidates always rank after the last candidate.
+class TopK:
+
+    def __init__(self, column, n=10, largest=True, depth=None):
+        self.column = column
+        self.n = n
+        self.largest = largest
+        self.depth = depth or 10 * n
+        # candidates in result order, and the number of rows they were picked from
+        self.rows = None
+        self.total = 0
+
+    @property
+    def name(self):
+        return ('top_10:' if self.largest else 'small_10:') + self.column
+
+    @property
+    def inputs(self):
+        return [self.column]
+
+    def _select(self, df, n):
+        if self.largest:
+            return df.nlargest(n, self.column)
+        return df.nsmallest(n, self.column)
+
+    # rows: the candidates of `total` rows that come after the rows of self
+    def _offer(self, rows, total):
+        if self.rows is None:
+            self.rows, self.total = rows, total
+            return
+        # the kept rows come first, so ties keep the earlier movie like nlargest(keep='first')
+        ranked = self._select(pd.concat([self.rows, rows]), self.depth)
+        keep = len(ranked)
+        # a side that lost rows it kept only vouches for the ranks up to its last candidate
+        for side, count in ((self.rows, self.total), (rows, total)):
+            if not len(side) and count:
+                keep = 0
+            elif len(side) < count and side.index[-1] in ranked.index:
+                keep = min(keep, ranked.index.get_loc(side.index[-1]) + 1)
+        self.rows, self.total = ranked.iloc[:keep], self.total + total
+
+    def update(self, df):
+        self._offer(self._select(df, self.depth), len(df))
+
+    def merge(self, other):
+        if other.rows is not None:
+            self._offer(other.rows, other.total)
+
+    def remove(self, df):
+        self.total -= len(df)
+        if self.rows is None:
+            return True
+        self.rows = self.rows[~self.rows.index.isin(df.index)]
+        if len(self.rows) < min(self.n, self.total):
+            raise RuntimeError("%s ran out of candidate rows (%d left, %d needed); build the state again "
+                               "from a full dump or with a larger depth" % (self.name, len(self.rows), self.n))
+        return True
+
+    def result(self):
+        return None if self.rows is None else self.rows.iloc[:self.n]
+
+
+# highest and lowest row of a column (find_minmax): the candidates of the rows that have a value,
+# from both ends
+class MinMax:
+
+    def __init__(self, column, depth=10):
+        self.column = column
+        self.high = TopK(column, 1, True, depth)
+        self.low = TopK(column, 1, False, depth)
+        # columns of the table, for the result of a column without any value
+        self.columns = None
+
+    @property
+    def name(self):
+        return 'find_minmax:' + self.column
+
+    @property
+    def inputs(self):
+        return [self.column]
+
+    def update(self, df):
+        self.columns = df.columns
+        df = df[df[self.column].notna()]
+        self.high.update(df)
+        self.low.update(df)
+
+    def merge(self, other):
+        if self.columns is None:
+            self.columns = other.columns
+        self.high.merge(other.high)
+        self.low.merge(other.low)
+
+    def remove(self, df):
+        df = df[df[self.column].notna()]
+        self.high.remove(df)
+        self.low.remove(df)
+        return True
+
+    def result(self):
+        if self.high.rows is None or not len(self.high.rows):
+            return no_minmax(self.columns)
+        return pd.concat([pd.DataFrame(self.high.rows.iloc[0]), pd.DataFrame(self.low.rows.iloc[0])], axis = 1)
+
+
+# this function subtracts per key parts and drops the keys that have no rows left
+def _subtract(parts, removed):
+    parts = parts.sub(removed, fill_value=0)
+    return parts[parts['size'] > 0]
+
+
+# average of value per key (compare_two_y / compare_two_x), kept as per key sums, counts and rows
+class GroupMean:
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.parts = None
+
+    @property
+    def name(self):
+        return 'compare_two_y:%s,%s' % (self.key, self.value)
+
+    @property
+    def inputs(self):
+        return [self.key, self.value]
+
+    def _offer(self, parts):
+        if parts is not None:
+            self.parts = parts if self.parts is None else self.parts.add(parts, fill_value=0)
+
+    def _parts(self, df):
+        return df.groupby(self.key)[self.value].agg(['sum', 'count', 'size'])
+
+    def update(self, df):
+        self._offer(self._parts(df))
+
+    def merge(self, other):
+        self._offer(other.parts)
+
+    def remove(self, df):
+        if self.parts is not None:
+            self.parts = _subtract(self.parts, self._parts(df))
+        return True
+
+    def result(self):
+        mean = self.parts['sum'] / self.parts['count'].replace(0, np.nan)
+        return mean.sort_index().rename(self.value)
+
+
+# number of non missing values per key (year_release counts the ids per release_year), with the
+# number of rows per key
+class GroupCount:
+
+    def __init__(self, key, value='id'):
+        self.key = key
+        self.value = value
+        self.counts = None
+
+    @property
+    def name(self):
+        return 'count:%s,%s' % (self.key, self.value)
+
+    @property
+    def inputs(self):
+        return [self.key, self.value]
+
+    def _offer(self, counts):
+        if counts is not None:
+            self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+
+    def _counts(self, df):
+        return df.groupby(self.key)[self.value].agg(['count', 'size'])
+
+    def update(self, df):
+        self._offer(self._counts(df))
+
+    def merge(self, other):
+        self._offer(other.counts)
+
+    def remove(self, df):
+        if self.counts is not None:
+            self.counts = _subtract(self.counts, self._counts(df))
+        return True
+
+    def result(self):
+        return self.counts['count'].sort_index().astype(np.int64).rename(self.value)
+
+
+# number of movies per release month (month_release)
+class MonthCounts:
+
+    name = 'month_release'
+    inputs = ['release_date']
+
+    def __init__(self):
+        self.counts = None
+
+    def _offer(self, counts):
+        if counts is not None:
+            self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+
+    def update(self, df):
+        self._offer(df['release_date'].dt.month.value_counts())
+
+    def merge(self, other):
+        self._offer(other.counts)
+
+    def remove(self, df):
+        if self.counts is not None:
+            counts = self.counts.sub(df['release_date'].dt.month.value_counts(), fill_value=0)
+            self.counts = counts[counts > 0]
+        return True
+
+    def result(self):
+        return self.counts.sort_index().astype(np.int64)
+
+
+# count of every value of a pipe separated column (count_split_data)
+class TokenCounts:
+
+    def __init__(self, column):
+        self.column = column
+        # value -> count, in order of first appearance so ties sort like value_counts
+        self.counts = {}
+
+    @property
+    def name(self):
+        return 'count_split_data:' + self.column
+
+    @property
+    def inputs(self):
+        return [self.column]
+
+    def _offer(self, values, counts):
+        acc = self.counts
+        for value, count in zip(values, counts):
+            acc[value] = acc.get(value, 0) + count
+
+    def update(self, df):
+        index = MultiValueIndex.from_series(df[self.column])
+        self._offer(index.vocabulary, np.bincount(index.indices, minlength=len(index.vocabulary)).tolist())
+
+    def merge(self, other):
+        self._offer(other.counts.keys(), other.counts.values())
+
+    # a value keeps its place among the ties while it is listed by any movie
+    def remove(self, df):
+        index = MultiValueIndex.from_series(df[self.column])
+        counts = np.bincount(index.indices, minlength=len(index.vocabulary)).tolist()
+        acc = self.counts
+        for value, count in zip(index.vocabulary, counts):
+            left = acc[value] - count
+            if left:
+                acc[value] = left
+            else:
+                del acc[value]
+        return True
+
+    def result(self):
+        values = pd.Index(list(self.counts.keys()))
+        counts = np.fromiter(self.counts.values(), dtype=np.int64, count=len(self.counts))
+        order = np.argsort(-counts, kind='stable')
+        return pd.Series(counts[order], index=values[order], name='count')
+
+
+# the aggregates behind the research questions of the notebook
+def notebook_aggregates():
+    return [
+        GroupCount('release_year', 'id'),
+        MinMax('Profit'),
+        TopK('Profit'),
+        MinMax('revenue'),
+        TopK('revenue'),
+        MinMax('budget'),
+        TopK('budget'),
+        TopK('budget', largest=False),
+        MinMax('runtime'),
+        GroupMean('runtime', 'popularity'),
+        GroupMean('release_year', 'runtime'),
+        MonthCounts(),
+        TokenCounts('genres'),
+        TokenCounts('cast'),
+        TokenCounts('production_companies'),
+        CorrelationMatrix(),
+    ]
+
+
+# this function computes the same tables from a frame that is fully in memory, keyed like the aggregates
+def in_memory_results(df):
+    from tmdb import analysis
+
+    results = {}
+    for agg in notebook_aggregates():
+        if isinstance(agg, GroupCount):
+            results[agg.name] = df.groupby(agg.key).count()[agg.value]
+        elif isinstance(agg, MinMax):
+            results[agg.name] = analysis.find_minmax(df, agg.column)
+        elif isinstance(agg, TopK):
+            func = analysis.top_10 if agg.largest else analysis.small_10
+            results[agg.name] = func(df, agg.column, agg.n)
+        elif isinstance(agg, GroupMean):
+            results[agg.name] = analysis.compare_two_y(df, agg.key, agg.value)
+        elif isinstance(agg, MonthCounts):
+            results[agg.name] = analysis.month_release(df)
+        elif isinstance(agg, TokenCounts):
+            results[agg.name] = analysis.count_split_data(df, agg.column)
+        elif isinstance(agg, CorrelationMatrix):
+            results[agg.name] = df.corr(numeric_only=True)
+    return results
@@ -0,0 +1,69 @@
+# The computations behind the research questions of the notebook, without the plotting.
+#
+# The notebook functions read a global `df`; these take the frame as their first argument so the
+# other modules (and the benchmarks) can compare their own results against them.
+
+import pandas as pd
+
+from tmdb.profiling import traced
+
+
+# this function counts every value of a pipe separated column (genres, cast, production_companies, ...)
+@traced(category='question')
+def count_split_data(df, x):
+    #concatenate all the rows of the column.
+    data_plot = df[x].str.cat(sep = '|')
+    data = pd.Series(data_plot.split('|'))
+    #count each of the values and return.
+    info = data.value_counts(ascending=False)
+    return info
+
+
+# Research question 1: number of movies per release year
+@traced(category='question')
+def year_release(df):
+    return df.groupby('release_year').count()['id']
+
+
+# this function returns the rows of the movies with the highest and the lowest value of a column
+@traced(category='question')
+def find_minmax(df, x):
+    high = pd.DataFrame(df.loc[df[x].idxmax(), :])
+    low = pd.DataFrame(df.loc[df[x].idxmin(), :])
+    return pd.concat([high, low], axis = 1)
+
+
+# this function returns the 10 (or n) movies with the largest values of a column
+@traced(category='question')
+def top_10(df, x, n=10):
+    return df.nlargest(n, x)
+
+
+# this function returns the 10 (or n) movies with the smallest values of a column
+@traced(category='question')
+def small_10(df, x, n=10):
+    return df.nsmallest(n, x)
+
+
+# average of y for every value of x
+@traced(category='question')
+def compare_two_y(df, x, y):
+    return df.groupby(x)[y].mean()
+
+
+# average of y for every value of x. The notebook averages every column and keeps only y.
+@traced(category='question')
+def compare_two_x(df, x, y):
+    return df.groupby(x).mean(numeric_only=True)[y]
+
+
+# Research question 13: number of movies per release month
+@traced(category='question')
+def month_release(df):
+    return df['release_date'].dt.month.value_counts().sort_index()
+
+
+# correlation between two columns, as the notebook's corr() computes it (the whole matrix for one cell)
+@traced(category='question')
+def corr(df, x, y):
+    return df.corr(numeric_only=True).loc[x, y]
@@ -0,0 +1,552 @@
+# Small benchmarking helpers.
+#
+# Every measurement runs in a freshly spawned process, so the reported peak RSS belongs to the
+# measured call alone and not to whatever the parent process has loaded before. When a setup
+# function is given, its work (loading, replicating the data) is left out of the timing and the
+# growth of the peak RSS during the measured call is reported as extra_rss_mb.
+#
+#   python -m tmdb.bench loaders tmdb-movies.csv
+
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from queue import Empty
+
+import pandas as pd
+
+
+# peak resident set size of the current process in MB, or None where the resource module is missing
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+def _run(func, args, kwargs, setup, queue):
+    try:
+        if setup is not None:
+            args = setup(*args)
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    except BaseException:
+        # the parent waits on the queue: send the error instead of leaving it waiting
+        queue.put(('error', traceback.format_exc()))
+        raise
+    after = peak_rss_mb()
+    extra = None if after is None else after - before
+    queue.put(('ok', (elapsed, after, extra)))
+
+
+# this function waits for the result of the benchmark process, or returns None when the process
+# ended without sending one (killed, crashed in native code)
+def _receive(queue, proc, poll=1.0):
+    while True:
+        try:
+            return queue.get(timeout=poll)
+        except Empty:
+            if not proc.is_alive():
+                try:
+                    return queue.get_nowait()
+                except Empty:
+                    return None
+
+
+# this function runs func(*args, **kwargs) in a new process and returns
+# (seconds, peak rss in MB, growth of the peak rss during the call in MB).
+# With setup, func is called with the tuple returned by setup(*args) instead.
+# func and setup have to be importable by name (module level functions) because the process is spawned.
+def measure(func, *args, setup=None, **kwargs):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(func, args, kwargs, setup, queue))
+    proc.start()
+    received = _receive(queue, proc)
+    proc.join()
+    if received is not None and received[0] == 'error':
+        raise RuntimeError("benchmark process for %s failed:\n%s" % (func.__name__, received[1]))
+    if received is None or proc.exitcode != 0:
+        raise RuntimeError("benchmark process for %s exited with code %s" % (func.__name__, proc.exitcode))
+    return received[1]
+
+
+# this function turns {name: measure(...)} into a table
+def to_frame(results):
+    return pd.DataFrame.from_dict(results, orient='index', columns=['seconds', 'peak_rss_mb', 'extra_rss_mb'])
+
+
+# this function stacks factor copies of the frame to get a bigger dataset with the same distributions
+def replicate(df, factor):
+    if factor == 1:
+        return df
+    return pd.concat([df] * factor, ignore_index=True)
+
+
+# setup: the cleaned table, replicated factor times
+def cleaned(path, factor=1, *rest):
+    from tmdb.cache import load_clean
+
+    return (replicate(load_clean(path), factor),) + rest
+
+
+# the ingest the notebook uses: default inference and a second pass for the release date
+def current_load(path):
+    df = pd.read_csv(path)
+    df['release_date'] = pd.to_datetime(df['release_date'])
+    return df
+
+
+# this function compares the notebook's ingest with the typed loader (and the Arrow engine when available)
+def compare_loaders(path='tmdb-movies.csv'):
+    from tmdb.loader import load_movies
+
+    results = {
+        'read_csv + to_datetime': measure(current_load, path),
+        'load_movies (c)': measure(load_movies, path, engine='c'),
+    }
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        results['load_movies (pyarrow)'] = measure(load_movies, path, engine='pyarrow')
+    return to_frame(results)
+
+
+def _clean_from_csv(path):
+    from tmdb.cleaning import clean_movies
+    from tmdb.loader import load_movies
+
+    return clean_movies(load_movies(path))
+
+
+# this function compares cleaning the csv on every run with reading the cached snapshot
+def compare_snapshot(path='tmdb-movies.csv'):
+    from tmdb.cache import load_clean
+
+    # make sure the snapshot exists before timing the warm path
+    load_clean(path)
+    return to_frame({
+        'load + clean': measure(_clean_from_csv, path),
+        'snapshot': measure(load_clean, path),
+    })
+
+
+def _index_counts(df, column):
+    from tmdb.multivalue import MultiValueIndex
+
+    return MultiValueIndex.from_series(df[column]).counts()
+
+
+def _indexed(path, factor, column):
+    from tmdb.multivalue import MultiValueIndex
+
+    (df,) = cleaned(path, factor)
+    return (MultiValueIndex.from_series(df[column]),)
+
+
+def _counts(index):
+    return index.counts()
+
+
+def _split_counts(df, column, engine):
+    from tmdb.multivalue import MultiValueIndex
+
+    return MultiValueIndex.from_series(df[column], engine=engine).counts()
+
+
+# this function compares the split-and-count of count_split_data (join, split, value_counts) with
+# the pandas (str.split + explode) and the Arrow kernels of tmdb.multivalue
+def compare_split_kernels(path='tmdb-movies.csv', factors=(1, 10, 100), columns=('cast', 'keywords')):
+    from tmdb.analysis import count_split_data
+
+    results = {}
+    for factor in factors:
+        for column in columns:
+            key = '%s x%d' % (column, factor)
+            results[key + ' count_split_data'] = measure(count_split_data, path, factor, column, setup=cleaned)
+            results[key + ' pandas split'] = measure(_split_counts, path, factor, column, 'pandas', setup=cleaned)
+            results[key + ' arrow kernels'] = measure(_split_counts, path, factor, column, 'arrow', setup=cleaned)
+    return to_frame(results)
+
+
+# this function compares count_split_data with the multi value index on the replicated dataset:
+# building the index and counting, and counting from an index that already exists
+def compare_split_counts(path='tmdb-movies.csv', factors=(1, 10, 100), columns=('cast', 'genres', 'production_companies')):
+    from tmdb.analysis import count_split_data
+
+    results = {}
+    for factor in factors:
+        for column in columns:
+            key = '%s x%d' % (column, factor)
+            results[key + ' count_split_data'] = measure(count_split_data, path, factor, column, setup=cleaned)
+            results[key + ' build + counts'] = measure(_index_counts, path, factor, column, setup=cleaned)
+            results[key + ' counts'] = measure(_counts, path, factor, column, setup=_indexed)
+    return to_frame(results)
+
+
+def _in_memory_questions(path):
+    from tmdb.aggregates import in_memory_results
+
+    return in_memory_results(_clean_from_csv(path))
+
+
+# this function compares answering the questions on the whole table with the chunked engine
+def compare_streaming(path='tmdb-movies.csv', chunksizes=(10_000, 100_000)):
+    from tmdb.streaming import run_streaming
+
+    results = {'in memory': measure(_in_memory_questions, path)}
+    for chunksize in chunksizes:
+        results['streaming chunksize=%d' % chunksize] = measure(run_streaming, path, chunksize=chunksize)
+    return to_frame(results)
+
+
+def _serial_questions(df):
+    from tmdb.aggregates import in_memory_results
+
+    return in_memory_results(df)
+
+
+# this function compares the serial questions with the process pool on the replicated table.
+# The speedup over the serial run is only meaningful up to the number of cores, printed in the labels.
+def compare_parallel(path='tmdb-movies.csv', factor=10, workers=(1, 2, 4, 8)):
+    from tmdb.parallel import run_parallel
+
+    cores = os.cpu_count() or 1
+    results = {'serial (%d cores)' % cores: measure(_serial_questions, path, factor, setup=cleaned)}
+    for n in workers:
+        results['parallel workers=%d' % n] = measure(run_parallel, path, factor, setup=cleaned, workers=n)
+    table = to_frame(results)
+    table['speedup'] = table['seconds'].iloc[0] / table['seconds']
+    return table
+
+
+def _planned_questions(df):
+    from tmdb.planner import run_plan
+
+    return run_plan(df)
+
+
+# this function compares answering every question on its own with the single pass planner
+def compare_planner(path='tmdb-movies.csv', factors=(1, 10)):
+    results = {}
+    for factor in factors:
+        results['x%d one scan per question' % factor] = measure(_serial_questions, path, factor, setup=cleaned)
+        results['x%d planner' % factor] = measure(_planned_questions, path, factor, setup=cleaned)
+    return to_frame(results)
+
+
+# this function reports the memory of every column of the cleaned table before and after tmdb.compact
+def compare_compact(path='tmdb-movies.csv'):
+    from tmdb.cache import load_clean
+    from tmdb.compact import compact, memory_report
+
+    df = load_clean(path)
+    return memory_report(df, compact(df))
+
+
+# setup: the prepared (not yet deduplicated) table, replicated with distinct ids per copy
+def _prepared(path, factor):
+    import numpy as np
+
+    from tmdb.cleaning import prepare
+    from tmdb.loader import load_movies
+
+    df = prepare(load_movies(path))
+    copies = replicate(df, factor)
+    copies['id'] += np.repeat(np.arange(factor) * (df['id'].max() + 1), len(df))
+    return (copies,)
+
+
+def _two_pass_dedup(df):
+    sum(df.duplicated())
+    return df.drop_duplicates()
+
+
+def _fingerprint_dedup(df):
+    from tmdb.dedup import drop_duplicates
+
+    return drop_duplicates(df)
+
+
+# this function compares the notebook's duplicated() + drop_duplicates() with the fingerprint dedup
+def compare_dedup(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d duplicated + drop_duplicates' % factor] = measure(_two_pass_dedup, path, factor, setup=_prepared)
+        results['x%d fingerprints' % factor] = measure(_fingerprint_dedup, path, factor, setup=_prepared)
+    return to_frame(results)
+
+
+def _pandas_groupbys(df):
+    df.groupby('runtime')['popularity'].mean()
+    df.groupby('release_year').mean(numeric_only=True)['runtime']
+    df.groupby('release_year').count()['id'].max()
+    df.groupby('release_year').count()['id']
+
+
+def _dense_groupbys(df):
+    from tmdb.groupby import group_aggregate
+
+    group_aggregate(df, 'runtime', {'popularity': 'mean'})
+    group_aggregate(df, 'release_year', {'runtime': 'mean', 'id': 'count'})
+
+
+# this function compares the notebook's groupby calls with the dense group-by of tmdb.groupby
+def compare_groupby(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d pandas groupby' % factor] = measure(_pandas_groupbys, path, factor, setup=cleaned)
+        results['x%d dense group-by' % factor] = measure(_dense_groupbys, path, factor, setup=cleaned)
+    return to_frame(results)
+
+
+# top/bottom-N queries with arbitrary N, as an API asking for "top N by metric" sends them
+TOPK_QUERIES = [(column, n) for n in (1, 5, 10, 25, 100, 10, 50, 10) for column in ('Profit', 'revenue', 'budget')]
+
+
+def _pandas_topk(df):
+    for column, n in TOPK_QUERIES:
+        df.nlargest(n, column)
+        df.nsmallest(n, column)
+        df[column].quantile(0.99)
+
+
+def _sorted_index_topk(df):
+    from tmdb import topk
+
+    for column, n in TOPK_QUERIES:
+        topk.top(df, column, n)
+        topk.bottom(df, column, n)
+        topk.quantile(df, column, 0.99)
+
+
+# this function compares repeated nlargest/nsmallest/quantile calls with the cached sorted index of tmdb.topk
+# (the sorting of the three columns is part of the timing)
+def compare_topk(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d nlargest/nsmallest' % factor] = measure(_pandas_topk, path, factor, setup=cleaned)
+        results['x%d sorted index' % factor] = measure(_sorted_index_topk, path, factor, setup=cleaned)
+    return to_frame(results)
+
+
+def _seaborn_regplot(df, x='revenue', y='budget'):
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    sns.regplot(x=df[x], y=df[y], color='c', ax=fig.subplots())
+    fig.savefig(os.devnull, format='png')
+
+
+def _closed_form_regplot(df, x='revenue', y='budget'):
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    from tmdb.regression import plot
+
+    fig = Figure()
+    plot(fig.subplots(), df[x], df[y], color='c')
+    fig.savefig(os.devnull, format='png')
+
+
+# this function compares sns.regplot (bootstrapped band, every point) with the closed-form fit and
+# stratified scatter of tmdb.regression, fitting and rendering reg_plot('revenue', 'budget')
+def compare_regplot(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d sns.regplot' % factor] = measure(_seaborn_regplot, path, factor, setup=cleaned)
+        results['x%d closed form + sample' % factor] = measure(_closed_form_regplot, path, factor, setup=cleaned)
+    return to_frame(results)
+
+
+def _replace_zero(df):
+    import numpy as np
+
+    return df.replace(0, np.nan)
+
+
+# setup: the prepared frame, with tmdb.quality imported outside the timing like pandas is for replace
+def _prepared_quality(path, factor):
+    import tmdb.quality  # noqa: F401
+
+    return _prepared(path, factor)
+
+
+def _validate(df):
+    from tmdb.quality import validate
+
+    return validate(df)
+
+
+# this function compares the notebook's df.replace(0, np.nan) over the whole frame with the column
+# scoped rules and issue bitmask of tmdb.quality
+def compare_quality(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d replace(0, nan)' % factor] = measure(_replace_zero, path, factor, setup=_prepared)
+        results['x%d quality rules' % factor] = measure(_validate, path, factor, setup=_prepared_quality)
+    return to_frame(results)
+
+
+def _pandas_token_stats(df):
+    from tmdb.tokenstats import TOKEN_COLUMNS, VALUE_COLUMNS
+
+    for column in TOKEN_COLUMNS:
+        tokens = df[column].astype(object).str.split('|')
+        exploded = df[list(VALUE_COLUMNS)].assign(**{column: tokens}).explode(column)
+        exploded.groupby(column, sort=False)[list(VALUE_COLUMNS)].agg(['sum', 'mean', 'median'])
+
+
+def _token_stats(df):
+    from tmdb.tokenstats import TOKEN_COLUMNS, token_stats
+
+    for column in TOKEN_COLUMNS:
+        token_stats(df, column)
+
+
+# this function compares str.split + explode + groupby with tmdb.tokenstats for the sum, mean and
+# median of revenue, Profit and vote_average per actor, director, genre and company
+def compare_token_stats(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d explode + groupby' % factor] = measure(_pandas_token_stats, path, factor, setup=cleaned)
+        results['x%d token codes' % factor] = measure(_token_stats, path, factor, setup=cleaned)
+    return to_frame(results)
+
+
+def _sql_questions():
+    from tmdb.planner import notebook_questions
+    from tmdb.sqlbackend import supported
+
+    return [name for name in notebook_questions() if supported(name)]
+
+
+def _bench_database(factor):
+    import tempfile
+
+    return os.path.join(tempfile.gettempdir(), 'tmdb-bench-x%d.sqlite' % factor)
+
+
+# setup: the cleaned table, replicated factor times, with the path of its benchmark database
+def _cleaned_for_database(path, factor):
+    return cleaned(path, factor) + (_bench_database(factor),)
+
+
+# written in chunks of 100,000 rows like load_database writes the csv
+def _write_database(df, database, chunksize=100_000):
+    from tmdb.sqlbackend import write_database
+
+    write_database((df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize)), database)
+
+
+# setup: the path of the database written by _write_database
+def _database(path, factor):
+    return (_bench_database(factor),)
+
+
+def _pandas_questions(df):
+    from tmdb.planner import run_plan
+
+    run_plan(df, _sql_questions())
+
+
+def _sql_answers(database):
+    from tmdb.sqlbackend import run_sql
+
+    run_sql(database, _sql_questions())
+
+
+# this function compares the notebook questions that have SQL answered in memory (tmdb.planner) and
+# by SQLite from a database file (tmdb.sqlbackend); writing the database is measured on its own
+def compare_sql(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d write database' % factor] = measure(_write_database, path, factor, setup=_cleaned_for_database)
+        results['x%d pandas' % factor] = measure(_pandas_questions, path, factor, setup=cleaned)
+        results['x%d sqlite' % factor] = measure(_sql_answers, path, factor, setup=_database)
+        os.remove(_bench_database(factor))
+    return to_frame(results)
+
+
+# date ranges an analyst filters on: single years, seasons and decades
+DATE_RANGES = ([('%d-01-01' % year, '%d-12-31' % year) for year in range(1990, 2016, 5)]
+               + [('%d-06-01' % year, '%d-08-31' % year) for year in (2000, 2010, 2015)]
+               + [('%d-01-01' % decade, '%d-12-31' % (decade + 9)) for decade in (1970, 1990, 2000)])
+
+
+def _dt_dates(df):
+    dates = df['release_date']
+    dates.dt.month.value_counts().sort_index()
+    dates.groupby([dates.dt.year, dates.dt.month]).size().unstack(fill_value=0)
+    for start, end in DATE_RANGES:
+        df[dates.between(start, end)]
+    dates.dropna().to_frame().set_index('release_date').assign(n=1)['n'].resample('MS').sum().rolling(12, min_periods=1).sum()
+
+
+def _indexed_dates(df):
+    from tmdb.dates import date_index
+
+    index = date_index(df)
+    index.month_counts()
+    index.month_year_counts()
+    for start, end in DATE_RANGES:
+        index.rows(df, start, end)
+    index.rolling_monthly(12)
+
+
+# this function compares month counts, movies per month per year, date range filters and rolling
+# monthly counts through the .dt accessor with the date parts and sorted dates of tmdb.dates
+# (building the index is part of the timing)
+def compare_dates(path='tmdb-movies.csv', factors=(1, 10, 100)):
+    results = {}
+    for factor in factors:
+        results['x%d .dt accessor' % factor] = measure(_dt_dates, path, factor, setup=cleaned)
+        results['x%d date index' % factor] = measure(_indexed_dates, path, factor, setup=cleaned)
+    return to_frame(results)
+
+
+BENCHMARKS = {
+    'loaders': compare_loaders,
+    'snapshot': compare_snapshot,
+    'split_counts': compare_split_counts,
+    'split_kernels': compare_split_kernels,
+    'streaming': compare_streaming,
+    'parallel': compare_parallel,
+    'planner': compare_planner,
+    'compact': compare_compact,
+    'dedup': compare_dedup,
+    'groupby': compare_groupby,
+    'topk': compare_topk,
+    'regplot': compare_regplot,
+    'dates': compare_dates,
+    'quality': compare_quality,
+    'token_stats': compare_token_stats,
+    'sql': compare_sql,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in BENCHMARKS:
+        print("usage: python -m tmdb.bench {%s} [csv path]" % ','.join(BENCHMARKS))
+        return 2
+    print(BENCHMARKS[argv[0]](*argv[1:]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# Benchmark suite: every research question function on synthetic data of growing size.
+#
+# The data comes from tmdb.synthetic and is generated once per size into the cache directory. Every
+# function is measured with tmdb.bench.measure (own process, time and peak RSS) at every size, and
+# the results are written to a JSON file together with the commit and library versions, so runs on
+# different commits can be compared:
+#
+#   python -m tmdb.benchsuite --sizes 10000 100000 1000000 --output bench-new.json
+#   python -m tmdb.benchsuite --compare bench-old.json bench-new.json
+#
+# Everything runs locally; 10M rows need several GB of memory.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from tmdb import analysis
+from tmdb.bench import measure
+from tmdb.cache import CACHE_DIR
+
+SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _plot_correlation_map(df):
+    from matplotlib.figure import Figure
+
+    from tmdb.render import CORRELATION_MAP_COLUMNS, plot_correlation_map
+
+    fig = Figure(figsize=(12, 10))
+    plot_correlation_map(fig, df[CORRELATION_MAP_COLUMNS].corr())
+    fig.savefig(os.devnull, format='png')
+
+
+def _clean_movies(df):
+    from tmdb.cleaning import clean_movies
+
+    return clean_movies(df)
+
+
+def _run_plan(df):
+    from tmdb.planner import run_plan
+
+    return run_plan(df)
+
+
+# name -> (function, extra arguments after the frame, 'raw' or 'clean' input)
+SUITE = {
+    'clean_movies': (_clean_movies, (), 'raw'),
+    'year_release': (analysis.year_release, (), 'clean'),
+    'find_minmax': (analysis.find_minmax, ('Profit',), 'clean'),
+    'top_10': (analysis.top_10, ('revenue',), 'clean'),
+    'small_10': (analysis.small_10, ('budget',), 'clean'),
+    'compare_two_y': (analysis.compare_two_y, ('runtime', 'popularity'), 'clean'),
+    'compare_two_x': (analysis.compare_two_x, ('release_year', 'runtime'), 'clean'),
+    'corr': (analysis.corr, ('revenue', 'budget'), 'clean'),
+    'month_release': (analysis.month_release, (), 'clean'),
+    'count_split_data:genres': (analysis.count_split_data, ('genres',), 'clean'),
+    'count_split_data:cast': (analysis.count_split_data, ('cast',), 'clean'),
+    'count_split_data:production_companies': (analysis.count_split_data, ('production_companies',), 'clean'),
+    'plot_correlation_map': (_plot_correlation_map, (), 'clean'),
+    'run_plan': (_run_plan, (), 'clean'),
+}
+
+
+def synthetic_path(n, seed, kind, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, 'synthetic-%s-%d-%d.feather' % (kind, n, seed))
+
+
+def _write_synthetic(n, seed, cache_dir):
+    from tmdb.cache import write_snapshot
+    from tmdb.cleaning import clean_movies
+    from tmdb.synthetic import generate
+
+    os.makedirs(cache_dir, exist_ok=True)
+    raw = generate(n, seed)
+    write_snapshot(raw, synthetic_path(n, seed, 'raw', cache_dir))
+    write_snapshot(clean_movies(raw), synthetic_path(n, seed, 'clean', cache_dir))
+
+
+# setup: the synthetic table of n rows, raw or cleaned, followed by the extra arguments
+def synthetic(n, seed, kind, cache_dir, *rest):
+    from tmdb.cache import read_snapshot
+
+    return (read_snapshot(synthetic_path(n, seed, kind, cache_dir)),) + rest
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# this function runs the suite and returns the JSON document (a dict).
+# repeat > 1 keeps the fastest of several runs.
+def run_suite(sizes=SIZES, functions=None, seed=0, repeat=1, cache_dir=CACHE_DIR, log=print):
+    rows = []
+    for n in sizes:
+        if not all(os.path.exists(synthetic_path(n, seed, kind, cache_dir)) for kind in ('raw', 'clean')):
+            log("generating %d synthetic rows" % n)
+            measure(_write_synthetic, n, seed, cache_dir)
+        for name in functions or SUITE:
+            func, args, kind = SUITE[name]
+            runs = [measure(func, n, seed, kind, cache_dir, *args, setup=synthetic) for _ in range(repeat)]
+            seconds, peak, extra = min(runs)
+            rows.append({'function': name, 'rows': n, 'seconds': seconds, 'peak_rss_mb': peak, 'extra_rss_mb': extra})
+            log("%-40s %10d rows %9.4f s %9.1f MB" % (name, n, seconds, peak or float('nan')))
+    return {
+        'commit': _git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'seed': seed,
+        'results': rows,
+    }
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# this function lines up two suite runs: time and peak memory of the new run relative to the old one
+def compare_results(old, new):
+    key = ['function', 'rows']
+    a = pd.DataFrame(old['results']).set_index(key)
+    b = pd.DataFrame(new['results']).set_index(key)
+    table = a[['seconds', 'peak_rss_mb']].join(b[['seconds', 'peak_rss_mb']], lsuffix='_old', rsuffix='_new', how='inner')
+    table['time_ratio'] = table['seconds_new'] / table['seconds_old']
+    table['memory_ratio'] = table['peak_rss_mb_new'] / table['peak_rss_mb_old']
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tmdb.benchsuite', description="Benchmark the research question functions.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="numbers of rows")
+    parser.add_argument('--function', action='append', dest='functions', choices=list(SUITE),
+                        help="function to run (repeatable), default all")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="keep the fastest of this many runs")
+    parser.add_argument('--output', default='bench-results.json', help="JSON file for the results")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files instead")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+            print(compare_results(load_results(args.compare[0]), load_results(args.compare[1])))
+        return 0
+    document = run_suite(args.sizes, args.functions, args.seed, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=1)
+    print("wrote %s" % args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
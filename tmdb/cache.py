@@ -0,0 +1,151 @@
+# Content-hashed snapshot of the cleaned movie table.
+#
+# The snapshot is an uncompressed Feather (Arrow IPC) file named after the sha256 of the source csv
+# and of the loading/cleaning code. A changed csv or changed cleaning code gives a different name, so
+# stale snapshots are never read. Snapshots are opened memory-mapped.
+#
+#   df = load_clean('tmdb-movies.csv')
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+
+from tmdb.profiling import traced
+
+CACHE_DIR = '.tmdb-cache'
+
+_CHUNK = 1 << 20
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_CHUNK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# this function returns the sha256 of the csv.
+# The digest is remembered in the cache directory together with the file size and mtime, so an
+# unchanged csv is only hashed once.
+def csv_digest(path, cache_dir=CACHE_DIR):
+    st = os.stat(path)
+    index_path = os.path.join(cache_dir, 'digests.json')
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    key = os.path.abspath(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    entry = index.get(key)
+    if entry and entry['stamp'] == stamp:
+        return entry['sha256']
+    digest = _sha256_file(path)
+    index[key] = {'stamp': stamp, 'sha256': digest}
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_write_text(index_path, json.dumps(index))
+    return digest
+
+
+# this function hashes the source of the modules that decide what the cleaned frame looks like:
+# the loader, the cleaning and every module clean_movies calls. extra names more modules whose code
+# decides what a cached file holds (e.g. tmdb.streaming for the SQLite copy).
+def code_digest(extra=()):
+    from tmdb import cleaning, compact, dedup, fingerprints, loader
+
+    h = hashlib.sha256()
+    for module in (loader, cleaning, dedup, fingerprints, compact) + tuple(extra):
+        with open(module.__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+# the csv reader is part of the name: the pyarrow engine gives other dtypes than the c engine
+# (category order, datetime unit), so each engine has its own snapshot
+def snapshot_path(path, cache_dir=CACHE_DIR, kind='clean', engine='c'):
+    name = '%s-%s-%s-%s.feather' % (kind, engine, csv_digest(path, cache_dir)[:16], code_digest()[:16])
+    return os.path.join(cache_dir, name)
+
+
+# this function yields a new temporary file next to path and moves it over path once the block
+# completes (it is removed when the block fails). Every writer gets its own file, so runs writing
+# the same path at once do not write into each other's file before os.replace.
+@contextlib.contextmanager
+def atomic_path(path):
+    directory, name = os.path.split(path)
+    with tempfile.NamedTemporaryFile(dir=directory or '.', prefix=name + '.', suffix='.tmp', delete=False) as f:
+        tmp = f.name
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _atomic_write_text(path, text):
+    with atomic_path(path) as tmp:
+        with open(tmp, 'w') as f:
+            f.write(text)
+
+
+def write_snapshot(df, path):
+    import pyarrow as pa
+    from pyarrow import feather
+
+    # keep the index: the research questions refer to movies by their row label
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with atomic_path(path) as tmp:
+        feather.write_feather(table, tmp, compression='uncompressed')
+
+
+@traced('read_snapshot', 'load')
+def read_snapshot(path):
+    from pyarrow import feather
+
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+# this function loads and cleans the csv without the snapshot
+def clean_table(path='tmdb-movies.csv', engine='c', compact=False):
+    from tmdb.cleaning import clean_movies
+    from tmdb.loader import load_movies
+
+    df = clean_movies(load_movies(path, engine=engine))
+    if compact:
+        from tmdb.compact import compact as compact_frame
+        df = compact_frame(df)
+    return df
+
+
+# this function returns the cleaned movie table, from the snapshot when there is a valid one.
+# compact=True returns (and caches) the compact representation of tmdb.compact.
+# Without pyarrow the table is cleaned on every call.
+@traced('load_clean', 'load')
+def load_clean(path='tmdb-movies.csv', cache_dir=CACHE_DIR, engine='c', compact=False):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        warnings.warn("pyarrow is not installed, the cleaned snapshot is not cached")
+        return clean_table(path, engine, compact)
+
+    snapshot = snapshot_path(path, cache_dir, 'compact' if compact else 'clean', engine)
+    if os.path.exists(snapshot):
+        return read_snapshot(snapshot)
+    df = clean_table(path, engine, compact)
+    write_snapshot(df, snapshot)
+    return df
+
+
+# this function removes every snapshot, SQLite copy (tmdb.sqlbackend) and the digest index
+def clear_cache(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.endswith(('.feather', '.sqlite')) or name == 'digests.json':
+            os.remove(os.path.join(cache_dir, name))
@@ -0,0 +1,66 @@
+# The cleaning chain of the notebook as one function.
+#
+# Any change to this file changes the snapshot key in tmdb.cache, so cached snapshots made by an
+# older version of the cleaning are never reused.
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage, traced
+
+log = logging.getLogger(__name__)
+
+
+# columns that are not needed for any of the research questions
+DROP_COLUMNS = ['budget_adj', 'revenue_adj', 'overview', 'imdb_id', 'homepage', 'tagline']
+
+# number of dropped duplicates whose labels clean_movies logs
+LOGGED_DUPLICATES = 10
+
+
+# first half of the cleaning: drop unnecessary columns and parse release_date
+@traced('prepare', 'clean')
+def prepare(df):
+    df = df.drop(columns=[c for c in DROP_COLUMNS if c in df.columns])
+    if not pd.api.types.is_datetime64_any_dtype(df['release_date']):
+        with stage('to_datetime', 'clean'):
+            df['release_date'] = pd.to_datetime(df['release_date'])
+    return df
+
+
+# second half of the cleaning, after the duplicates are gone: treat 0 as missing and add Profit.
+# quality=True treats 0 as missing in budget, revenue and runtime only and adds the issue bitmask of
+# tmdb.quality instead of replacing 0 in every column.
+@traced('finish', 'clean')
+def finish(df, quality=False):
+    if quality:
+        from tmdb.quality import validate
+
+        df = validate(df)
+    else:
+        with stage('replace_zero', 'clean'):
+            df = df.replace(0, np.nan)
+    df['Profit'] = df['revenue'] - df['budget']
+    return df
+
+
+# this function applies the notebook's cleaning steps in order and returns a new frame:
+# drop unnecessary columns, parse release_date, remove duplicates, treat 0 as missing and add Profit.
+# keys limits the duplicate check to some columns (e.g. ['id']); fingerprint=True keeps the row
+# fingerprints used for it as a column (see tmdb.dedup); quality=True runs the column-scoped checks
+# of tmdb.quality instead of the blanket replace of 0. The duplicates dropped are logged (and
+# counted in the trace); drop_duplicates() returns the full table of them.
+@traced('clean_movies', 'clean')
+def clean_movies(df, keys=None, fingerprint=False, quality=False):
+    from tmdb.dedup import drop_duplicates
+
+    df, duplicates = drop_duplicates(prepare(df), keys, add_column=fingerprint)
+    if len(duplicates):
+        shown = ['%s (of %s)' % pair for pair in zip(duplicates['duplicate'][:LOGGED_DUPLICATES],
+                                                     duplicates['first'][:LOGGED_DUPLICATES])]
+        if len(duplicates) > LOGGED_DUPLICATES:
+            shown.append('...')
+        log.info("dropped %d duplicate rows: %s", len(duplicates), ', '.join(shown))
+    return finish(df, quality)
@@ -0,0 +1,162 @@
+# Command line entry point: python -m tmdb [csv] [options]
+#
+# Answers the research questions and (unless --no-plots) renders the charts. Only argparse is
+# imported up front; pandas is imported once the arguments are parsed and seaborn/matplotlib only
+# when a chart is rendered, so --no-plots runs never pay for the plotting stack.
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+# what a compute only run imports, and what rendering adds on top of it
+COMPUTE_IMPORTS = 'import tmdb.cache, tmdb.planner'
+PLOT_IMPORTS = 'import seaborn, matplotlib.figure'
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+# this function runs `python -X importtime -c statement` in a fresh interpreter and returns the
+# imports as (module, self us, cumulative us, depth), in the order they finished
+def importtime(statement):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_repo_root(), os.environ.get('PYTHONPATH')])))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                          capture_output=True, text=True, env=env, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def _repo_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# this function returns the cold import time of a statement in ms and the packages that took longest
+# (the self time of all their modules added up)
+def import_report(statement, top=8):
+    rows = importtime(statement)
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+    packages = {}
+    for module, self_us, _, _ in rows:
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return total, [(package, us / 1000) for package, us in slowest]
+
+
+def _print_import_report(label, statement):
+    total, slowest = import_report(statement)
+    print("%s imports: %.1f ms" % (label, total))
+    for module, ms in slowest:
+        print("  %8.1f ms  %s" % (ms, module))
+    return total
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m tmdb', description="Answer the TMDb research questions.")
+    parser.add_argument('csv', nargs='?', default='tmdb-movies.csv', help="path of tmdb-movies.csv")
+    parser.add_argument('-q', '--question', action='append', dest='questions',
+                        help="question to answer (repeatable), e.g. find_minmax:Profit; default: all of them")
+    parser.add_argument('--no-plots', action='store_true', help="only compute, do not render any chart")
+    parser.add_argument('--charts', default='charts', help="directory for the rendered charts")
+    parser.add_argument('--format', action='append', dest='formats', choices=['png', 'svg'],
+                        help="chart file format (repeatable), default png")
+    parser.add_argument('--workers', type=int, default=None, help="processes used to render the charts")
+    parser.add_argument('--engine', default='c', choices=['c', 'pyarrow'], help="csv reader")
+    parser.add_argument('--compact', action='store_true',
+                        help="keep the table as nullable integers and categoricals (tmdb.compact)")
+    parser.add_argument('--no-cache', action='store_true', help="clean the csv again instead of using the snapshot")
+    parser.add_argument('--backend', default='pandas', choices=['pandas', 'sqlite'],
+                        help="answer in memory (pandas) or as SQL over an on-disk SQLite copy of the csv (tmdb.sqlbackend)")
+    parser.add_argument('--database', metavar='PATH',
+                        help="with --backend sqlite: database file to use, loaded from the csv when missing")
+    parser.add_argument('--quiet', action='store_true', help="do not print the result tables")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="record every pipeline stage and write a Chrome trace-event JSON file")
+    parser.add_argument('--profile', action='append', choices=['cprofile', 'tracemalloc'],
+                        help="with --trace: also collect cProfile stats (PATH.prof) or traced allocations")
+    parser.add_argument('--import-time', action='store_true',
+                        help="report the cold import time of the compute and plotting code (-X importtime)")
+    parser.add_argument('--import-budget', type=float, metavar='MS',
+                        help="exit with status 1 if the compute only imports take longer than MS milliseconds")
+    return parser
+
+
+def load(path, engine='c', cache=True, compact=False):
+    if cache:
+        from tmdb.cache import load_clean
+        return load_clean(path, engine=engine, compact=compact)
+    from tmdb.cache import clean_table
+    return clean_table(path, engine, compact)
+
+
+# this function answers the questions that have SQL from the SQLite copy of the csv
+def answer_sql(args, questions):
+    from tmdb.sqlbackend import load_database, open_database, run_sql, supported
+
+    skipped = [name for name in questions if not supported(name)]
+    if skipped:
+        print("no SQL for %s, skipped" % ', '.join(skipped))
+    if args.database is None:
+        database = open_database(args.csv)
+    elif not os.path.exists(args.database):
+        database = load_database(args.csv, args.database)
+    else:
+        database = args.database
+    return run_sql(database, [name for name in questions if supported(name)])
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.import_time or args.import_budget is not None:
+        compute_ms = _print_import_report('compute', COMPUTE_IMPORTS)
+        if not args.no_plots:
+            _print_import_report('plotting', PLOT_IMPORTS)
+        if args.import_budget is not None and compute_ms > args.import_budget:
+            print("compute imports took %.1f ms, over the budget of %.1f ms" % (compute_ms, args.import_budget))
+            return 1
+        if not os.path.exists(args.csv):
+            return 0
+
+    if args.trace:
+        from tmdb import profiling
+        profiling.enable(args.trace, args.profile or ())
+
+    start = time.perf_counter()
+    import pandas as pd
+
+    from tmdb.planner import notebook_questions, run_plan
+
+    pd.options.display.float_format = '{:.2f}'.format
+    questions = args.questions or notebook_questions()
+    if not args.no_plots:
+        from tmdb.render import chart_questions
+        questions = questions + [q for q in chart_questions() if q not in questions]
+    if args.backend == 'sqlite':
+        results = answer_sql(args, questions)
+    else:
+        df = load(args.csv, args.engine, cache=not args.no_cache, compact=args.compact)
+        results = run_plan(df, questions)
+    if not args.quiet:
+        for name in [q for q in args.questions or notebook_questions() if q in results]:
+            print("== %s" % name)
+            print(results[name])
+            print()
+    print("answered %d questions in %.2f s" % (len(results), time.perf_counter() - start))
+
+    if not args.no_plots:
+        from tmdb.render import render_all
+        start = time.perf_counter()
+        rendered = render_all(results, args.charts, formats=tuple(args.formats or ['png']), workers=args.workers)
+        drawn = sum(1 for files in rendered.values() if files)
+        print("rendered %d charts (%d unchanged) in %.2f s" % (drawn, len(rendered) - drawn, time.perf_counter() - start))
+    if args.trace:
+        print("trace written to %s" % profiling.disable().path)
+    return 0
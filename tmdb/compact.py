@@ -0,0 +1,77 @@
+# Compact in-memory representation of the cleaned movie table.
+#
+# After cleaning, replace(0, np.nan) has turned budget, revenue, runtime and vote_count into float64
+# and every text column holds one string per row. compact() stores integral columns as the smallest
+# (nullable) integer type that fits, and text columns with repeated values (director, genres,
+# production_companies, ...) as categoricals, a dictionary of the distinct values plus one code per
+# row. A column is only converted when that takes less memory: a nullable Int64 needs a mask byte
+# on top of the 8 bytes of a float64, and a categorical of values that hardly repeat (cast) holds
+# every string plus the codes. Floats are left alone unless asked for, because float32 does not hold
+# values like 6.1 exactly.
+#
+#   df = compact(load_clean())
+#   print(memory_report(before, df))
+
+import numpy as np
+import pandas as pd
+
+_NULLABLE = ['Int8', 'Int16', 'Int32', 'Int64']
+_NUMPY = ['int8', 'int16', 'int32', 'int64']
+
+
+# this function returns the smallest integer dtype that holds the values of an integral column,
+# nullable when there are missing values; None when the column is not integral
+def integer_dtype(series):
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return None
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    present = values[~np.isnan(values)]
+    if len(present) and not np.array_equal(present, np.floor(present)):
+        return None
+    low, high = (present.min(), present.max()) if len(present) else (0, 0)
+    candidates = _NULLABLE if len(present) < len(values) else _NUMPY
+    for dtype in candidates:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+
+# this function returns the column as dtype when that takes less memory, else the column itself
+def _smaller(series, dtype):
+    converted = series.astype(dtype)
+    if converted.memory_usage(deep=True, index=False) < series.memory_usage(deep=True, index=False):
+        return converted
+    return series
+
+
+# this function returns a compact copy of df.
+# category_ratio: only text columns with fewer distinct values than this share of the rows are
+# tried as categoricals. floats=True also stores float columns as float32.
+def compact(df, category_ratio=0.9, floats=False):
+    columns = {}
+    for name, series in df.items():
+        dtype = integer_dtype(series)
+        if dtype is not None:
+            columns[name] = _smaller(series, dtype)
+        elif pd.api.types.is_float_dtype(series) and floats:
+            columns[name] = series.astype('float32')
+        elif (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) \
+                and series.nunique() < category_ratio * len(series):
+            columns[name] = _smaller(series, 'category')
+        else:
+            columns[name] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+# this function compares the memory used by every column of two versions of the same table
+def memory_report(before, after):
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False),
+        'after': after.memory_usage(deep=True, index=False),
+        'before_dtype': before.dtypes.astype(str),
+        'after_dtype': after.dtypes.astype(str),
+    })
+    report.loc['total', ['before', 'after']] = report[['before', 'after']].sum()
+    report['ratio'] = report['before'] / report['after']
+    return report
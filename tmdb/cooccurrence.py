@@ -0,0 +1,204 @@
+# Co-occurrence of the values of pipe separated columns: actor pairs, genre pairs, director x company.
+#
+# Built from the token codes of tmdb.multivalue, so no string is split again. Every pair of values
+# that appears together in at least one movie is one entry of a CSR matrix over the codes of the two
+# columns (indptr over the first value, indices = second value, counts = number of movies). The movies
+# of every pair are kept as a second CSR array (rows), which gives per-pair sums and means of any
+# per-movie column (revenue, Profit, ...) with one reduceat.
+#
+#   actors = Cooccurrence.build(df, 'cast')                      # unordered pairs of one column
+#   actors.top(20)                                               # actors appearing together most
+#   Cooccurrence.build(df, 'genres').top_by(df['revenue'], 10)   # genre pairs by total revenue
+#   Cooccurrence.build(df, 'director', 'production_companies').top(10)
+#
+# save() writes the arrays as .npy files and load() memory-maps them, so worker processes opening
+# the same directory share one copy through the page cache instead of building their own.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from tmdb.multivalue import MultiValueIndex
+from tmdb.planner import select_positions
+from tmdb.profiling import stage, traced
+
+ARRAYS = ('indptr', 'indices', 'counts', 'row_indptr', 'rows')
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+# this function returns, for every group of a CSR layout with the given group sizes, the offset of
+# each of its members within the group (0, 1, ..., size - 1)
+def _offsets(sizes):
+    starts = np.cumsum(sizes) - sizes
+    return np.arange(sizes.sum(), dtype=np.int64) - np.repeat(starts, sizes)
+
+
+# this function returns the (first code, second code, row) of every pair of values in the same row.
+# With second=None the pairs are the unordered pairs of distinct values of first (lower code first).
+def _pairs(first, second=None):
+    rows = first.rows()
+    if second is None:
+        # entry e at position k of a row of length L pairs with the L - 1 - k entries after it
+        lengths = np.diff(first.indptr)
+        position = _offsets(lengths)
+        after = np.repeat(lengths, lengths) - 1 - position
+        left = np.repeat(np.arange(len(rows), dtype=np.int64), after)
+        right = left + 1 + _offsets(after)
+        a, b = first.indices[left], first.indices[right]
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        keep = a != b
+        return a[keep], b[keep], rows[left][keep]
+    # every entry of first pairs with every entry of second in the same row
+    partners = np.diff(second.indptr)[rows]
+    left = np.repeat(np.arange(len(rows), dtype=np.int64), partners)
+    right = np.repeat(second.indptr[:-1][rows], partners) + _offsets(partners)
+    return first.indices[left], second.indices[right], rows[left]
+
+
+class Cooccurrence:
+
+    def __init__(self, first, second, indptr, indices, counts, row_indptr, rows):
+        # vocabularies (pd.Index) of the first and the second column
+        self.first = first
+        self.second = second
+        # CSR matrix: the pairs of first value i are indices[indptr[i]:indptr[i + 1]] (second values)
+        self.indptr = indptr
+        self.indices = indices
+        # number of movies of every pair
+        self.counts = counts
+        # the movies (row positions) of pair p are rows[row_indptr[p]:row_indptr[p + 1]]
+        self.row_indptr = row_indptr
+        self.rows = rows
+
+    # this function builds the pairs of one column (first only) or of two columns. indexes can hold
+    # the MultiValueIndex of the columns already built (build_indexes).
+    @classmethod
+    @traced('cooccurrence', 'index')
+    def build(cls, df, first, second=None, indexes=None):
+        indexes = indexes or {}
+        a = indexes[first] if first in indexes else MultiValueIndex.from_series(df[first])
+        b = None
+        if second is not None:
+            b = indexes[second] if second in indexes else MultiValueIndex.from_series(df[second])
+        b_or_a = a if b is None else b
+        with stage('pairs', 'index', columns='%s,%s' % (first, second or first)):
+            codes_a, codes_b, rows = _pairs(a, b)
+            width = len(b_or_a.vocabulary)
+            keys = codes_a.astype(np.int64) * width + codes_b
+            order = np.lexsort((rows, keys))
+            keys, rows = keys[order], rows[order]
+            # a value listed twice in a movie counts the movie once
+            if len(keys):
+                distinct = np.ones(len(keys), dtype=bool)
+                distinct[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+                keys, rows = keys[distinct], rows[distinct]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, np.int64)
+            pairs = keys[starts]
+            row_indptr = np.append(starts, len(keys)).astype(np.int64)
+            indptr = np.zeros(len(a.vocabulary) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(pairs // width, minlength=len(a.vocabulary)), out=indptr[1:])
+            row_dtype = np.int32 if len(df) < 2 ** 31 else np.int64
+        return cls(a.vocabulary, b_or_a.vocabulary, indptr, (pairs % width).astype(np.int32),
+                   np.diff(row_indptr).astype(np.int32), row_indptr, rows.astype(row_dtype))
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    # first value code of every pair
+    def pair_first(self):
+        return np.repeat(np.arange(len(self.first), dtype=np.int32), np.diff(self.indptr))
+
+    # this function returns a table of the given pairs: first, second, count (and more columns)
+    def _table(self, pairs, **columns):
+        table = pd.DataFrame({
+            'first': self.first[self.pair_first()[pairs]],
+            'second': self.second[self.indices[pairs]],
+            'count': self.counts[pairs],
+        })
+        for name, values in columns.items():
+            table[name] = values[pairs]
+        return table
+
+    # this function returns the n pairs seen in the most movies, ties in order of the codes
+    def top(self, n=20):
+        return self._table(select_positions(self.counts.astype(np.float64), n))
+
+    # number of movies in which two values appear together
+    def count(self, first, second):
+        i, j = self.first.get_loc(first), self.second.get_loc(second)
+        if self.first is self.second and i > j:
+            i, j = j, i
+        start, end = self.indptr[i], self.indptr[i + 1]
+        k = start + np.searchsorted(self.indices[start:end], j)
+        return int(self.counts[k]) if k < end and self.indices[k] == j else 0
+
+    # this function returns the values paired with one value and their number of movies, largest first
+    def partners(self, value):
+        i = self.first.get_loc(value)
+        start, end = self.indptr[i], self.indptr[i + 1]
+        partners = pd.Series(self.counts[start:end], index=self.second[self.indices[start:end]], name='count')
+        if self.first is self.second:
+            # with unordered pairs the value can also be the second of a pair
+            j = self.second.get_loc(value)
+            before = np.flatnonzero(self.indices[:self.indptr[i]] == j)
+            if len(before):
+                firsts = self.pair_first()[before]
+                partners = pd.concat([pd.Series(self.counts[before], index=self.first[firsts], name='count'), partners])
+        return partners.sort_values(ascending=False, kind='stable')
+
+    # this function aggregates a per-movie array (revenue, Profit, ...) over the movies of every pair.
+    # how is one of AGGREGATIONS; NaN values are skipped like pandas does.
+    def aggregate(self, values, how='sum'):
+        if how not in AGGREGATIONS:
+            raise ValueError("how must be one of %s, got %r" % (AGGREGATIONS, how))
+        values = np.asarray(values, dtype=np.float64)[self.rows]
+        valid = ~np.isnan(values)
+        starts = self.row_indptr[:-1]
+        if not len(starts):
+            return np.zeros(0)
+        count = np.add.reduceat(valid.astype(np.int64), starts)
+        if how == 'count':
+            return count
+        if how in ('min', 'max'):
+            # fmin/fmax skip NaN unless a pair has no value at all
+            return (np.fmin if how == 'min' else np.fmax).reduceat(values, starts)
+        total = np.add.reduceat(np.where(valid, values, 0), starts)
+        if how == 'sum':
+            return total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
+    # this function returns the n pairs with the largest aggregate of a per-movie array, for pairs
+    # seen in at least min_count movies
+    def top_by(self, values, n=20, how='sum', min_count=1):
+        name = getattr(values, 'name', None) or 'value'
+        aggregated = self.aggregate(values, how).astype(np.float64)
+        candidates = np.where(self.counts >= min_count, aggregated, np.nan)
+        return self._table(select_positions(candidates, n), **{'%s_%s' % (name, how): aggregated})
+
+    # this function writes the arrays as .npy files and the vocabularies as JSON into directory
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'vocabulary.json'), 'w') as f:
+            second = None if self.second is self.first else list(self.second)
+            json.dump({'first': list(self.first), 'second': second}, f)
+        return directory
+
+    # this function opens a saved matrix; the arrays are memory-mapped read-only (mmap_mode=None reads them)
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in ARRAYS]
+        with open(os.path.join(directory, 'vocabulary.json')) as f:
+            vocabulary = json.load(f)
+        first = pd.Index(vocabulary['first'])
+        second = first if vocabulary['second'] is None else pd.Index(vocabulary['second'])
+        return cls(first, second, *arrays)
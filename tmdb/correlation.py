@@ -0,0 +1,196 @@
+# Correlation matrix of the numeric columns, computed once and looked up per pair.
+#
+# The notebook's corr(x, y) runs df.corr() over the whole frame to read one cell, and
+# plot_correlation_map computes it again. corr_matrix(df) computes the matrix once with a few
+# matrix products, remembers it for that frame and corr(df, x, y) is then a lookup that only checks
+# the two columns it reads. An edit of the frame is noticed through copy-on-write, as in tmdb.topk.
+#
+# The matrix is kept as per pair moments (count, means, squared deviations, co-moment), so rows
+# appended later are folded in with append() without going over the old rows again.
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage
+from tmdb.topk import column_buffer, copy_on_write
+
+NAN_POLICIES = ('pairwise', 'complete')
+
+
+# this function returns the moments of every pair of columns of a 2d float array.
+# n[i, j] is the number of rows where both columns are present; mean[i, j] and m2[i, j] are the mean
+# and the sum of squared deviations of column i over those rows; cxy[i, j] is the co-moment.
+def pairwise_moments(values):
+    present = ~np.isnan(values)
+    mask = present.astype(np.float64)
+    counts = mask.sum(axis=0)
+    # shifting every column by its own mean first keeps the sums below well conditioned
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(counts > 0, np.where(present, values, 0.0).sum(axis=0) / counts, 0.0)
+    x = np.where(present, values - shift, 0.0)
+    n = mask.T @ mask
+    sx = x.T @ mask
+    sxx = (x * x).T @ mask
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, sx / n, 0.0)
+    m2 = np.maximum(sxx - mean * sx, 0.0)
+    cxy = x.T @ x - mean * sx.T
+    return n, mean + shift[:, None], m2, cxy
+
+
+# this function combines the moments of two sets of rows (Chan et al.)
+def merge_moments(a, b):
+    n_a, mean_a, m2_a, cxy_a = a
+    n_b, mean_b, m2_b, cxy_b = b
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(n > 0, n_b / n, 0.0)
+        cross = np.where(n > 0, n_a * n_b / n, 0.0)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * weight
+    m2 = m2_a + m2_b + delta * delta * cross
+    cxy = cxy_a + cxy_b + delta * delta.T * cross
+    return n, mean, m2, cxy
+
+
+# this function takes the moments of some rows (b) back out of the moments of all rows (total)
+def unmerge_moments(total, b):
+    n, mean, m2, cxy = total
+    n_b, mean_b, m2_b, cxy_b = b
+    n_a = n - n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_a = np.where(n_a > 0, (n * mean - n_b * mean_b) / n_a, 0.0)
+        cross = np.where(n > 0, n_a * n_b / n, 0.0)
+    delta = mean_b - mean_a
+    m2_a = np.maximum(m2 - m2_b - delta * delta * cross, 0.0)
+    cxy_a = cxy - cxy_b - delta * delta.T * cross
+    return n_a, mean_a, m2_a, cxy_a
+
+
+def correlation_from_moments(moments):
+    n, _, m2, cxy = moments
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cxy / np.sqrt(m2 * m2.T)
+    corr[(n == 0) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1, 1)
+
+
+# pearson correlation matrix of the numeric columns.
+# nan_policy='pairwise' uses for every pair the rows where both values are present (like df.corr()),
+# 'complete' only uses the rows where every column is present.
+# It is also a mergeable aggregate (update/merge/result) for tmdb.aggregates.
+class CorrelationMatrix:
+
+    name = 'corr'
+
+    def __init__(self, columns=None, nan_policy='pairwise'):
+        if nan_policy not in NAN_POLICIES:
+            raise ValueError("nan_policy must be one of %s, got %r" % (NAN_POLICIES, nan_policy))
+        self.columns = None if columns is None else list(columns)
+        self.nan_policy = nan_policy
+        self.moments = None
+        self._matrix = None
+        self._positions = None
+
+    @property
+    def inputs(self):
+        return self.columns or []
+
+    def _moments(self, df):
+        values = df[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        if self.nan_policy == 'complete':
+            values = values[~np.isnan(values).any(axis=1)]
+        with stage('corr_moments', 'question', rows=len(values), columns=len(self.columns)):
+            return pairwise_moments(values)
+
+    def update(self, df):
+        if self.columns is None:
+            from tmdb.dedup import FINGERPRINT
+            self.columns = [c for c in df.select_dtypes('number').columns if c != FINGERPRINT]
+        self._offer(self._moments(df))
+
+    # append new rows to the matrix
+    append = update
+
+    def merge(self, other):
+        if other.moments is not None:
+            self._offer(other.moments)
+
+    # take rows added before back out (tmdb.incremental)
+    def remove(self, df):
+        if self.moments is not None:
+            self.moments = unmerge_moments(self.moments, self._moments(df))
+            self._matrix = None
+        return True
+
+    def _offer(self, moments):
+        self.moments = moments if self.moments is None else merge_moments(self.moments, moments)
+        self._matrix = None
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            corr = correlation_from_moments(self.moments)
+            self._matrix = pd.DataFrame(corr, index=self.columns, columns=self.columns)
+            self._positions = {c: i for i, c in enumerate(self.columns)}
+        return self._matrix
+
+    def result(self):
+        return self.matrix
+
+    # correlation of two columns
+    def get(self, x, y):
+        values = self.matrix.to_numpy()
+        return values[self._positions[x], self._positions[y]]
+
+
+# matrices of the frames seen so far:
+# (id(df), nan_policy) -> (weak reference, columns, rows, {column: (view, buffer)}, matrix)
+_memo = {}
+
+
+# this function returns the buffer behind every column of df (like the sorted indexes of tmdb.topk),
+# with a view of the column: keeping the view makes a write into the frame copy the buffer it writes
+# to, so an in-place edit shows as a new buffer
+def column_buffers(df):
+    return {name: (view, column_buffer(view)) for name, view in df.items()}
+
+
+# this function returns the matrix remembered for df when it is still up to date: same columns and
+# rows, and the same buffers behind the given columns (all of them by default)
+def _remembered(df, nan_policy, columns=None):
+    entry = _memo.get((id(df), nan_policy))
+    if entry is None or entry[0]() is not df or entry[1] is not df.columns or entry[2] != len(df):
+        return None
+    buffers = entry[3]
+    for name in buffers if columns is None else columns:
+        if name not in buffers or column_buffer(df[name]) != buffers[name][1]:
+            return None
+    return entry[4]
+
+
+# this function returns the correlation matrix of df, computed once per version of the frame.
+# Without copy-on-write (see tmdb.topk.copy_on_write) an edit cannot be seen, so it is computed every time.
+def corr_matrix(df, nan_policy='pairwise'):
+    if copy_on_write():
+        matrix = _remembered(df, nan_policy)
+        if matrix is not None:
+            return matrix
+    matrix = CorrelationMatrix(nan_policy=nan_policy)
+    matrix.update(df)
+    if copy_on_write():
+        key = (id(df), nan_policy)
+        _memo[key] = (weakref.ref(df, lambda _, key=key: _memo.pop(key, None)), df.columns, len(df),
+                      column_buffers(df), matrix)
+    return matrix
+
+
+# this function returns the correlation of two columns of df. A pairwise correlation only depends on
+# its two columns, so only their buffers are checked.
+def corr(df, x, y):
+    matrix = _remembered(df, 'pairwise', (x, y)) if copy_on_write() else None
+    if matrix is None:
+        matrix = corr_matrix(df)
+    return matrix.get(x, y)
@@ -0,0 +1,138 @@
+# Date parts and a sorted time index of release_date.
+#
+# Month_Release runs .dt.month over the whole column on every call, and a date range filter
+# (release_date between two dates) compares every row. DateIndex derives the date parts once as
+# small integer arrays (year int16, month/weekday/quarter int8, 0 for a missing date) and sorts the
+# dates once (a stable argsort kept as an int32 permutation, NaT last). A range query is then two
+# binary searches and a slice, and monthly counts over a range only read the rows in it.
+#
+#   index = date_index(df)                       # cached per frame, rebuilt when release_date changes
+#   index.count_between('2010-01-01', '2010-12-31')
+#   index.rows(df, '2015-06-01', '2015-08-31')   # same rows as df[df.release_date.between(...)]
+#   index.month_counts()                         # same table as month_release
+#   index.month_year_counts()                    # movies per month (columns) per year (rows)
+#   index.rolling_monthly(12)                    # releases over the last 12 months, every month
+#
+# The parts follow the parsed dates like .dt does; with the dump's two digit years the year of
+# release_date can differ from the release_year column.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage
+from tmdb.topk import cached
+
+# datetime64[M] counts the months since January 1970
+_EPOCH_YEAR = 1970
+
+
+class DateIndex:
+
+    def __init__(self, name, order, times, year, month, weekday, quarter):
+        self.name = name
+        # positions of the rows in ascending order of date, ties in row order, NaT last
+        self.order = order
+        # the dates of the non-NaT rows in that order (datetime64[ns])
+        self.times = times
+        # date parts of every row, 0 where the date is missing
+        self.year = year
+        self.month = month
+        # Monday is 0, like .dt.weekday
+        self.weekday = weekday
+        self.quarter = quarter
+
+    @classmethod
+    def from_series(cls, series):
+        with stage('date_index', 'index', column=str(series.name), rows=len(series)):
+            values = np.asarray(series, dtype='datetime64[ns]')
+            missing = np.isnat(values)
+            days = values.astype('datetime64[D]')
+            months = days.astype('datetime64[M]').astype(np.int64)
+            year = np.where(missing, 0, months // 12 + _EPOCH_YEAR).astype(np.int16)
+            month = np.where(missing, 0, months % 12 + 1).astype(np.int8)
+            # 1970-01-01 was a Thursday
+            weekday = np.where(missing, 0, (days.astype(np.int64) + 3) % 7).astype(np.int8)
+            quarter = np.where(missing, 0, (month - 1) // 3 + 1).astype(np.int8)
+            dtype = np.int32 if len(values) < 2 ** 31 else np.int64
+            # NaT sorts last in numpy
+            order = np.argsort(values, kind='stable').astype(dtype)
+            times = values[order[:len(values) - int(missing.sum())]]
+        return cls(series.name, order, times, year, month, weekday, quarter)
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.order, self.times, self.year, self.month, self.weekday, self.quarter))
+
+    # the date parts as a frame aligned with the rows
+    def parts(self, index=None):
+        return pd.DataFrame({'year': self.year, 'month': self.month, 'weekday': self.weekday,
+                             'quarter': self.quarter}, index=index)
+
+    # this function returns the slice of the sorted dates between start and end (both included;
+    # None leaves a side open)
+    def _bounds(self, start=None, end=None):
+        low = 0 if start is None else np.searchsorted(self.times, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+        high = len(self) if end is None else np.searchsorted(self.times, np.datetime64(pd.Timestamp(end), 'ns'), 'right')
+        return low, max(low, high)
+
+    def count_between(self, start=None, end=None):
+        low, high = self._bounds(start, end)
+        return int(high - low)
+
+    # positions of the rows released between start and end, in order of date
+    def between(self, start=None, end=None):
+        low, high = self._bounds(start, end)
+        return self.order[low:high]
+
+    # this function returns the rows of df released between start and end, in row order
+    def rows(self, df, start=None, end=None):
+        return df.iloc[np.sort(self.between(start, end))]
+
+    # number of movies per release month (1 - 12) over all years, like month_release
+    def month_counts(self):
+        counts = np.bincount(self.month, minlength=13)[1:]
+        months = np.flatnonzero(counts) + 1
+        # .dt.month is float when a date is missing, int32 otherwise
+        dtype = np.float64 if len(self) < len(self.month) else np.int32
+        index = pd.Index(months.astype(dtype), name=self.name)
+        return pd.Series(counts[months - 1].astype(np.int64), index=index, name='count')
+
+    # number of movies per month of every year: one row per year, one column per month
+    def month_year_counts(self):
+        present = self.month > 0
+        if not present.any():
+            return pd.DataFrame(columns=range(1, 13))
+        years = self.year[present].astype(np.int64)
+        low = years.min()
+        buckets = (years - low) * 12 + self.month[present] - 1
+        counts = np.bincount(buckets, minlength=(years.max() - low + 1) * 12).reshape(-1, 12)
+        table = pd.DataFrame(counts, index=pd.RangeIndex(low, years.max() + 1, name='year'),
+                             columns=pd.RangeIndex(1, 13, name='month'))
+        return table[counts.sum(axis=1) > 0]
+
+    # this function returns the number of movies released in every calendar month between start
+    # and end, months without releases included
+    def monthly(self, start=None, end=None):
+        low, high = self._bounds(start, end)
+        if low == high:
+            return pd.Series([], index=pd.PeriodIndex([], freq='M', name=self.name), dtype=np.int64, name='count')
+        buckets = self.times[low:high].astype('datetime64[M]').astype(np.int64)
+        first = int(buckets[0])
+        counts = np.bincount(buckets - first)
+        index = pd.PeriodIndex.from_ordinals(np.arange(first, first + len(counts)), freq='M', name=self.name)
+        return pd.Series(counts.astype(np.int64), index=index, name='count')
+
+    # releases in the window months up to and including every month between start and end
+    def rolling_monthly(self, window=12, start=None, end=None):
+        counts = self.monthly(start, end)
+        total = np.cumsum(counts.to_numpy())
+        total[window:] = total[window:] - total[:-window]
+        return pd.Series(total, index=counts.index, name='rolling_%d' % window)
+
+
+# this function returns the DateIndex of a date column of df, built on first use and after every change of the column
+def date_index(df, column='release_date'):
+    return cached(df, column, DateIndex.from_series)
@@ -0,0 +1,79 @@
+# Duplicate removal on 64-bit row fingerprints.
+#
+# The notebook calls sum(df.duplicated()) and then df.drop_duplicates(), which compares every column
+# of every row twice. Here every row is hashed once (tmdb.fingerprints), duplicates are found on the
+# uint64 fingerprints, and only the few rows flagged as duplicates are compared value by value to
+# rule out hash collisions. The fingerprints can be kept as a column of the cleaned frame; they are
+# the same ones tmdb.incremental remembers, so a cleaned table and an ingest state can be matched up.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.fingerprints import row_fingerprints
+from tmdb.profiling import stage
+
+# name of the fingerprint column added by clean_movies(fingerprint=True)
+FINGERPRINT = 'fingerprint'
+
+
+# this function hashes the key columns of every row (all columns when keys is None)
+def fingerprint(df, keys=None):
+    return row_fingerprints(df if keys is None else df[list(keys)])
+
+
+def _same_values(df, first, later):
+    a = df.iloc[first].reset_index(drop=True)
+    b = df.iloc[later].reset_index(drop=True)
+    return ((a == b) | (a.isna() & b.isna())).all(axis=1).to_numpy()
+
+
+# this function returns the positions of the rows whose key columns repeat an earlier row and the
+# positions of the rows they repeat, in row order
+def _duplicate_positions(df, keys, fingerprints):
+    codes, _ = pd.factorize(fingerprints)
+    _, first_of_code = np.unique(codes, return_index=True)
+    first = first_of_code[codes]
+    later = np.flatnonzero(first != np.arange(len(codes)))
+    first = first[later]
+    if len(later):
+        # a different row with the same fingerprint is a hash collision, not a duplicate
+        same = _same_values(df if keys is None else df[list(keys)], first, later)
+        later, first = later[same], first[same]
+    return later, first
+
+
+# this function finds the rows whose key columns repeat an earlier row.
+# It returns a table with the label of every duplicate, the label of the row it repeats and their
+# fingerprint, in row order.
+def find_duplicates(df, keys=None, fingerprints=None):
+    if fingerprints is None:
+        fingerprints = fingerprint(df, keys)
+    later, first = _duplicate_positions(df, keys, fingerprints)
+    return _duplicates_table(df, later, first, fingerprints)
+
+
+def _duplicates_table(df, later, first, fingerprints):
+    return pd.DataFrame({
+        'duplicate': df.index[later],
+        'first': df.index[first],
+        FINGERPRINT: fingerprints[later],
+    })
+
+
+# this function drops the duplicated rows (keeping the first) and returns (frame, duplicates table).
+# With add_column=True the frame gets the fingerprints of its rows as a uint64 column. The trace
+# stage counts the rows and the duplicates.
+def drop_duplicates(df, keys=None, fingerprints=None, add_column=False):
+    with stage('drop_duplicates', 'clean') as info:
+        if fingerprints is None:
+            fingerprints = fingerprint(df, keys)
+        later, first = _duplicate_positions(df, keys, fingerprints)
+        # by position: a repeated row label must not drop the other rows that carry it
+        keep = np.ones(len(df), dtype=bool)
+        keep[later] = False
+        result = df[keep]
+        if add_column:
+            result = result.assign(**{FINGERPRINT: fingerprints[keep]})
+        info['rows'] = len(result)
+        info['duplicates'] = len(later)
+    return result, _duplicates_table(df, later, first, fingerprints)
@@ -0,0 +1,46 @@
+# 64-bit row fingerprints and a compact set to remember them.
+
+import numpy as np
+import pandas as pd
+
+
+# this function hashes every row (the values only, not the index) into one uint64
+def row_fingerprints(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+class FingerprintSet:
+    # Set of uint64 fingerprints kept as a few sorted arrays (8 bytes per entry instead of a Python int
+    # in a set). A new run is merged into the previous one while that one is not more than twice as
+    # big, so there are only O(log n) runs to search.
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(r) for r in self.runs)
+
+    @property
+    def nbytes(self):
+        return sum(r.nbytes for r in self.runs)
+
+    # boolean array: which of the fingerprints are already in the set
+    def contains(self, fingerprints):
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run in self.runs:
+            pos = np.searchsorted(run, fingerprints)
+            pos[pos == len(run)] = 0
+            found |= run[pos] == fingerprints
+        return found
+
+    def add(self, fingerprints):
+        run = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        if len(run):
+            run = run[~self.contains(run)]
+        if not len(run):
+            return
+        self.runs.append(run)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            self.runs[-1] = np.union1d(self.runs[-1], last)
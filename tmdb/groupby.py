@@ -0,0 +1,119 @@
+# Group-by for small integer keys (release_year, month, runtime) on dense arrays.
+#
+# compare_two_x averages every numeric column per year to keep one of them, and the yearly counts
+# of research question 1 count every column to read 'id'. Here the key is turned into an offset
+# into a dense array (key - smallest key) and only the requested columns are aggregated, each with
+# np.bincount, so several aggregations of several columns cost one pass over the key.
+#
+#   group_aggregate(df, 'release_year', {'runtime': ['mean', 'count'], 'id': 'count'})
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import traced
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max', 'size')
+
+# keys spanning more distinct values than this are handed to pandas
+MAX_SPAN = 1 << 22
+
+
+def _dense_codes(keys):
+    values = keys.to_numpy()
+    if values.dtype.kind in 'iu':
+        # integer keys have no missing values and need no integrality check
+        if not len(values):
+            return None
+        # the span and the offsets are taken in 64 bits: int8/int16 keys near their limits would wrap
+        low, high = int(values.min()), int(values.max())
+        if high - low >= MAX_SPAN:
+            return None
+        wide = values if values.dtype == np.uint64 else values.astype(np.int64)
+        return (wide - wide.dtype.type(low)).astype(np.intp), None, low, high - low + 1
+    values = keys.to_numpy(dtype=np.float64, na_value=np.nan)
+    present = ~np.isnan(values)
+    if present.all():
+        present = None
+    else:
+        values = values[present]
+    if not len(values):
+        return None
+    low, high = values.min(), values.max()
+    if high - low >= MAX_SPAN or not np.array_equal(values, np.floor(values)):
+        return None
+    return (values - low).astype(np.intp), present, int(low), int(high - low) + 1
+
+
+def _aggregate(values, codes, size, how, rows):
+    if how == 'size':
+        return rows
+    valid = ~np.isnan(values)
+    if valid.all():
+        # no missing values: every row of a group counts
+        count = rows
+    else:
+        codes, values = codes[valid], values[valid]
+        count = np.bincount(codes, minlength=size)
+    if how == 'count':
+        return count
+    if how in ('sum', 'mean'):
+        total = np.bincount(codes, weights=values, minlength=size)
+        if how == 'sum':
+            return total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+    # min/max: np.minimum.at/np.maximum.at only over the present values
+    fill = np.inf if how == 'min' else -np.inf
+    out = np.full(size, fill)
+    (np.minimum if how == 'min' else np.maximum).at(out, codes, values)
+    out[count == 0] = np.nan
+    return out
+
+
+# this function aggregates columns of df per value of key, like df.groupby(key).agg(spec).
+# key is a column name or a Series aligned with df (e.g. df['release_date'].dt.month).
+# spec maps a column to one aggregation or a list of them (count, sum, mean, min, max, size).
+# Keys that are not small integers fall back to pandas.
+@traced('group_aggregate', 'question')
+def group_aggregate(df, key, spec):
+    for hows in spec.values():
+        for how in [hows] if isinstance(hows, str) else hows:
+            if how not in AGGREGATIONS:
+                raise ValueError("unknown aggregation %r, expected one of %s" % (how, AGGREGATIONS))
+    keys = df[key] if isinstance(key, str) else key
+    dense = _dense_codes(keys)
+    if dense is None:
+        return df.groupby(keys).agg(spec)
+    codes, present, low, size = dense
+    # groups are the key values that occur, whatever the aggregated values are
+    rows = np.bincount(codes, minlength=size)
+    occurs = rows > 0
+    columns = {}
+    for column, hows in spec.items():
+        values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        if present is not None:
+            values = values[present]
+        for how in [hows] if isinstance(hows, str) else hows:
+            name = column if isinstance(hows, str) else (column, how)
+            result = _aggregate(values, codes, size, how, rows)[occurs]
+            if how in ('count', 'size'):
+                result = result.astype(np.int64)
+            columns[name] = result
+    index_dtype = keys.dtype if keys.dtype.kind in 'iuf' else np.int64
+    wide = np.dtype(np.uint64 if keys.dtype == np.uint64 else np.int64)
+    labels = np.flatnonzero(occurs).astype(wide) + wide.type(low)
+    index = pd.Index(labels, name=keys.name).astype(index_dtype)
+    result = pd.DataFrame(columns, index=index)
+    if any(isinstance(name, tuple) for name in columns):
+        result.columns = pd.MultiIndex.from_tuples([n if isinstance(n, tuple) else (n, '') for n in columns])
+    return result
+
+
+# average of y for every value of x (compare_two_y / compare_two_x)
+def group_mean(df, x, y):
+    return group_aggregate(df, x, {y: 'mean'})[y]
+
+
+# number of non missing values of value per key (research question 1 counts 'id' per release_year)
+def group_count(df, key, value='id'):
+    return group_aggregate(df, key, {value: 'count'})[value]
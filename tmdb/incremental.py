@@ -0,0 +1,218 @@
+# Incremental ingest: fold daily delta files of new or changed movies into saved aggregate state.
+#
+# The state holds the mergeable aggregates of tmdb.aggregates (counts, sums, moments, token counts,
+# and a bounded set of candidate rows for min/max and top-k) and, for every movie keyed on its id,
+# the fingerprint of its current row and the values the aggregates read from it (their `inputs`, no
+# other column). A delta file is cleaned chunk by chunk:
+#
+#   - a row of a movie the state does not know yet is added to the aggregates
+#   - a row that differs from the current row of its movie replaces it: the old values are taken
+#     back out of the aggregates (remove) before the new row is added
+#   - a row equal to the current row of its movie changes nothing, so ingesting a file twice
+#     changes nothing
+#
+# Within a file the last row of a movie wins. Rows without an id cannot be matched to a movie; they
+# are deduplicated on their fingerprint, like drop_duplicates() does. The work is proportional to
+# the size of the delta: replaced values are dropped once they outnumber the current ones, and a
+# kept min/max or top-k row that changes is replaced by the next candidate. Only the distinct
+# counts of tmdb.sketches, which cannot forget a value, are computed again over the kept values.
+#
+# The results are those of the notebook run on the current rows, in the order they were ingested (a
+# changed movie moves to the place of its newest row). Only values of a pipe separated column tied
+# on their count can come in another order: a value keeps its place while any movie lists it.
+#
+#   python -m tmdb.incremental state.pkl tmdb-movies.csv      (first run builds the state)
+#   python -m tmdb.incremental state.pkl delta-2026-10-18.csv
+
+import copy
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from tmdb.aggregates import notebook_aggregates
+from tmdb.cleaning import finish, prepare
+from tmdb.fingerprints import FingerprintSet, row_fingerprints
+from tmdb.loader import iter_movies
+
+
+class IncrementalState:
+
+    def __init__(self, aggregates=None):
+        self.aggregates = notebook_aggregates() if aggregates is None else aggregates
+        # empty copies, to compute an aggregate again when it cannot take a row back out
+        self.templates = copy.deepcopy(self.aggregates)
+        # id -> (part, position in the part, fingerprint) of the current row of every movie
+        self.movies = {}
+        # the values the aggregates read from the rows ingested so far, which of them are still
+        # current, and how many are not
+        self.inputs = None
+        self.parts = []
+        self.alive = []
+        self.retired = 0
+        # fingerprints of the rows without an id
+        self.seen = FingerprintSet()
+        # rows read from all files, duplicates included; the next file's rows are labelled from here
+        self.rows_read = 0
+        # current rows, the ones in the aggregates
+        self.rows = 0
+
+    # this function picks the rows of a prepared chunk that change the state: positions of the rows
+    # of new or changed movies (the last row of each movie that differs from the row before it) and
+    # of the rows without an id that were not seen before
+    def _changes(self, chunk, fingerprints):
+        ids = chunk['id']
+        keyed = ids.notna().to_numpy()
+        keep = np.zeros(len(chunk), dtype=bool)
+        if not keyed.all():
+            loose = ~keyed & ~chunk.duplicated().to_numpy() & ~self.seen.contains(fingerprints)
+            self.seen.add(fingerprints[loose])
+            keep |= loose
+        positions = np.flatnonzero(keyed)
+        if not len(positions):
+            return keep
+        keys = ids[keyed].to_numpy(dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        keys, prints, positions = keys[order], fingerprints[positions][order], positions[order]
+        # a row changes its movie when it differs from the movie's row before it: the previous row
+        # of the chunk, or the current row of the state for the first row of the movie in the chunk
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        changed = np.ones(len(keys), dtype=bool)
+        changed[1:] = prints[1:] != prints[:-1]
+        for i in np.flatnonzero(first):
+            current = self.movies.get(int(keys[i]))
+            changed[i] = current is None or current[2] != prints[i]
+        rows = np.flatnonzero(changed)
+        # of those, the last one of every movie, unless it is the movie's current row again
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = keys[rows[1:]] != keys[rows[:-1]]
+        rows = rows[last]
+        for j, i in enumerate(rows):
+            current = self.movies.get(int(keys[i]))
+            if current is not None and current[2] == prints[i]:
+                rows[j] = -1
+        keep[positions[rows[rows >= 0]]] = True
+        return keep
+
+    # this function returns the values the aggregates read from the current rows, in the order they
+    # were ingested
+    def current(self):
+        parts = [part[alive] for part, alive in zip(self.parts, self.alive) if alive.any()]
+        return pd.concat(parts) if parts else None
+
+    # this function folds a csv (the full dump or a delta) into the state and returns
+    # (new movies, changed movies, rows that changed nothing)
+    def ingest(self, path, chunksize=100_000):
+        added = changed = read = 0
+        stale = set()
+        for chunk in iter_movies(path, chunksize):
+            # label the rows as if the file had been appended to everything read before
+            chunk.index = pd.RangeIndex(self.rows_read, self.rows_read + len(chunk))
+            self.rows_read += len(chunk)
+            read += len(chunk)
+            chunk = prepare(chunk)
+            fingerprints = row_fingerprints(chunk)
+            keep = self._changes(chunk, fingerprints)
+            chunk, fingerprints = finish(chunk[keep]), fingerprints[keep]
+            old = self._retire(chunk)
+            for i, agg in enumerate(self.aggregates):
+                if i in stale:
+                    continue
+                if old is not None and not (hasattr(agg, 'remove') and agg.remove(old)):
+                    stale.add(i)
+                    continue
+                agg.update(chunk)
+            self._register(chunk, fingerprints)
+            replaced = 0 if old is None else len(old)
+            added += len(chunk) - replaced
+            changed += replaced
+        if stale:
+            rows = self.current()
+            for i in stale:
+                self.aggregates[i] = copy.deepcopy(self.templates[i])
+                if rows is not None:
+                    self.aggregates[i].update(rows)
+        self.rows += added
+        if self.retired > self.rows:
+            self._compact()
+        return added, changed, read - added - changed
+
+    # this function marks the current rows of the movies in chunk as replaced and returns them
+    def _retire(self, chunk):
+        where = [self.movies[key] for key in chunk['id'].dropna().astype(np.int64).tolist() if key in self.movies]
+        if not where:
+            return None
+        rows = []
+        for part in sorted({p for p, _, _ in where}):
+            positions = np.array([i for p, i, _ in where if p == part])
+            self.alive[part][positions] = False
+            rows.append(self.parts[part].iloc[positions])
+        self.retired += len(where)
+        return pd.concat(rows)
+
+    def _register(self, chunk, fingerprints):
+        if self.inputs is None:
+            self.inputs = list(dict.fromkeys(['id'] + [c for agg in self.aggregates for c in agg.inputs]))
+        part = len(self.parts)
+        self.parts.append(chunk[self.inputs])
+        self.alive.append(np.ones(len(chunk), dtype=bool))
+        ids = chunk['id']
+        for position, key, fingerprint in zip(np.flatnonzero(ids.notna().to_numpy()),
+                                              ids.dropna().astype(np.int64).tolist(),
+                                              fingerprints[ids.notna().to_numpy()].tolist()):
+            self.movies[key] = (part, int(position), fingerprint)
+
+    # this function drops the replaced values: the current ones become a single part
+    def _compact(self):
+        starts = np.cumsum([0] + [int(alive.sum()) for alive in self.alive])
+        ranks = [np.cumsum(alive) - 1 for alive in self.alive]
+        self.movies = {key: (0, int(starts[part] + ranks[part][i]), fingerprint)
+                       for key, (part, i, fingerprint) in self.movies.items()}
+        rows = self.current()
+        self.parts = [] if rows is None else [rows]
+        self.alive = [np.ones(len(part), dtype=bool) for part in self.parts]
+        self.retired = 0
+
+    def results(self):
+        return {agg.name: agg.result() for agg in self.aggregates}
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+# this function loads the state (or starts a new one), ingests the delta files and saves it again
+def update_state(state_path, *paths, chunksize=100_000):
+    state = IncrementalState.load(state_path) if os.path.exists(state_path) else IncrementalState()
+    for path in paths:
+        start = time.perf_counter()
+        added, changed, unchanged = state.ingest(path, chunksize)
+        print("%s: %d new movies, %d changed, %d rows unchanged, %.2f s"
+              % (path, added, changed, unchanged, time.perf_counter() - start))
+    state.save(state_path)
+    return state
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print("usage: python -m tmdb.incremental STATE CSV [CSV ...]")
+        return 2
+    state = update_state(argv[0], *argv[1:])
+    print("%d movies in the state" % state.rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# Typed, columnar loader for tmdb-movies.csv.
+#
+# The notebook reads the csv with pandas' default inference and parses release_date in a second pass.
+# Here every known column gets an explicit dtype, the date is parsed in the same read and the
+# low-cardinality text columns are stored as categoricals.
+
+import pandas as pd
+
+from tmdb.profiling import traced
+
+
+# dtypes of the columns we know about. Columns that are not listed here (cast, genres, keywords, ...)
+# are left as strings. Columns listed here but missing from a dump are simply skipped.
+SCHEMA = {
+    'id': 'int64',
+    'popularity': 'float64',
+    'budget': 'int64',
+    'revenue': 'int64',
+    'runtime': 'int32',
+    'vote_count': 'int32',
+    'vote_average': 'float64',
+    'release_year': 'int16',
+    'budget_adj': 'float64',
+    'revenue_adj': 'float64',
+    'original_language': 'category',
+    'director': 'category',
+}
+
+DATE_COLUMNS = ['release_date']
+
+# release dates in the kaggle dump look like 6/9/15
+DATE_FORMAT = '%m/%d/%y'
+
+ENGINES = ('c', 'pyarrow')
+
+
+# this function reads only the header so the schema can be matched against the columns of a dump
+def read_columns(path):
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _resolve(path, columns):
+    available = read_columns(path)
+    if columns is None:
+        return available
+    missing = [c for c in columns if c not in available]
+    if missing:
+        raise KeyError("columns not found in %s: %s" % (path, missing))
+    return list(columns)
+
+
+# this function loads the csv with the explicit schema.
+# engine='pyarrow' uses the multi-threaded Arrow csv reader, which needs pyarrow to be installed.
+# columns limits the read to a subset of the file.
+@traced('load_movies', 'load')
+def load_movies(path='tmdb-movies.csv', engine='c', columns=None, date_format=DATE_FORMAT):
+    if engine not in ENGINES:
+        raise ValueError("engine must be one of %s, got %r" % (ENGINES, engine))
+    columns = _resolve(path, columns)
+    dtypes = {c: t for c, t in SCHEMA.items() if c in columns}
+    dates = [c for c in DATE_COLUMNS if c in columns]
+    if engine == 'pyarrow':
+        return _load_arrow(path, columns, dtypes, dates, date_format)
+    return pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=dates, date_format=date_format)[columns]
+
+
+# this function reads the csv in chunks of chunksize rows with the same schema as load_movies.
+# Categorical columns are read as plain strings here, because every chunk would get its own categories.
+def iter_movies(path='tmdb-movies.csv', chunksize=100_000, columns=None, date_format=DATE_FORMAT):
+    columns = _resolve(path, columns)
+    dtypes = {c: t for c, t in SCHEMA.items() if c in columns and t != 'category'}
+    dates = [c for c in DATE_COLUMNS if c in columns]
+    reader = pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=dates, date_format=date_format,
+                         chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield chunk[columns]
+
+
+_ARROW_TYPES = {
+    'int64': 'int64',
+    'int32': 'int32',
+    'int16': 'int16',
+    'float64': 'float64',
+}
+
+
+def _load_arrow(path, columns, dtypes, dates, date_format):
+    try:
+        import pyarrow as pa
+        from pyarrow import csv
+    except ImportError as e:
+        raise ImportError("engine='pyarrow' needs the pyarrow package") from e
+
+    column_types = {}
+    for c, t in dtypes.items():
+        if t == 'category':
+            # dictionary columns come out of to_pandas() as categoricals
+            column_types[c] = pa.dictionary(pa.int32(), pa.string())
+        else:
+            column_types[c] = getattr(pa, _ARROW_TYPES[t])()
+    for c in dates:
+        column_types[c] = pa.timestamp('ns')
+    convert = csv.ConvertOptions(
+        column_types=column_types,
+        include_columns=columns,
+        timestamp_parsers=[date_format] if date_format else None,
+        strings_can_be_null=True,
+    )
+    table = csv.read_csv(path, convert_options=convert)
+    return table.to_pandas()
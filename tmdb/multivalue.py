@@ -0,0 +1,141 @@
+# Many-to-many index for the pipe separated columns (cast, genres, production_companies, ...).
+#
+# Every distinct value of a column gets an integer code. The values of row i are the codes
+# indices[indptr[i]:indptr[i + 1]] (a CSR layout), so counts, top-N and per-value sums are
+# np.bincount calls instead of joining and splitting strings.
+#
+# The codes come from one pass of Arrow string kernels over the column's buffers (split_pattern,
+# then dictionary_encode of the flattened tokens), without joining the column into one string or
+# creating a Python object per token. Without pyarrow (or with engine='pandas') the column is
+# split with str.split + explode + factorize.
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage, traced
+
+
+MULTI_VALUE_COLUMNS = ('cast', 'genres', 'production_companies')
+
+SEPARATOR = '|'
+
+SPLIT_ENGINES = ('arrow', 'pandas')
+
+
+# this function splits a column with Arrow kernels and returns (distinct values in order of first
+# appearance, number of values per row, int32 code of every value)
+def _split_arrow(series, sep):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = series.array
+    if hasattr(values, '__arrow_array__'):
+        # pyarrow backed strings are handed over without a copy
+        data = values.__arrow_array__()
+    else:
+        data = pa.array(series.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    parts = pc.split_pattern(data, sep)
+    lengths = pc.list_value_length(parts).fill_null(0).to_numpy().astype(np.int64)
+    encoded = pc.dictionary_encode(pc.list_flatten(parts))
+    if isinstance(encoded, pa.ChunkedArray):
+        # the chunks of a chunked array are encoded against one shared dictionary
+        chunks = encoded.chunks
+        dictionary = chunks[0].dictionary if chunks else pa.array([], pa.string())
+        codes = np.concatenate([c.indices.to_numpy() for c in chunks]) if chunks else np.zeros(0, np.int32)
+    else:
+        dictionary, codes = encoded.dictionary, encoded.indices.to_numpy()
+    return pd.Index(dictionary.to_numpy(zero_copy_only=False)), lengths, codes.astype(np.int32)
+
+
+def _split_pandas(series, sep):
+    parts = series.str.split(sep, regex=False)
+    lengths = parts.str.len().fillna(0).to_numpy(dtype=np.int64)
+    values = parts.explode().dropna()
+    codes, uniques = pd.factorize(values.to_numpy(), use_na_sentinel=True)
+    return pd.Index(uniques), lengths, codes.astype(np.int32)
+
+
+class MultiValueIndex:
+
+    def __init__(self, vocabulary, indptr, indices):
+        # vocabulary: pd.Index of the distinct values, in order of first appearance
+        self.vocabulary = vocabulary
+        # indptr: int64 array of length n_rows + 1
+        self.indptr = indptr
+        # indices: int32 codes into vocabulary, one per (row, value) pair
+        self.indices = indices
+
+    # this function builds the index from a column. Missing rows have no values.
+    # engine is 'arrow' or 'pandas'; by default Arrow is used when pyarrow is installed.
+    @classmethod
+    def from_series(cls, series, sep=SEPARATOR, engine=None):
+        if engine not in (None,) + SPLIT_ENGINES:
+            raise ValueError("engine must be one of %s, got %r" % (SPLIT_ENGINES, engine))
+        with stage('split', 'index', column=str(series.name), rows=len(series)):
+            vocabulary = None
+            if engine != 'pandas':
+                try:
+                    vocabulary, lengths, codes = _split_arrow(series, sep)
+                except ImportError:
+                    if engine == 'arrow':
+                        raise
+            if vocabulary is None:
+                vocabulary, lengths, codes = _split_pandas(series, sep)
+        indptr = np.zeros(len(series) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return cls(vocabulary, indptr, codes)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.vocabulary.memory_usage(deep=True)
+
+    # row number of every entry of indices
+    def rows(self):
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+
+    # values of a single row
+    def tokens_of(self, row):
+        return list(self.vocabulary[self.indices[self.indptr[row]:self.indptr[row + 1]]])
+
+    # this function returns the number of rows per value, largest first, like count_split_data
+    def counts(self):
+        counts = np.bincount(self.indices, minlength=len(self.vocabulary))
+        # a stable sort keeps ties in order of first appearance, as value_counts does
+        order = np.argsort(-counts, kind='stable')
+        return pd.Series(counts[order], index=self.vocabulary[order], name='count')
+
+    def top(self, n=20):
+        return self.counts().iloc[:n]
+
+    # this function aggregates a per-row array over the values of the column.
+    # how is 'sum', 'mean' or 'count'; NaN values are skipped like pandas does.
+    def aggregate(self, values, how='sum'):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) != len(self):
+            raise ValueError("expected %d values, got %d" % (len(self), len(values)))
+        per_entry = values[self.rows()]
+        valid = ~np.isnan(per_entry)
+        codes = self.indices[valid]
+        size = len(self.vocabulary)
+        count = np.bincount(codes, minlength=size)
+        if how == 'count':
+            result = count
+        else:
+            total = np.bincount(codes, weights=per_entry[valid], minlength=size)
+            if how == 'sum':
+                result = total
+            elif how == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = total / count
+            else:
+                raise ValueError("how must be 'sum', 'mean' or 'count', got %r" % how)
+        return pd.Series(result, index=self.vocabulary, name=how)
+
+
+# this function builds the index of every multi value column once, right after loading/cleaning
+@traced('build_indexes', 'index')
+def build_indexes(df, columns=MULTI_VALUE_COLUMNS):
+    return {c: MultiValueIndex.from_series(df[c]) for c in columns if c in df.columns}
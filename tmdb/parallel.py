@@ -0,0 +1,69 @@
+# Process pool backend for the research questions.
+#
+# The cleaned table is cut into row ranges, every worker runs all aggregates of tmdb.aggregates over
+# its ranges in one pass and the partial results are merged in row order, so ties are resolved
+# exactly as in the serial run.
+#
+#   results = run_parallel(df, workers=8)
+
+import copy
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from tmdb.aggregates import notebook_aggregates
+from tmdb.profiling import worker_task
+
+# the table of the current pool, set in every worker by _init
+_frame = None
+
+
+def _init(df):
+    global _frame
+    _frame = df
+
+
+@worker_task
+def _aggregate_range(aggregates, start, stop):
+    part = _frame.iloc[start:stop]
+    for agg in aggregates:
+        agg.update(part)
+    return aggregates
+
+
+# this function splits n rows into `parts` consecutive (start, stop) ranges
+def row_ranges(n, parts):
+    bounds = np.linspace(0, n, parts + 1).astype(np.int64)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+# this function runs the aggregates (the notebook's by default) over df with a pool of worker
+# processes and returns {aggregate name: result table}.
+# partitions defaults to the number of workers; more partitions balance uneven rows better.
+def run_parallel(df, aggregates=None, workers=None, partitions=None):
+    if aggregates is None:
+        aggregates = notebook_aggregates()
+    workers = workers or os.cpu_count() or 1
+    ranges = row_ranges(len(df), partitions or workers)
+    if workers == 1 or len(ranges) <= 1:
+        _init(df)
+        try:
+            partials = [_aggregate_range(aggregates, 0, len(df))]
+        finally:
+            # the parent is not a worker: it must not keep the table alive (or hand it to the next call)
+            _init(None)
+    else:
+        # with fork the workers inherit the table instead of receiving a pickled copy
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init, initargs=(df,)) as pool:
+            futures = [pool.submit(_aggregate_range, copy.deepcopy(aggregates), start, stop)
+                       for start, stop in ranges]
+            partials = [f.result() for f in futures]
+    merged = partials[0]
+    for partial in partials[1:]:
+        for agg, other in zip(merged, partial):
+            agg.merge(other)
+    return {agg.name: agg.result() for agg in merged}
@@ -0,0 +1,214 @@
+# Single pass planner for the research questions.
+#
+# The notebook scans the table once per question: find_minmax, top_10 and small_10 of the same
+# column each read it again, compare_two_y/compare_two_x and the yearly counts each run their own
+# groupby. plan() groups the requested questions by the data they read so every column (or group
+# key) is scanned once, and execute() answers all of them from those shared scans.
+#
+#   results = run_plan(df, ['find_minmax:Profit', 'top_10:Profit', 'year_release'])
+#
+# Questions are named like the aggregates of tmdb.aggregates:
+#   year_release, month_release, corr,
+#   find_minmax:<column>, top_10:<column>, small_10:<column>,
+#   compare_two_y:<key>,<value>, compare_two_x:<key>,<value>, count_split_data:<column>,
+#   reg_plot:<x>,<y> (the fit and a sample of the two columns for the regression chart, tmdb.regression)
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from tmdb.aggregates import notebook_aggregates
+from tmdb.profiling import stage
+from tmdb.topk import no_minmax
+
+log = logging.getLogger(__name__)
+
+
+# this function returns the positions of the n largest (or smallest) values in the order nlargest
+# (nsmallest) returns them: NaN skipped, ties kept in row order. pad=True fills up with the rows
+# without a value, in row order, when there are fewer than n values, as nlargest does.
+def select_positions(values, n, largest=True, pad=False):
+    missing = np.isnan(values)
+    positions = np.flatnonzero(~missing)
+    selected = values[positions]
+    if n < len(selected):
+        # O(N) partition to find the cut-off value, then sort only the candidates
+        if largest:
+            cut = np.partition(selected, len(selected) - n)[len(selected) - n]
+            keep = selected >= cut
+        else:
+            cut = np.partition(selected, n - 1)[n - 1]
+            keep = selected <= cut
+        positions, selected = positions[keep], selected[keep]
+    order = np.argsort(-selected if largest else selected, kind='stable')[:n]
+    if pad and len(order) < n:
+        return np.concatenate([positions[order], np.flatnonzero(missing)[:n - len(order)]])
+    return positions[order]
+
+
+# one pass over a numeric column for find_minmax, top_10 and small_10
+class ColumnScan:
+
+    def __init__(self, column):
+        self.column = column
+        self.names = []
+        self.minmax = []
+        self.top = {}
+        self.bottom = {}
+
+    def __str__(self):
+        return 'column %s' % self.column
+
+    def run(self, df):
+        values = df[self.column].to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(values)
+        largest = smallest = None
+        n_top = max(self.top.values(), default=0)
+        n_bottom = max(self.bottom.values(), default=0)
+        # the extremes are the first rows of the top and bottom selections
+        if self.minmax:
+            n_top, n_bottom = max(n_top, 1), max(n_bottom, 1)
+        if n_top:
+            largest = select_positions(values, n_top, largest=True, pad=True)
+        if n_bottom:
+            smallest = select_positions(values, n_bottom, largest=False, pad=True)
+        results = {}
+        for name, n in self.top.items():
+            results[name] = df.iloc[largest[:n]]
+        for name, n in self.bottom.items():
+            results[name] = df.iloc[smallest[:n]]
+        for name in self.minmax:
+            if not len(largest) or missing[largest[0]]:
+                # every value is missing
+                results[name] = no_minmax(df.columns)
+                continue
+            results[name] = pd.concat([pd.DataFrame(df.iloc[largest[0]]), pd.DataFrame(df.iloc[smallest[0]])], axis = 1)
+        return results
+
+
+# one dense group-by (tmdb.groupby) for every mean and count over the same key
+class GroupScan:
+
+    def __init__(self, key):
+        self.key = key
+        self.names = []
+        self.means = {}
+        self.counts = {}
+
+    def __str__(self):
+        return 'groupby %s' % self.key
+
+    def run(self, df):
+        from tmdb.groupby import group_aggregate
+
+        spec = {}
+        for value in self.means.values():
+            spec.setdefault(value, []).append('mean')
+        for value in self.counts.values():
+            spec.setdefault(value, []).append('count')
+        grouped = group_aggregate(df, self.key, spec)
+        results = {}
+        for name, value in self.means.items():
+            results[name] = grouped[(value, 'mean')].rename(value)
+        for name, value in self.counts.items():
+            results[name] = grouped[(value, 'count')].rename(value)
+        return results
+
+
+# one pass over a table wide question that shares nothing (month counts, token counts, correlation)
+class SingleScan:
+
+    def __init__(self, label, func, name):
+        self.label = label
+        self.func = func
+        self.names = [name]
+
+    def __str__(self):
+        return self.label
+
+    def run(self, df):
+        return {self.names[0]: self.func(df)}
+
+
+def _split(name):
+    kind, _, args = name.partition(':')
+    return kind, args.split(',') if args else []
+
+
+# this function turns the requested questions into the list of scans that answer them
+def plan(requests):
+    from tmdb import analysis, regression
+    from tmdb.dates import date_index
+    from tmdb.correlation import corr_matrix
+
+    columns = {}
+    groups = {}
+    scans = []
+    for name in requests:
+        kind, args = _split(name)
+        if kind in ('find_minmax', 'top_10', 'small_10'):
+            scan = columns.get(args[0])
+            if scan is None:
+                scan = columns[args[0]] = ColumnScan(args[0])
+                scans.append(scan)
+            if kind == 'find_minmax':
+                scan.minmax.append(name)
+            elif kind == 'top_10':
+                scan.top[name] = 10
+            else:
+                scan.bottom[name] = 10
+        elif kind in ('compare_two_y', 'compare_two_x', 'year_release', 'count'):
+            key, value = ('release_year', 'id') if kind == 'year_release' else args
+            scan = groups.get(key)
+            if scan is None:
+                scan = groups[key] = GroupScan(key)
+                scans.append(scan)
+            if kind in ('year_release', 'count'):
+                scan.counts[name] = value
+            else:
+                scan.means[name] = value
+        elif kind == 'month_release':
+            scans.append(SingleScan('release_date months', lambda df: date_index(df).month_counts(), name))
+            continue
+        elif kind == 'count_split_data':
+            column = args[0]
+            scans.append(SingleScan('split %s' % column, lambda df, c=column: analysis.count_split_data(df, c), name))
+            continue
+        elif kind == 'reg_plot':
+            scans.append(SingleScan('fit %s' % ','.join(args), lambda df, c=args: regression.reg_plot_data(df, *c), name))
+            continue
+        elif kind == 'corr':
+            scans.append(SingleScan('numeric matrix', lambda df: corr_matrix(df).matrix, name))
+            continue
+        else:
+            raise ValueError("unknown question %r" % name)
+        scan.names.append(name)
+    return scans
+
+
+# this function runs the scans of a plan and returns {question: result table}
+def execute(df, scans):
+    results = {}
+    for scan in scans:
+        if len(scan.names) > 1:
+            log.info("%s shared by %s", scan, ', '.join(scan.names))
+        else:
+            log.info("%s for %s", scan, scan.names[0])
+        with stage(str(scan), 'scan', questions=scan.names):
+            results.update(scan.run(df))
+    return results
+
+
+# the names of all the notebook's questions, in the order of the notebook
+def notebook_questions():
+    return [agg.name for agg in notebook_aggregates()]
+
+
+# this function plans and answers the questions (all of the notebook's by default) in one go
+def run_plan(df, requests=None):
+    if requests is None:
+        requests = notebook_questions()
+    scans = plan(requests)
+    log.info("%d questions answered with %d scans", len(requests), len(scans))
+    return execute(df, scans)
@@ -0,0 +1,227 @@
+# Timing and memory instrumentation of the pipeline stages.
+#
+# Off by default. When enabled, every stage (read_csv, to_datetime, drop_duplicates, splitting the
+# pipe columns, the correlation matrix, the research question functions, rendering, ...) is recorded
+# with its duration, the number of rows it returned and the change in memory. The trace is written as
+# Chrome trace-event JSON, which chrome://tracing or https://ui.perfetto.dev can open.
+#
+# Enable it with the environment:
+#   TMDB_TRACE=trace.json python -m tmdb ...            (written when the process exits)
+#   TMDB_PROFILE=cprofile,tracemalloc                   (optional: cProfile stats / traced allocations)
+# or with `python -m tmdb --trace trace.json --profile cprofile`, or enable()/write() from code.
+# Worker processes (tmdb.parallel, tmdb.render) write their own trace.<pid>.json next to trace.json,
+# whether they are forked (a fresh tracer after the fork) or spawned (the environment is read again).
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_ENV = 'TMDB_TRACE'
+PROFILE_ENV = 'TMDB_PROFILE'
+# pid of the process that owns the trace file; worker processes write <path>.<pid>.json next to it
+OWNER_ENV = 'TMDB_TRACE_OWNER'
+PROFILERS = ('cprofile', 'tracemalloc')
+
+
+class Tracer:
+
+    def __init__(self, path=None, cprofile=False, memory=False):
+        self.path = path
+        self.events = []
+        self.origin = time.perf_counter_ns()
+        self.profile = None
+        self.memory = memory
+        if cprofile:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def allocated(self):
+        if self.memory:
+            import tracemalloc
+            return tracemalloc.get_traced_memory()[0]
+        return _rss_bytes()
+
+    def record(self, name, category, start_ns, end_ns, args):
+        self.events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start_ns - self.origin) / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+    # this function writes the trace (and the cProfile stats next to it as <path>.prof)
+    def write(self, path=None):
+        path = path or self.path
+        if path is None:
+            return None
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(path + '.prof')
+            self.profile.enable()
+        return path
+
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+# current resident set size; None where /proc is not available
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_tracer = None
+# pid of the process that owns the trace file; a tracer in any other process belongs to a worker
+_owner_pid = None
+
+
+def enabled():
+    return _tracer is not None
+
+
+# this function starts recording. profilers is a subset of ('cprofile', 'tracemalloc').
+def enable(path=None, profilers=()):
+    global _tracer, _owner_pid
+    unknown = set(profilers) - set(PROFILERS)
+    if unknown:
+        raise ValueError("unknown profilers %s, expected some of %s" % (sorted(unknown), PROFILERS))
+    _tracer = Tracer(path, cprofile='cprofile' in profilers, memory='tracemalloc' in profilers)
+    _owner_pid = os.getpid()
+    return _tracer
+
+
+# this function writes the trace and stops recording
+def disable():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.write()
+        if tracer.profile is not None:
+            tracer.profile.disable()
+    return tracer
+
+
+def write(path=None):
+    return _tracer.write(path) if _tracer is not None else None
+
+
+def _worker_path(path):
+    return '%s.%d.json' % (os.path.splitext(path)[0], os.getpid()) if path else None
+
+
+# a forked worker inherits the parent's tracer with the parent's events and file: it gets a fresh
+# tracer writing <path>.<pid>.json instead
+def _after_fork_in_child():
+    global _tracer
+    tracer = _tracer
+    if tracer is None:
+        return
+    if tracer.profile is not None:
+        tracer.profile.disable()
+    _tracer = Tracer(_worker_path(tracer.path), cprofile=tracer.profile is not None, memory=tracer.memory)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# this function writes the trace of a worker process. Pool workers end with os._exit, which skips
+# atexit, so every task run in a pool calls it when it is done; in the process that enabled the
+# trace it does nothing.
+def flush_worker():
+    if _tracer is not None and os.getpid() != _owner_pid:
+        return _tracer.write()
+    return None
+
+
+# this decorator makes a function run in a pool write the worker's trace when it returns
+def worker_task(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            flush_worker()
+    return wrapper
+
+
+def _rows(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if hasattr(value, 'shape') and len(getattr(value, 'shape', ())) > 0:
+        return int(value.shape[0])
+    return None
+
+
+# this context manager records a stage. The yielded dict can be given more fields for the trace,
+# e.g. info['rows'] = len(df).
+@contextmanager
+def stage(name, category='stage', **args):
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+    before = tracer.allocated()
+    start = time.perf_counter_ns()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter_ns()
+        after = tracer.allocated()
+        if before is not None and after is not None:
+            args['allocated_bytes'] = after - before
+        tracer.record(name, category, start, end, args)
+
+
+# this decorator records every call of a function as a stage named after it, with the number of
+# rows of what it returns. Disabled, it costs one global lookup per call.
+def traced(name=None, category='function'):
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with stage(label, category) as info:
+                result = func(*args, **kwargs)
+                rows = _rows(result)
+                if rows is not None:
+                    info['rows'] = rows
+            return result
+        return wrapper
+    return decorate
+
+
+def _enable_from_environment():
+    global _owner_pid
+    path = os.environ.get(TRACE_ENV)
+    if path:
+        owner = os.environ.setdefault(OWNER_ENV, str(os.getpid()))
+        if owner != str(os.getpid()):
+            path = _worker_path(path)
+        profilers = [p.strip() for p in os.environ.get(PROFILE_ENV, '').split(',') if p.strip()]
+        enable(path, profilers)
+        _owner_pid = int(owner)
+        atexit.register(disable)
+
+
+_enable_from_environment()
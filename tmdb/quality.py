@@ -0,0 +1,219 @@
+# Column-scoped data-quality checks for budget, revenue and runtime.
+#
+# The notebook's df.replace(0, np.nan) compares every cell of every column against 0 and copies the
+# whole frame, which also turns legitimate zeros (vote_count, vote_average) into missing values.
+# validate() runs a list of rules over the few columns they name instead, each rule a vectorized
+# test over one float64 array, and records what it found as one bit of a uint8 'quality' column:
+#
+#   ZERO_BUDGET, ZERO_REVENUE, ZERO_RUNTIME   a 0 that means "unknown" (set to NaN in the column)
+#   BUDGET_OUTLIER, REVENUE_OUTLIER           robust z-score of log10(value) above 3.5 ($1 budgets)
+#   RUNTIME_OUTLIER                           outside the quartiles by more than 3 interquartile ranges
+#   BUDGET_OVER_REVENUE                       budget above 10 x revenue
+#
+#   df = clean_movies(raw, quality=True)          # or validate(df) on a frame with the zeros
+#   df[has_issue(df, BUDGET_OUTLIER)]             # the movies small_10('budget') shows
+#   issue_counts(df)                              # number of movies per issue
+#   python -m tmdb.quality tmdb-movies.csv
+#
+# Only the columns of a zero rule are written; every other column of the frame is left as it is.
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage, traced
+
+# name of the bitmask column added by validate()
+QUALITY = 'quality'
+
+ZERO_BUDGET = 1
+ZERO_REVENUE = 2
+ZERO_RUNTIME = 4
+BUDGET_OUTLIER = 8
+REVENUE_OUTLIER = 16
+RUNTIME_OUTLIER = 32
+BUDGET_OVER_REVENUE = 64
+
+ISSUES = {
+    'zero_budget': ZERO_BUDGET,
+    'zero_revenue': ZERO_REVENUE,
+    'zero_runtime': ZERO_RUNTIME,
+    'budget_outlier': BUDGET_OUTLIER,
+    'revenue_outlier': REVENUE_OUTLIER,
+    'runtime_outlier': RUNTIME_OUTLIER,
+    'budget_over_revenue': BUDGET_OVER_REVENUE,
+}
+
+# robust z-scores are scaled so they match the ordinary z-score for normal data (Iglewicz and Hoaglin)
+_MAD_SCALE = 0.6745
+
+# values the median, MAD and quartiles of a larger column are estimated from (an evenly spaced sample)
+SAMPLE_SIZE = 20_000
+
+
+# a 0 in the column means the value is unknown: flag it and make it NaN
+class ZeroAsMissing:
+
+    def __init__(self, column, flag):
+        self.column = column
+        self.columns = [column]
+        self.flag = flag
+
+    def check(self, values):
+        found = values[self.column] == 0
+        if found.any():
+            # 0 / 0 is NaN and x / 1 is x: one division gives the float64 column, without a masked
+            # write that branches on every row
+            with np.errstate(invalid='ignore'):
+                values[self.column] = np.divide(values[self.column], ~found, dtype=np.float64)
+        return found
+
+
+# values far from the bulk of the column, by robust z-score (method='mad') or interquartile fences
+# (method='iqr'). log=True tests log10 of the values, which suits money columns spanning many orders
+# of magnitude, where a value of 0 or less is always an outlier.
+# The statistics come from at most SAMPLE_SIZE values. The test itself is two comparisons per row
+# against bounds in the units of the column, so no row is transformed.
+class Outlier:
+
+    def __init__(self, column, flag, method='mad', threshold=3.5, log=False):
+        if method not in ('mad', 'iqr'):
+            raise ValueError("method must be 'mad' or 'iqr', got %r" % method)
+        self.column = column
+        self.columns = [column]
+        self.flag = flag
+        self.method = method
+        self.threshold = threshold
+        self.log = log
+
+    # this function returns the lowest and the highest value that are not outliers, or None when the
+    # column has no values (or no spread) to tell outliers by
+    def bounds(self, x):
+        sample = x[::max(len(x) // SAMPLE_SIZE, 1)]
+        sample = sample[sample > 0] if self.log else sample[~np.isnan(sample)]
+        if not len(sample):
+            return None
+        if self.log:
+            sample = np.log10(sample)
+        if self.method == 'mad':
+            center = np.median(sample)
+            spread = np.median(np.abs(sample - center)) * self.threshold / _MAD_SCALE
+        else:
+            q1, q3 = np.percentile(sample, [25, 75])
+            center, spread = (q1 + q3) / 2, (q3 - q1) * (self.threshold + 0.5)
+        if spread == 0:
+            return None
+        low, high = center - spread, center + spread
+        return (10 ** low, 10 ** high) if self.log else (low, high)
+
+    def check(self, values):
+        x = values[self.column]
+        bounds = self.bounds(x)
+        if bounds is None:
+            return np.zeros(len(x), dtype=bool)
+        found = x < bounds[0]
+        found |= x > bounds[1]
+        return found
+
+
+# budget larger than k times the revenue, for movies with both known
+class BudgetOverRevenue:
+
+    def __init__(self, flag, k=10, budget='budget', revenue='revenue'):
+        self.flag = flag
+        self.k = k
+        self.budget = budget
+        self.revenue = revenue
+        self.columns = [budget, revenue]
+
+    def check(self, values):
+        with np.errstate(invalid='ignore'):
+            return values[self.budget] > values[self.revenue] * float(self.k)
+
+
+# the rules of validate(), in the order they run: the zero rules first, so the other rules only see
+# known values
+def default_rules():
+    return [
+        ZeroAsMissing('budget', ZERO_BUDGET),
+        ZeroAsMissing('revenue', ZERO_REVENUE),
+        ZeroAsMissing('runtime', ZERO_RUNTIME),
+        Outlier('budget', BUDGET_OUTLIER, 'mad', 3.5, log=True),
+        Outlier('revenue', REVENUE_OUTLIER, 'mad', 3.5, log=True),
+        Outlier('runtime', RUNTIME_OUTLIER, 'iqr', 3.0),
+        BudgetOverRevenue(BUDGET_OVER_REVENUE, k=10),
+    ]
+
+
+# this function returns the values of a column as a numpy array: the column's own array for numpy
+# numbers (no copy), float64 with NaN for the others
+def _numbers(series):
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iuf':
+        return series.to_numpy()
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+# this function runs the rules over df and returns the frame with the zero rule columns replaced and
+# the 'quality' bitmask added. Every column a rule names is read once; rules whose columns are
+# missing are skipped.
+@traced('validate', 'clean')
+def validate(df, rules=None):
+    rules = default_rules() if rules is None else rules
+    values = {}
+    flags = np.zeros(len(df), dtype=np.uint8)
+    written = []
+    for rule in rules:
+        if not all(column in df.columns for column in rule.columns):
+            continue
+        for column in rule.columns:
+            if column not in values:
+                values[column] = _numbers(df[column])
+        with stage(type(rule).__name__, 'clean', columns=','.join(rule.columns)):
+            found = rule.check(values)
+            # the rule's bit joins the others in a new array; found is still read below
+            flags |= found.astype(np.uint8) * np.uint8(rule.flag)
+        # like replace, a column without zeros keeps its dtype
+        if isinstance(rule, ZeroAsMissing) and found.any():
+            written.append(rule.column)
+    # wrapped in a Series so the arrays become the columns without another copy
+    columns = {column: pd.Series(values[column], index=df.index, copy=False) for column in written}
+    columns[QUALITY] = pd.Series(flags, index=df.index, copy=False)
+    return df.assign(**columns)
+
+
+# this function returns a boolean mask of the rows with any of the given issue bits
+def has_issue(df, flags):
+    return (df[QUALITY].to_numpy() & flags) != 0
+
+
+# this function returns one boolean column per issue of the 'quality' bitmask
+def issues(df):
+    flags = df[QUALITY].to_numpy()
+    return pd.DataFrame({name: (flags & bit) != 0 for name, bit in ISSUES.items()}, index=df.index)
+
+
+# number of movies per issue
+def issue_counts(df):
+    return issues(df).sum().rename('movies')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tmdb.quality', description="Data-quality report of budget, revenue and runtime.")
+    parser.add_argument('csv', nargs='?', default='tmdb-movies.csv')
+    parser.add_argument('--show', metavar='ISSUE', choices=list(ISSUES), help="print the movies with this issue")
+    args = parser.parse_args(argv)
+    from tmdb.cleaning import clean_movies
+    from tmdb.loader import load_movies
+
+    df = clean_movies(load_movies(args.csv), quality=True)
+    print(issue_counts(df))
+    if args.show:
+        print()
+        print(df.loc[has_issue(df, ISSUES[args.show]), ['original_title', 'budget', 'revenue', 'runtime']])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
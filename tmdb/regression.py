@@ -0,0 +1,215 @@
+# Linear fit, confidence band and scatter downsampling behind reg_plot.
+#
+# sns.regplot estimates the confidence band of its line from 1,000 bootstrap refits and draws every
+# point, which takes minutes on millions of rows. LinearFit computes the least squares line from the
+# moments of the rows where both columns are present (the mean-shifted sums of tmdb.correlation, so
+# fits of partitions merge like the correlation matrix) and the closed-form band
+#
+#   yhat(x0) +- t(n - 2) * s * sqrt(1 / n + (x0 - mean x) ** 2 / Sxx)
+#
+# The scatter layer is a stratified sample: rows are binned on a grid over both columns and every
+# non-empty cell keeps its share of the sample (at least one point), so sparse regions and outliers
+# stay visible while dense regions are thinned. Below max_points rows every point is drawn.
+#
+#   fit = LinearFit.from_frame(df, 'revenue', 'budget')
+#   fit.slope, fit.intercept, fit.band(fit.grid())
+#   plot(ax, df['revenue'], df['budget'], color='c')
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from tmdb.correlation import merge_moments, pairwise_moments
+from tmdb.profiling import traced
+
+# rows drawn in the scatter layer before it is downsampled
+MAX_POINTS = 20_000
+
+# cells per axis of the grid the sample is stratified on
+STRATA = 64
+
+
+# this function returns the p quantile of Student's t distribution with df degrees of freedom
+# (Cornish-Fisher expansion around the normal quantile; within 1e-4 of the exact value from 7 degrees of freedom)
+def t_quantile(p, df):
+    z = NormalDist().inv_cdf(p)
+    if math.isinf(df):
+        return z
+    terms = [
+        (z ** 3 + z) / 4,
+        (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96,
+        (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384,
+        (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160,
+    ]
+    return z + sum(term / df ** (k + 1) for k, term in enumerate(terms))
+
+
+# least squares line of y on x. It is also a mergeable aggregate (update/merge/result).
+class LinearFit:
+
+    def __init__(self, x=None, y=None):
+        self.x = x
+        self.y = y
+        # moments of the complete rows (see tmdb.correlation.pairwise_moments) and the x range
+        self.moments = None
+        self.x_min = np.inf
+        self.x_max = -np.inf
+
+    @property
+    def name(self):
+        return 'fit:%s,%s' % (self.x, self.y)
+
+    @classmethod
+    def from_arrays(cls, x, y):
+        fit = cls(getattr(x, 'name', None), getattr(y, 'name', None))
+        fit.add(x, y)
+        return fit
+
+    @classmethod
+    def from_frame(cls, df, x, y):
+        fit = cls(x, y)
+        fit.update(df)
+        return fit
+
+    # this function adds the rows where both values are present
+    def add(self, x, y):
+        values = np.column_stack([np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)])
+        values = values[~np.isnan(values).any(axis=1)]
+        if not len(values):
+            return
+        moments = pairwise_moments(values)
+        self.moments = moments if self.moments is None else merge_moments(self.moments, moments)
+        self.x_min = min(self.x_min, values[:, 0].min())
+        self.x_max = max(self.x_max, values[:, 0].max())
+
+    def update(self, df):
+        self.add(df[self.x].to_numpy(dtype=np.float64, na_value=np.nan),
+                 df[self.y].to_numpy(dtype=np.float64, na_value=np.nan))
+
+    def merge(self, other):
+        if other.moments is not None:
+            self.moments = other.moments if self.moments is None else merge_moments(self.moments, other.moments)
+            self.x_min = min(self.x_min, other.x_min)
+            self.x_max = max(self.x_max, other.x_max)
+
+    def result(self):
+        return self
+
+    @property
+    def n(self):
+        return 0 if self.moments is None else int(self.moments[0][0, 0])
+
+    @property
+    def slope(self):
+        _, _, m2, cxy = self.moments
+        return cxy[0, 1] / m2[0, 0] if m2[0, 0] > 0 else np.nan
+
+    @property
+    def intercept(self):
+        mean = self.moments[1]
+        return mean[1, 1] - self.slope * mean[0, 0]
+
+    # variance of the residuals (n - 2 degrees of freedom)
+    @property
+    def residual_variance(self):
+        _, _, m2, cxy = self.moments
+        if self.n <= 2 or m2[0, 0] <= 0:
+            return np.nan
+        return max(m2[1, 1] - cxy[0, 1] ** 2 / m2[0, 0], 0.0) / (self.n - 2)
+
+    # the x values the line is drawn at, over the range of the data like seaborn's truncated line
+    def grid(self, points=100):
+        return np.linspace(self.x_min, self.x_max, points)
+
+    def predict(self, x):
+        return self.intercept + self.slope * np.asarray(x, dtype=np.float64)
+
+    # this function returns the lower and upper edge of the confidence band of the line at x
+    def band(self, x, level=0.95):
+        x = np.asarray(x, dtype=np.float64)
+        _, mean, m2, _ = self.moments
+        t = t_quantile(0.5 + level / 2, self.n - 2) if self.n > 2 else np.nan
+        half = t * np.sqrt(self.residual_variance * (1 / self.n + (x - mean[0, 0]) ** 2 / m2[0, 0]))
+        yhat = self.predict(x)
+        return yhat - half, yhat + half
+
+    def to_dict(self):
+        n, mean, m2, cxy = self.moments
+        return {'x': self.x, 'y': self.y, 'n': self.n, 'x_mean': mean[0, 0], 'y_mean': mean[1, 1],
+                'sxx': m2[0, 0], 'syy': m2[1, 1], 'sxy': cxy[0, 1], 'x_min': self.x_min, 'x_max': self.x_max}
+
+    @classmethod
+    def from_dict(cls, d):
+        fit = cls(d['x'], d['y'])
+        # every row is complete, so the moments of a column are the same in both of its pairs
+        fit.moments = (np.full((2, 2), float(d['n'])),
+                       np.array([[d['x_mean'], d['x_mean']], [d['y_mean'], d['y_mean']]]),
+                       np.array([[d['sxx'], d['sxx']], [d['syy'], d['syy']]]),
+                       np.array([[d['sxx'], d['sxy']], [d['sxy'], d['syy']]]))
+        fit.x_min, fit.x_max = d['x_min'], d['x_max']
+        return fit
+
+
+# this function returns the positions of a stratified sample of about size rows of x and y (NaN rows
+# left out), in row order. Every non-empty cell of a strata x strata grid keeps at least one row.
+def stratified_sample(x, y, size=MAX_POINTS, strata=STRATA, seed=0):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    rows = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    if len(rows) <= size:
+        return rows
+    cells = _cells(x[rows], strata) * strata + _cells(y[rows], strata)
+    counts = np.bincount(cells, minlength=strata * strata)
+    quota = np.maximum(counts * size // len(rows), counts > 0)
+    # rows in random order, grouped by cell; the first quota[cell] of every cell are kept
+    shuffled = np.random.default_rng(seed).permutation(len(rows))
+    shuffled = shuffled[np.argsort(cells[shuffled], kind='stable')]
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(rows)) - starts[cells[shuffled]]
+    return np.sort(rows[shuffled[rank < quota[cells[shuffled]]]])
+
+
+def _cells(values, strata):
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - low) / (high - low) * strata).astype(np.int64), strata - 1)
+
+
+# this function returns the table the regression chart is drawn from: the sampled rows of x and y,
+# with the fit over all the rows in attrs['fit']
+@traced('reg_plot_data', 'question')
+def reg_plot_data(df, x, y, max_points=MAX_POINTS):
+    fit = LinearFit.from_frame(df, x, y)
+    sample = df[[x, y]].iloc[stratified_sample(df[x].to_numpy(dtype=np.float64, na_value=np.nan),
+                                               df[y].to_numpy(dtype=np.float64, na_value=np.nan), max_points)]
+    sample.attrs['fit'] = fit.to_dict() if fit.n else None
+    return sample
+
+
+# this function draws what sns.regplot draws (points, line and 95% band in one color) on ax, from
+# the closed-form fit and a stratified sample of the points. fit defaults to the fit of x and y.
+def plot(ax, x, y, color='c', fit=None, max_points=MAX_POINTS, level=0.95):
+    import matplotlib as mpl
+
+    x = pd.Series(x)
+    y = pd.Series(y)
+    if fit is None:
+        fit = LinearFit.from_arrays(x, y)
+    xs = x.to_numpy(dtype=np.float64, na_value=np.nan)
+    ys = y.to_numpy(dtype=np.float64, na_value=np.nan)
+    keep = stratified_sample(xs, ys, max_points)
+    color = mpl.colors.rgb2hex(mpl.colors.to_rgb(color))
+    ax.scatter(xs[keep], ys[keep], color=color, alpha=.8, linewidths=mpl.rcParams['lines.markeredgewidth'])
+    if fit.n > 1:
+        grid = fit.grid()
+        ax.plot(grid, fit.predict(grid), color=color, linewidth=mpl.rcParams['lines.linewidth'] * 1.5)
+        if fit.n > 2:
+            ax.fill_between(grid, *fit.band(grid, level), facecolor=color, alpha=.15)
+    if x.name is not None:
+        ax.set_xlabel(x.name)
+    if y.name is not None:
+        ax.set_ylabel(y.name)
+    return ax
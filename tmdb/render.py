@@ -0,0 +1,255 @@
+# Headless rendering of the notebook's charts.
+#
+# The notebook functions compute and draw in one go and change the global seaborn/pyplot state
+# (sns.set, sns.set_style, plt.title, ...). Here every chart is drawn from a finished result table
+# (the output of tmdb.planner.run_plan) on its own matplotlib Figure, without pyplot, and saved to
+# png/svg files. Charts are rendered in worker processes, and a chart whose table and drawing code
+# did not change since the last run is not rendered again.
+#
+#   results = run_plan(df, chart_questions())
+#   render_all(results, 'charts')
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage, traced, worker_task
+
+MANIFEST = '.render-manifest.json'
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# columns of the correlation map of research question 17
+CORRELATION_MAP_COLUMNS = ['popularity', 'budget', 'revenue', 'runtime', 'vote_count', 'vote_average']
+
+
+def year_release(fig, data):
+    ax = fig.subplots()
+    data.plot(ax=ax, ylim=(0, data.max()))
+    ax.set_title("Year Vs Number Of Movies", fontsize = 16)
+    ax.set_xlabel('Release year', fontsize = 14)
+    ax.set_ylabel('Number Of Movies', fontsize = 14)
+
+
+def _pointplot(fig, data, x, title):
+    import seaborn as sns
+
+    ax = fig.subplots()
+    sns.pointplot(x=list(data[x]), y=list(map(str, data['original_title'])), ax=ax)
+    ax.set_title(title + x + ":", fontsize = 15)
+    ax.set_xlabel(x, fontsize = 13)
+
+
+def top_10(x):
+    return lambda fig, data: _pointplot(fig, data, x, "Top 10 Movies by ")
+
+
+def small_10(x):
+    return lambda fig, data: _pointplot(fig, data, x, "Bottom 10 Movies by ")
+
+
+def compare_two_y(x, y):
+    def draw(fig, data):
+        ax = fig.subplots()
+        data.plot(ax=ax, xticks=np.arange(0, 1000, 100))
+        ax.set_title(x + " Vs " + y, fontsize = 14)
+        ax.set_xlabel(x, fontsize = 13)
+        ax.set_ylabel("Average " + y, fontsize = 13)
+    return draw
+
+
+def compare_two_x(fig, data):
+    ax = fig.subplots()
+    data.plot(ax=ax)
+    ax.set_title("Runtime Vs Year", fontsize = 14)
+    ax.set_xlabel('Year', fontsize = 13)
+    ax.set_ylabel('Runtime', fontsize = 13)
+
+
+def reg_plot(x, y):
+    def draw(fig, data):
+        from tmdb.regression import LinearFit, plot
+
+        ax = fig.subplots()
+        fit = data.attrs.get('fit')
+        plot(ax, data[x], data[y], color='c', fit=None if fit is None else LinearFit.from_dict(fit))
+        ax.set_title(x, fontsize = 13)
+        ax.set_xlabel(x, fontsize = 12)
+        ax.set_ylabel(y, fontsize = 12)
+    return draw
+
+
+def month_release(fig, data):
+    ax = fig.subplots()
+    months = [MONTHS[int(m) - 1] for m in data.index]
+    ax.bar(months, data.to_numpy())
+    ax.tick_params(labelsize = 11)
+    ax.set_xlabel('Month', fontsize = 12)
+    ax.set_ylabel('Number Of Movie Release', fontsize = 12)
+
+
+def count_genre(fig, data):
+    ax = fig.subplots()
+    data.plot(kind= 'barh', ax=ax, fontsize=12, colormap='tab20c')
+    ax.set_title("Genre With Highest Release", fontsize=15)
+    ax.set_xlabel('Number Of Movies', fontsize=13)
+    ax.set_ylabel("Genres", fontsize= 13)
+
+
+def genre_pie(fig, data):
+    ax = fig.subplots()
+    sizes = data.sort_values(ascending=False)
+    total = sizes.sum()
+    labels = [n if v > total * 0.01 else '' for n, v in sizes.items()]
+    ax.pie(sizes.to_numpy(), labels=labels,
+           autopct = lambda x:'{:2.0f}%'.format(x) if x > 1 else '',
+           shadow=False, startangle=0, textprops={'weight': 'bold'})
+    ax.axis('equal')
+    fig.tight_layout()
+
+
+def company_release(fig, data):
+    ax = fig.subplots()
+    data.iloc[:20].plot(kind='barh', ax=ax, fontsize=13)
+    ax.set_title("Production Companies Vs Number Of Movies", fontsize=15)
+    ax.set_xlabel('Number Of Movies', fontsize=14)
+
+
+def frequent_actor(fig, data):
+    ax = fig.subplots()
+    data.iloc[:20].plot.bar(ax=ax, colormap= 'tab20c', fontsize=12)
+    ax.set_title("Most Frequent Actor", fontsize=15)
+    ax.tick_params(axis='x', labelrotation = 70)
+    ax.set_xlabel('Actor', fontsize=13)
+    ax.set_ylabel("Number Of Movies", fontsize= 13)
+
+
+def plot_correlation_map(fig, data):
+    import seaborn as sns
+
+    ax = fig.subplots()
+    columns = [c for c in CORRELATION_MAP_COLUMNS if c in data.columns]
+    cmap = sns.diverging_palette( 240 , 10 , as_cmap = True )
+    sns.heatmap(data.loc[columns, columns], cmap = cmap, square=True, cbar_kws={ 'shrink' : .9 }, ax=ax,
+                annot = True, annot_kws = { 'fontsize' : 12 })
+
+
+# chart name -> (question it is drawn from, drawing function, figure size, seaborn style)
+CHARTS = {
+    'year_release': ('count:release_year,id', year_release, (8, 5), 'darkgrid'),
+    'top_10_Profit': ('top_10:Profit', top_10('Profit'), (10, 5), 'darkgrid'),
+    'top_10_revenue': ('top_10:revenue', top_10('revenue'), (10, 5), 'darkgrid'),
+    'top_10_budget': ('top_10:budget', top_10('budget'), (10, 5), 'darkgrid'),
+    'small_10_budget': ('small_10:budget', small_10('budget'), (10, 5), 'whitegrid'),
+    'runtime_popularity': ('compare_two_y:runtime,popularity', compare_two_y('runtime', 'popularity'), (13, 5), 'whitegrid'),
+    'year_runtime': ('compare_two_y:release_year,runtime', compare_two_x, (13, 5), 'whitegrid'),
+    'revenue_budget': ('reg_plot:revenue,budget', reg_plot('revenue', 'budget'), (6, 4), 'whitegrid'),
+    'month_release': ('month_release', month_release, (8, 6), 'whitegrid'),
+    'count_genre': ('count_split_data:genres', count_genre, (13, 6), 'whitegrid'),
+    'genre_pie': ('count_split_data:genres', genre_pie, (5, 5), 'white'),
+    'frequent_actor': ('count_split_data:cast', frequent_actor, (13, 6), 'whitegrid'),
+    'company_release': ('count_split_data:production_companies', company_release, (16, 8), 'whitegrid'),
+    'correlation_map': ('corr', plot_correlation_map, (12, 10), 'white'),
+}
+
+
+# the questions run_plan has to answer for all charts
+def chart_questions(charts=None):
+    names = []
+    for chart in charts or CHARTS:
+        question = CHARTS[chart][0]
+        if question not in names:
+            names.append(question)
+    return names
+
+
+# this function hashes a result table together with the drawing code, so a chart is only rendered
+# again when its data or the way it is drawn changed
+def chart_digest(chart, data):
+    h = hashlib.sha256()
+    with open(__file__, 'rb') as f:
+        h.update(f.read())
+    h.update(chart.encode())
+    h.update(repr(sorted(data.attrs.items())).encode())
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    h.update(repr((list(map(str, data.columns)), str(data.dtypes.to_dict()))).encode())
+    h.update(pd.util.hash_pandas_object(data.astype(object), index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+# this function draws one chart on a new Figure (no pyplot) and saves it in every format
+@worker_task
+@traced('render_chart', 'render')
+def render_chart(chart, data, out_dir, formats=('png',)):
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    _, draw, size, style = CHARTS[chart]
+    paths = []
+    with sns.axes_style(style):
+        fig = Figure(figsize=size)
+        with stage('draw ' + chart, 'render'):
+            draw(fig, data)
+    for fmt in formats:
+        path = os.path.join(out_dir, '%s.%s' % (chart, fmt))
+        fig.savefig(path, format=fmt, bbox_inches='tight')
+        paths.append(path)
+    return paths
+
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# this function renders the charts (all of them by default) whose question is in results into
+# out_dir and returns {chart: list of files}. Unchanged charts are skipped and return [].
+# workers=1 renders in the calling process.
+@traced('render_all', 'render')
+def render_all(results, out_dir='charts', charts=None, formats=('png',), workers=None):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _read_manifest(out_dir)
+    jobs = {}
+    rendered = {}
+    for chart in charts or CHARTS:
+        question = CHARTS[chart][0]
+        if question not in results:
+            continue
+        data = results[question]
+        digest = chart_digest(chart, data)
+        files = [os.path.join(out_dir, '%s.%s' % (chart, fmt)) for fmt in formats]
+        if manifest.get(chart) == digest and all(os.path.exists(f) for f in files):
+            rendered[chart] = []
+            continue
+        jobs[chart] = (data, digest)
+
+    if workers == 1 or len(jobs) <= 1:
+        for chart, (data, _) in jobs.items():
+            rendered[chart] = render_chart(chart, data, out_dir, formats)
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            futures = {chart: pool.submit(render_chart, chart, data, out_dir, formats)
+                       for chart, (data, _) in jobs.items()}
+            for chart, future in futures.items():
+                rendered[chart] = future.result()
+
+    for chart, (_, digest) in jobs.items():
+        manifest[chart] = digest
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return rendered
@@ -0,0 +1,374 @@
+# Long-lived query service answering the research questions from warm in-memory state.
+#
+# The table is loaded and cleaned once (through the snapshot cache of tmdb.cache), then the
+# indexes the questions read are built up front: the sorted index of every numeric column
+# (tmdb.topk), the token index of every pipe separated column (tmdb.multivalue), the correlation
+# matrix and the sorted index of release_date (tmdb.dates). A request is then a slice of one of them.
+#
+# The service speaks plain HTTP/1.1 (keep-alive, GET only, JSON bodies) over TCP or a Unix socket.
+# The queries and the JSON encoding run on a thread pool so the event loop keeps accepting and
+# answering requests while they run; /metrics reports the count and the p50/p99 latency per endpoint.
+#
+#   python -m tmdb.server tmdb-movies.csv --port 8000
+#   python -m tmdb.server tmdb-movies.csv --unix /tmp/tmdb.sock
+#
+#   GET /find_minmax/Profit
+#   GET /top_10/revenue?n=25            GET /small_10/budget?n=5
+#   GET /count_split_data/genres?n=10   GET /month_release
+#   GET /corr/revenue/budget            GET /metrics
+#   GET /releases?start=2010-01-01&end=2010-12-31    (movies released in the range, per month)
+#   GET /top_tokens/director/revenue/mean?n=10&min_count=5
+#
+# LocalClient calls the request handler directly, without a socket, for tests and notebooks:
+#
+#   client = LocalClient(QueryServer(QueryService(df)))
+#   status, body = asyncio.run(client.get('/top_10/Profit?n=3'))
+
+import argparse
+import asyncio
+import collections
+import inspect
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from tmdb import topk
+from tmdb.correlation import corr_matrix
+from tmdb.dates import date_index
+from tmdb.multivalue import MULTI_VALUE_COLUMNS, MultiValueIndex, build_indexes
+from tmdb.tokenstats import AGGREGATIONS, MOVIES, top_tokens
+
+# latencies kept per endpoint for the percentiles
+WINDOW = 10000
+
+# connections waiting to be accepted
+BACKLOG = 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+# raised by the queries for a request that names an unknown column or carries a bad parameter
+class QueryError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# this function turns a query result into JSON bytes. Frames become a list of rows, series an
+# object keyed by their index, NaN becomes null.
+def to_json(result):
+    if hasattr(result, 'to_json'):
+        orient = 'records' if result.ndim == 2 else 'index'
+        return result.to_json(orient=orient, date_format='iso').encode()
+    if isinstance(result, float) and math.isnan(result):
+        result = None
+    return json.dumps(result).encode()
+
+
+class QueryService:
+
+    ENDPOINTS = ('find_minmax', 'top_10', 'small_10', 'count_split_data', 'month_release', 'corr', 'releases',
+                 'top_tokens')
+
+    # parameters read from the query string; the other parameters of an endpoint come from the path
+    QUERY_PARAMETERS = ('n', 'min_count', 'start', 'end')
+
+    def __init__(self, df, multi_value_columns=MULTI_VALUE_COLUMNS):
+        self.df = df
+        self.numeric = list(df.select_dtypes('number').columns)
+        for column in self.numeric:
+            topk.sorted_index(df, column)
+        self.indexes = build_indexes(df, multi_value_columns)
+        self.counts = {column: index.counts() for column, index in self.indexes.items()}
+        self.correlation = corr_matrix(df)
+        self.correlation.matrix
+        self.dates = date_index(df)
+        self.months = self.dates.month_counts()
+        # guards the token indexes and counts built on demand for the other text columns
+        self._lock = threading.Lock()
+
+    def _numeric(self, column):
+        if column not in self.numeric:
+            raise QueryError(404, "no numeric column %r" % column)
+        return column
+
+    def _index(self, column):
+        index = self.indexes.get(column)
+        if index is None:
+            if column not in self.df.columns or self.df[column].dtype.kind in 'biufcmM':
+                raise QueryError(404, "no text column %r" % column)
+            with self._lock:
+                index = self.indexes.get(column)
+                if index is None:
+                    index = self.indexes[column] = MultiValueIndex.from_series(self.df[column])
+        return index
+
+    def _counts(self, column):
+        counts = self.counts.get(column)
+        if counts is None:
+            index = self._index(column)
+            with self._lock:
+                counts = self.counts.get(column)
+                if counts is None:
+                    counts = self.counts[column] = index.counts()
+        return counts
+
+    # the highest and the lowest movie of a column
+    def find_minmax(self, column):
+        index = topk.sorted_index(self.df, self._numeric(column))
+        if not len(index):
+            return {'highest': None, 'lowest': None}
+        rows = self.df.iloc[[index.argmax(), index.argmin()]]
+        highest, lowest = json.loads(to_json(rows))
+        return {'highest': highest, 'lowest': lowest}
+
+    def top_10(self, column, n=10):
+        return topk.top(self.df, self._numeric(column), n)
+
+    def small_10(self, column, n=10):
+        return topk.bottom(self.df, self._numeric(column), n)
+
+    def count_split_data(self, column, n=None):
+        counts = self._counts(column)
+        return counts if n is None else counts.iloc[:n]
+
+    def month_release(self):
+        return self.months
+
+    def corr(self, x, y):
+        for column in (x, y):
+            if column not in self.correlation.columns:
+                raise QueryError(404, "no correlation for column %r" % column)
+        return float(self.correlation.get(x, y))
+
+    # the n values of a pipe separated column with the largest how (sum, mean, median, count) of a
+    # numeric column, among the values with at least min_count movies
+    def top_tokens(self, column, by, how='sum', n=10, min_count=1):
+        if how not in AGGREGATIONS:
+            raise QueryError(400, "how must be one of %s, got %r" % (', '.join(AGGREGATIONS), how))
+        top = top_tokens(self.df, column, self._numeric(by), how, n, min_count, index=self._index(column))
+        return pd.DataFrame({column: top.index, MOVIES: top[(MOVIES, '')].to_numpy(),
+                             '%s_%s' % (by, how): top[(by, how)].to_numpy()})
+
+    # number of movies released between start and end (both included, open when left out) and per month
+    def releases(self, start=None, end=None):
+        for value in (start, end):
+            if value is not None and pd.isna(pd.to_datetime(value, errors='coerce')):
+                raise QueryError(400, "not a date: %r" % value)
+        monthly = self.dates.monthly(start, end)
+        return {'count': self.dates.count_between(start, end),
+                'monthly': {str(month): int(count) for month, count in monthly.items()}}
+
+    # this function answers one request: endpoint name, path arguments and query parameters
+    def query(self, endpoint, args, params):
+        if endpoint not in self.ENDPOINTS:
+            raise QueryError(404, "unknown endpoint %r" % endpoint)
+        kwargs = {}
+        for name in ('n', 'min_count'):
+            if name in params:
+                try:
+                    kwargs[name] = int(params[name][-1])
+                except ValueError:
+                    raise QueryError(400, "%s must be an integer, got %r" % (name, params[name][-1]))
+        for name in ('start', 'end'):
+            if name in params:
+                kwargs[name] = params[name][-1]
+        method = getattr(self, endpoint)
+        signature = inspect.signature(method)
+        path = [p for p in signature.parameters.values() if p.name not in self.QUERY_PARAMETERS]
+        fewest = sum(1 for p in path if p.default is p.empty)
+        if not fewest <= len(args) <= len(path):
+            raise QueryError(400, "%s takes %s path arguments, got %d: %s" % (
+                endpoint, fewest if fewest == len(path) else '%d to %d' % (fewest, len(path)), len(args), '/'.join(args)))
+        try:
+            signature.bind(*args, **kwargs)
+        except TypeError:
+            raise QueryError(400, "bad arguments for %s: %s" % (endpoint, '/'.join(args)))
+        return method(*args, **kwargs)
+
+
+# count and latency percentiles of every endpoint over its last WINDOW requests
+class LatencyStats:
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.counts = collections.Counter()
+        self.latencies = {}
+
+    def record(self, endpoint, seconds):
+        self.counts[endpoint] += 1
+        if endpoint not in self.latencies:
+            self.latencies[endpoint] = collections.deque(maxlen=self.window)
+        self.latencies[endpoint].append(seconds)
+
+    def summary(self):
+        report = {}
+        for endpoint, latencies in self.latencies.items():
+            p50, p99 = np.percentile(np.fromiter(latencies, np.float64), [50, 99]) * 1000
+            report[endpoint] = {'count': self.counts[endpoint], 'p50_ms': round(p50, 3), 'p99_ms': round(p99, 3)}
+        return report
+
+
+class QueryServer:
+
+    def __init__(self, service, workers=None):
+        self.service = service
+        self.stats = LatencyStats()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='tmdb-query')
+        self.server = None
+
+    def _answer(self, endpoint, args, params):
+        try:
+            return 200, to_json(self.service.query(endpoint, args, params))
+        except QueryError as error:
+            return error.status, to_json({'error': str(error)})
+
+    # this function answers the request for a path (with its query string) and returns (status, JSON bytes)
+    async def handle(self, path):
+        start = time.perf_counter()
+        url = urlsplit(path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        if not parts:
+            return 200, to_json({'endpoints': list(self.service.ENDPOINTS) + ['metrics']})
+        endpoint, args = parts[0], parts[1:]
+        if endpoint == 'metrics':
+            return 200, to_json(self.stats.summary())
+        loop = asyncio.get_running_loop()
+        try:
+            status, body = await loop.run_in_executor(self.executor, self._answer, endpoint, args, parse_qs(url.query))
+        except Exception as error:
+            status, body = 500, to_json({'error': repr(error)})
+        self.stats.record(endpoint if endpoint in self.service.ENDPOINTS else 'unknown', time.perf_counter() - start)
+        return status, body
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                method, path, version = (request.decode('latin-1').split() + ['', '', ''])[:3]
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                # a request body is read and dropped, so the next request on the connection starts clean
+                length = headers.get('content-length', '0')
+                if not length.isdigit():
+                    status, body, close = 400, to_json({'error': "bad Content-Length %r" % length}), True
+                else:
+                    if int(length):
+                        await reader.readexactly(int(length))
+                    if method == 'GET':
+                        status, body = await self.handle(path)
+                    else:
+                        status, body = 405, to_json({'error': "only GET is supported"})
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n'
+                             % (status, REASONS[status].encode(), len(body), b'Connection: close\r\n' if close else b''))
+                writer.write(body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # this function starts listening on a Unix socket (unix=path) or on host:port
+    async def start(self, host='127.0.0.1', port=8000, unix=None):
+        if unix is not None:
+            self.server = await asyncio.start_unix_server(self._connection, unix, backlog=BACKLOG)
+        else:
+            self.server = await asyncio.start_server(self._connection, host, port, backlog=BACKLOG)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+
+# in-process client: runs requests through QueryServer.handle without any socket
+class LocalClient:
+
+    def __init__(self, server):
+        self.server = server
+
+    async def get(self, path):
+        status, body = await self.server.handle(path)
+        return status, json.loads(body)
+
+
+# this function sends one GET request over a Unix socket (unix=path) or to host:port and returns (status, decoded JSON)
+async def fetch(path, host='127.0.0.1', port=8000, unix=None):
+    if unix is not None:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'GET %s HTTP/1.1\r\nHost: tmdb\r\nConnection: close\r\n\r\n' % path.encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length)
+    writer.close()
+    return status, json.loads(body)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m tmdb.server', description="Serve the TMDb research questions over HTTP.")
+    parser.add_argument('csv', nargs='?', default='tmdb-movies.csv', help="path of tmdb-movies.csv")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="threads answering the queries")
+    parser.add_argument('--engine', default='c', choices=['c', 'pyarrow'], help="csv reader")
+    parser.add_argument('--compact', action='store_true', help="keep the table compact (tmdb.compact)")
+    return parser
+
+
+async def serve(service, host='127.0.0.1', port=8000, unix=None, workers=None):
+    server = QueryServer(service, workers)
+    listener = await server.start(host, port, unix)
+    print("serving on %s" % (unix or '%s:%d' % (host, port)))
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    from tmdb.cli import load
+
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    service = QueryService(load(args.csv, args.engine, compact=args.compact))
+    print("loaded %d movies and built the indexes in %.2f s" % (len(service.df), time.perf_counter() - start))
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
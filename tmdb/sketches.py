@@ -0,0 +1,288 @@
+# Approximate heavy hitters and distinct counts of the pipe separated columns, in bounded memory.
+#
+# count_genre, company_release and frequent_actor only show the top of count_split_data, yet the
+# exact counts keep every distinct actor and company of the dump. The sketches here keep a fixed
+# amount of state whatever the size of the input:
+#
+#   CountMinSketch   counts of any value, over-estimated by at most epsilon * (values seen) with
+#                    probability 1 - delta; width ceil(e / epsilon), depth ceil(ln(1 / delta))
+#   HeavyHitters     the top n values of a column: a Count-Min sketch plus the `capacity` values with
+#                    the highest estimates so far (the candidates)
+#   HyperLogLog      number of distinct values, with a relative standard error of 1.04 / sqrt(2 ** precision)
+#
+# HeavyHitters and DistinctCount are aggregates like those of tmdb.aggregates (update/merge/result),
+# so they run in tmdb.streaming, tmdb.parallel and tmdb.incremental, and sketches of partitions
+# merge into the sketch of the whole. Values are hashed with pandas' hash_array (fixed key), so
+# sketches built in different processes agree. A HyperLogLog cannot forget a value: when a movie
+# changes, tmdb.incremental builds the distinct counts again.
+#
+#   results = run_streaming('tmdb-export.csv', approximate_aggregates(epsilon=1e-4))
+#   python -m tmdb.sketches tmdb-movies.csv --check     (compare with the exact counts)
+
+import argparse
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+from tmdb.multivalue import MultiValueIndex
+
+# columns behind count_genre, company_release and frequent_actor
+HEAVY_HITTER_COLUMNS = ('genres', 'production_companies', 'cast')
+DISTINCT_COLUMNS = ('cast', 'production_companies')
+
+
+# this function returns the 64-bit hash of every value
+def hash_values(values):
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+# this function returns the distinct values of a pipe separated column of a chunk and how many rows list each
+def _token_counts(series):
+    index = MultiValueIndex.from_series(series)
+    return index.vocabulary, np.bincount(index.indices, minlength=len(index.vocabulary))
+
+
+class CountMinSketch:
+
+    def __init__(self, epsilon=1e-4, delta=0.01):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        # sum of all the counts added
+        self.total = 0
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    # the column of every hash in every row of the table (double hashing: h1 + d * h2)
+    def _columns(self, hashes):
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        for d in range(self.depth):
+            yield d, ((low + np.uint64(d) * high) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, hashes, counts):
+        counts = np.asarray(counts, dtype=np.int64)
+        for d, columns in self._columns(hashes):
+            self.table[d] += np.bincount(columns, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def estimate(self, hashes):
+        estimate = None
+        for d, columns in self._columns(hashes):
+            row = self.table[d, columns]
+            estimate = row if estimate is None else np.minimum(estimate, row)
+        return estimate
+
+    # largest over-estimate of a count, with probability 1 - delta
+    @property
+    def error_bound(self):
+        return self.epsilon * self.total
+
+    def merge(self, other):
+        if self.table.shape != other.table.shape:
+            raise ValueError("cannot merge sketches of shape %s and %s" % (self.table.shape, other.table.shape))
+        self.table += other.table
+        self.total += other.total
+
+
+class HyperLogLog:
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18, got %r" % precision)
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # position of the leftmost 1 bit of the remaining bits (bits + 1 when they are all 0)
+        rank = (bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, rank)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            # linear counting is more accurate for small cardinalities
+            return m * math.log(m / empty)
+        return float(raw)
+
+    def merge(self, other):
+        if self.precision != other.precision:
+            raise ValueError("cannot merge HyperLogLog of precision %d and %d" % (self.precision, other.precision))
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+
+# number of significant bits of every uint64 (frexp is exact on 32-bit halves)
+def _bit_length(values):
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+# top n values of a pipe separated column (approximate count_split_data(...).head(n))
+class HeavyHitters:
+
+    def __init__(self, column, n=20, epsilon=1e-4, delta=0.01, capacity=None):
+        self.column = column
+        self.n = n
+        self.sketch = CountMinSketch(epsilon, delta)
+        # values kept as candidates for the top n, in order of first appearance
+        self.capacity = capacity or 10 * n
+        self.candidates = pd.Index([])
+        self.hashes = np.zeros(0, dtype=np.uint64)
+
+    @property
+    def name(self):
+        return 'approx_count_split_data:' + self.column
+
+    @property
+    def inputs(self):
+        return [self.column]
+
+    def _keep(self, values, hashes):
+        # union of the old and the new candidates, ranked by their estimate
+        keep = ~values.isin(self.candidates)
+        values = self.candidates.append(values[keep])
+        hashes = np.concatenate([self.hashes, hashes[keep]])
+        if len(values) > self.capacity:
+            order = np.argsort(-self.sketch.estimate(hashes), kind='stable')[:self.capacity]
+            order.sort()
+            values, hashes = values[order], hashes[order]
+        self.candidates, self.hashes = values, hashes
+
+    def update(self, df):
+        values, counts = _token_counts(df[self.column])
+        hashes = hash_values(values)
+        self.sketch.add(hashes, counts)
+        self._keep(values, hashes)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self._keep(other.candidates, other.hashes)
+
+    # Count-Min counts are sums, so rows added before can be subtracted again (tmdb.incremental)
+    def remove(self, df):
+        values, counts = _token_counts(df[self.column])
+        self.sketch.add(hash_values(values), -counts)
+        return True
+
+    # the counts do not depend on how the rows were split, but values tied at the n-th count can be
+    # picked differently, because candidates dropped in one partition lose their first appearance
+    def result(self):
+        estimates = self.sketch.estimate(self.hashes)
+        order = np.argsort(-estimates, kind='stable')[:self.n]
+        return pd.Series(estimates[order], index=self.candidates[order], name='count')
+
+
+# number of distinct values of a pipe separated column (approximate len(count_split_data(...)))
+class DistinctCount:
+
+    def __init__(self, column, precision=14):
+        self.column = column
+        self.sketch = HyperLogLog(precision)
+
+    @property
+    def name(self):
+        return 'distinct:' + self.column
+
+    @property
+    def inputs(self):
+        return [self.column]
+
+    def update(self, df):
+        values, _ = _token_counts(df[self.column])
+        self.sketch.add(hash_values(values))
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def result(self):
+        return int(round(self.sketch.estimate()))
+
+
+# the approximate counterparts of count_genre, company_release and frequent_actor, plus the number
+# of distinct actors and companies
+def approximate_aggregates(n=20, epsilon=1e-4, delta=0.01, precision=14):
+    return ([HeavyHitters(column, n, epsilon, delta) for column in HEAVY_HITTER_COLUMNS]
+            + [DistinctCount(column, precision) for column in DISTINCT_COLUMNS])
+
+
+# this function compares the approximate aggregates with the exact counts (count_split_data) of df.
+# Heavy hitters: the largest count error, and the share of the exact top n found among the values
+# whose count beats the n-th count by more than the error bound (only those are certain to be in
+# the top n of the sketch); every value returned has to come within the error bound of the n-th
+# count. Distinct counts: the relative error.
+# ok tells whether the errors are within what the sketch allows (3 standard errors for HyperLogLog).
+def check(df, aggregates=None):
+    from tmdb.analysis import count_split_data
+
+    aggregates = aggregates or approximate_aggregates()
+    rows = {}
+    for agg in aggregates:
+        agg.update(df)
+        exact = count_split_data(df, agg.column)
+        if isinstance(agg, HeavyHitters):
+            found = agg.result()
+            top = exact.iloc[:agg.n]
+            true = exact.reindex(found.index).fillna(0)
+            cut = top.iloc[-1] if len(top) else 0
+            allowed = agg.sketch.error_bound
+            certain = top[top > cut + allowed]
+            recall = float(certain.index.isin(found.index).mean()) if len(certain) else 1.0
+            error = float((found - true).abs().max()) if len(found) else 0.0
+            rows[agg.name] = {'exact': len(top), 'approximate': len(found), 'recall': recall, 'error': error,
+                              'allowed': allowed, 'ok': error <= allowed and recall == 1.0 and (true >= cut - allowed).all()}
+        else:
+            estimate = agg.result()
+            error = abs(estimate - len(exact)) / max(len(exact), 1)
+            allowed = 3 * agg.sketch.relative_error
+            rows[agg.name] = {'exact': len(exact), 'approximate': estimate, 'recall': np.nan,
+                              'error': error, 'allowed': allowed, 'ok': error <= allowed}
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tmdb.sketches', description="Approximate top values and distinct counts.")
+    parser.add_argument('csv', nargs='?', default='tmdb-movies.csv')
+    parser.add_argument('-n', type=int, default=20, help="number of top values")
+    parser.add_argument('--epsilon', type=float, default=1e-4, help="count error as a share of the values seen")
+    parser.add_argument('--delta', type=float, default=0.01, help="probability of a larger error")
+    parser.add_argument('--precision', type=int, default=14, help="HyperLogLog precision (2 ** precision registers)")
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--check', action='store_true', help="compare with the exact counts of the whole table")
+    args = parser.parse_args(argv)
+    aggregates = approximate_aggregates(args.n, args.epsilon, args.delta, args.precision)
+    if args.check:
+        from tmdb.cleaning import clean_movies
+        from tmdb.loader import load_movies
+
+        table = check(clean_movies(load_movies(args.csv)), aggregates)
+        print(table)
+        return 0 if table['ok'].all() else 1
+    from tmdb.streaming import run_streaming
+
+    for name, result in run_streaming(args.csv, aggregates, args.chunksize).items():
+        print("== %s" % name)
+        print(result)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
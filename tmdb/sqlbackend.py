@@ -0,0 +1,266 @@
+# Out-of-core backend: the research questions as SQL over an embedded SQLite database.
+#
+# load_database() streams the csv into a SQLite file chunk by chunk, cleaned like tmdb.streaming
+# cleans it (duplicates dropped across chunks by fingerprint, 0 as missing, Profit), so only one
+# chunk and 8 bytes per distinct row are in memory at a time. The questions then run as SQL inside
+# the process (sqlite3 from the standard library; no server, no extra package) and come back as the
+# same tables the pandas path returns:
+#
+#   count:<key>,<value>          SELECT key, COUNT(value) ... GROUP BY key
+#   find_minmax, top_10, small_10   ORDER BY x IS NULL, x DESC/ASC, row LIMIT n (like nlargest)
+#   compare_two_y/compare_two_x  SELECT key, AVG(value) ... GROUP BY key
+#   month_release                strftime('%m', release_date) ... GROUP BY month
+#   count_split_data:<column>    a recursive CTE splits the pipe separated values into one row each
+#
+#   database = open_database('tmdb-movies.csv')    # built once per csv and cleaning code, then reused
+#   results = run_sql(database, ['count:release_year,id', 'top_10:Profit', 'count_split_data:genres'])
+#   python -m tmdb tmdb-movies.csv --backend sqlite --no-plots
+#
+# corr and reg_plot have no SQL form here; supported() tells which questions do.
+
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from tmdb.cache import CACHE_DIR, atomic_path, code_digest, csv_digest
+from tmdb.profiling import stage, traced
+from tmdb.topk import no_minmax
+
+TABLE = 'movies'
+
+# column holding the row label of every movie (its line in the csv), for ties and row order
+ROW = 'row'
+
+SQL_QUESTIONS = ('count', 'year_release', 'find_minmax', 'top_10', 'small_10', 'compare_two_y', 'compare_two_x',
+                 'month_release', 'count_split_data')
+
+SEPARATOR = '|'
+
+
+def _split(name):
+    kind, _, args = name.partition(':')
+    return kind, args.split(',') if args else []
+
+
+# this function tells whether a question can be answered by run_sql
+def supported(name):
+    return _split(name)[0] in SQL_QUESTIONS
+
+
+def _quote(column):
+    return '"%s"' % column.replace('"', '""')
+
+
+# this function returns the dtype every column of the table will have once all chunks are written:
+# a column that was an integer in one chunk and float (a 0 made NaN) in another is float64
+def _merge_dtypes(dtypes, chunk):
+    for column, dtype in chunk.dtypes.items():
+        dtype = str(dtype)
+        old = dtypes.get(column)
+        if old is not None and old != dtype and 'float64' in (old, dtype):
+            dtype = 'float64'
+        dtypes[column] = dtype
+    return dtypes
+
+
+# this function appends a cleaned frame to the table, its row labels in the row column
+def write_chunk(con, chunk):
+    chunk.to_sql(TABLE, con, if_exists='append', index=True, index_label=ROW)
+
+
+def _write_meta(con, dtypes):
+    con.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    con.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('dtypes', json.dumps(dtypes)))
+
+
+# this function writes the cleaned frames into a new database file (replacing path once complete)
+def write_database(frames, path):
+    with atomic_path(path) as tmp:
+        con = sqlite3.connect(tmp)
+        try:
+            dtypes = {}
+            for frame in frames:
+                with stage('write_chunk', 'load', rows=len(frame)):
+                    write_chunk(con, frame)
+                _merge_dtypes(dtypes, frame)
+            _write_meta(con, dtypes)
+            con.commit()
+        finally:
+            con.close()
+    return path
+
+
+# this function streams the csv into a SQLite database at path, chunksize rows at a time
+@traced('load_database', 'load')
+def load_database(path='tmdb-movies.csv', database=None, chunksize=100_000):
+    from tmdb.streaming import iter_clean_chunks
+
+    return write_database(iter_clean_chunks(path, chunksize), database or database_path(path))
+
+
+# the file is keyed on the csv and on the code that builds it: the cleaning of tmdb.cache plus the
+# chunked cleaning of tmdb.streaming and this module
+def database_path(path, cache_dir=CACHE_DIR):
+    from tmdb import streaming
+
+    digest = code_digest((streaming, sys.modules[__name__]))
+    name = 'movies-%s-%s.sqlite' % (csv_digest(path, cache_dir)[:16], digest[:16])
+    return os.path.join(cache_dir, name)
+
+
+# this function returns the database of the csv, loading it first when there is none for this csv and
+# cleaning code yet (like the snapshots of tmdb.cache)
+def open_database(path='tmdb-movies.csv', cache_dir=CACHE_DIR, chunksize=100_000):
+    database = database_path(path, cache_dir)
+    if not os.path.exists(database):
+        os.makedirs(cache_dir, exist_ok=True)
+        load_database(path, database, chunksize)
+    return database
+
+
+class SqlBackend:
+
+    def __init__(self, database):
+        self.database = database
+        self.con = sqlite3.connect(database)
+        self.dtypes = json.loads(self.con.execute("SELECT value FROM meta WHERE key = 'dtypes'").fetchone()[0])
+        # column -> categories, for the columns load_movies reads as categoricals
+        self._categories = {}
+
+    def close(self):
+        self.con.close()
+
+    def _column(self, column):
+        if column not in self.dtypes:
+            raise ValueError("no column %r in %s" % (column, self.database))
+        return _quote(column)
+
+    def _rows(self, sql, params=()):
+        with stage('sql', 'question', sql=sql):
+            return self.con.execute(sql, params).fetchall()
+
+    # this function turns fetched key values into an index with the dtype of the key column
+    def _index(self, values, column):
+        return pd.Index(values, name=column).astype(self.dtypes[column])
+
+    # the dtype load_movies gives a column: the categoricals of the loader schema hold every value of
+    # the column, sorted, like read_csv makes them
+    def _dtype(self, column):
+        from tmdb.loader import SCHEMA
+
+        if SCHEMA.get(column) != 'category':
+            return self.dtypes[column]
+        if column not in self._categories:
+            sql = 'SELECT DISTINCT %s FROM %s WHERE %s IS NOT NULL ORDER BY 1' % (
+                self._column(column), TABLE, self._column(column))
+            self._categories[column] = pd.CategoricalDtype(pd.Index([r[0] for r in self._rows(sql)]))
+        return self._categories[column]
+
+    # movies as the frame holds them: row labels as the index, the column dtypes of the pandas path and
+    # NaN for a missing value (SQLite hands back None)
+    def _frame(self, sql, params=()):
+        with stage('sql', 'question', sql=sql):
+            frame = pd.read_sql_query(sql, self.con, params=params, index_col=ROW)
+        frame.index.name = None
+        for column, dtype in self.dtypes.items():
+            if dtype.startswith('datetime64'):
+                frame[column] = pd.to_datetime(frame[column]).astype(dtype)
+            elif dtype == 'object':
+                frame[column] = frame[column].astype(object).where(frame[column].notna(), np.nan)
+            else:
+                frame[column] = frame[column].astype(self._dtype(column))
+        return frame[list(self.dtypes)]
+
+    def count(self, key, value):
+        sql = 'SELECT %s, COUNT(%s) FROM %s WHERE %s IS NOT NULL GROUP BY 1 ORDER BY 1' % (
+            self._column(key), self._column(value), TABLE, self._column(key))
+        rows = self._rows(sql)
+        return pd.Series([r[1] for r in rows], index=self._index([r[0] for r in rows], key), name=value, dtype=np.int64)
+
+    def mean(self, key, value):
+        sql = 'SELECT %s, AVG(%s) FROM %s WHERE %s IS NOT NULL GROUP BY 1 ORDER BY 1' % (
+            self._column(key), self._column(value), TABLE, self._column(key))
+        rows = self._rows(sql)
+        return pd.Series([r[1] for r in rows], index=self._index([r[0] for r in rows], key), name=value, dtype=np.float64)
+
+    # the n largest (or smallest) movies of a column, ties in row order and the movies without a value
+    # last, like nlargest (nsmallest)
+    def top(self, column, n=10, largest=True):
+        sql = 'SELECT * FROM %s ORDER BY %s IS NULL, %s %s, %s LIMIT ?' % (
+            TABLE, self._column(column), self._column(column), 'DESC' if largest else 'ASC', ROW)
+        return self._frame(sql, (n,))
+
+    def find_minmax(self, column):
+        high = self.top(column, 1, largest=True)
+        low = self.top(column, 1, largest=False)
+        if not len(high) or pd.isna(high[column].iloc[0]):
+            return no_minmax(pd.Index(list(self.dtypes)))
+        return pd.concat([pd.DataFrame(high.iloc[0]), pd.DataFrame(low.iloc[0])], axis = 1)
+
+    def month_release(self):
+        column = self._column('release_date')
+        sql = ("SELECT CAST(strftime('%%m', %s) AS INTEGER), COUNT(*) FROM %s WHERE %s IS NOT NULL GROUP BY 1 ORDER BY 1"
+               % (column, TABLE, column))
+        rows = self._rows(sql)
+        missing = self._rows('SELECT COUNT(*) FROM %s WHERE %s IS NULL' % (TABLE, column))[0][0]
+        # .dt.month is float when a date is missing, int32 otherwise
+        index = pd.Index([r[0] for r in rows], name='release_date').astype(np.float64 if missing else np.int32)
+        return pd.Series([r[1] for r in rows], index=index, name='count', dtype=np.int64)
+
+    # this function counts every value of a pipe separated column, most frequent first and ties in
+    # order of first appearance (like value_counts of the split values)
+    def count_split_data(self, column):
+        column = self._column(column)
+        sql = '''
+            WITH RECURSIVE split(row, position, token, rest) AS (
+                SELECT %(row)s, -1, NULL, %(column)s || '%(sep)s' FROM %(table)s WHERE %(column)s IS NOT NULL
+                UNION ALL
+                SELECT row, position + 1, substr(rest, 1, instr(rest, '%(sep)s') - 1),
+                       substr(rest, instr(rest, '%(sep)s') + 1)
+                FROM split WHERE rest <> ''
+            )
+            SELECT token, COUNT(*) AS count, MIN(row * 65536 + position) AS first
+            FROM split WHERE position >= 0 GROUP BY token ORDER BY count DESC, first
+        ''' % {'row': ROW, 'column': column, 'sep': SEPARATOR, 'table': TABLE}
+        rows = self._rows(sql)
+        return pd.Series([r[1] for r in rows], index=pd.Index([r[0] for r in rows]), name='count', dtype=np.int64)
+
+    # this function answers one question named like the questions of tmdb.planner
+    def answer(self, name):
+        kind, args = _split(name)
+        if kind == 'year_release':
+            return self.count('release_year', 'id')
+        if kind == 'count':
+            return self.count(*args)
+        if kind in ('compare_two_y', 'compare_two_x'):
+            return self.mean(*args)
+        if kind == 'find_minmax':
+            return self.find_minmax(args[0])
+        if kind == 'top_10':
+            return self.top(args[0], 10, largest=True)
+        if kind == 'small_10':
+            return self.top(args[0], 10, largest=False)
+        if kind == 'month_release':
+            return self.month_release()
+        if kind == 'count_split_data':
+            return self.count_split_data(args[0])
+        raise ValueError("no SQL for question %r" % name)
+
+
+# this function answers the questions (the notebook's that have SQL by default) from a database and
+# returns {question: result table}
+@traced('run_sql', 'question')
+def run_sql(database, requests=None):
+    if requests is None:
+        from tmdb.planner import notebook_questions
+
+        requests = [name for name in notebook_questions() if supported(name)]
+    backend = SqlBackend(database)
+    try:
+        return {name: backend.answer(name) for name in requests}
+    finally:
+        backend.close()
@@ -0,0 +1,44 @@
+# Chunked execution of the research questions for csv files that do not fit in memory.
+#
+# The csv is read chunksize rows at a time, every chunk is cleaned like the whole table would be and
+# fed to the mergeable aggregates of tmdb.aggregates. Duplicate rows are recognised across chunks by
+# their 64-bit fingerprint, so besides one chunk only the aggregate state and 8 bytes per distinct
+# row are kept in memory.
+#
+#   results = run_streaming('tmdb-movies.csv', chunksize=50_000)
+
+from tmdb.aggregates import notebook_aggregates
+from tmdb.cleaning import finish, prepare
+from tmdb.fingerprints import FingerprintSet, row_fingerprints
+from tmdb.loader import iter_movies
+from tmdb.profiling import traced
+
+
+# this function cleans one chunk and drops the rows whose fingerprint is in seen (or earlier in the
+# chunk); the fingerprints of the rows it keeps are added to seen
+@traced('clean_chunk', 'clean')
+def clean_chunk(chunk, seen):
+    chunk = prepare(chunk)
+    fingerprints = row_fingerprints(chunk)
+    keep = ~(chunk.duplicated().to_numpy() | seen.contains(fingerprints))
+    seen.add(fingerprints[keep])
+    return finish(chunk[keep])
+
+
+# this function yields the cleaned chunks of the csv, without the rows already seen in earlier chunks
+def iter_clean_chunks(path='tmdb-movies.csv', chunksize=100_000):
+    seen = FingerprintSet()
+    for chunk in iter_movies(path, chunksize):
+        yield clean_chunk(chunk, seen)
+
+
+# this function runs the aggregates (the notebook's by default) over the csv chunk by chunk and
+# returns {aggregate name: result table}
+@traced('run_streaming', 'question')
+def run_streaming(path='tmdb-movies.csv', aggregates=None, chunksize=100_000):
+    if aggregates is None:
+        aggregates = notebook_aggregates()
+    for chunk in iter_clean_chunks(path, chunksize):
+        for agg in aggregates:
+            agg.update(chunk)
+    return {agg.name: agg.result() for agg in aggregates}
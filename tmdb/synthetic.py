@@ -0,0 +1,112 @@
+# Synthetic TMDb-shaped data for benchmarks.
+#
+# generate(n) returns a frame like load_movies() returns for tmdb-movies.csv, with the same columns
+# and roughly the same distributions as the kaggle dump: about half of the budgets and revenues are 0
+# (plus a few absurd $1 budgets), skewed runtimes with a long tail, more movies in recent years,
+# pipe separated genres/cast/companies/keywords drawn from Zipf-like pools, missing values where the
+# dump has them and a few duplicated rows. Everything is generated locally from a seed.
+
+import numpy as np
+import pandas as pd
+
+GENRES = ['Drama', 'Comedy', 'Thriller', 'Action', 'Romance', 'Horror', 'Adventure', 'Crime',
+          'Family', 'Science Fiction', 'Fantasy', 'Mystery', 'Animation', 'Documentary', 'Music',
+          'History', 'War', 'Foreign', 'TV Movie', 'Western']
+
+# share of the kaggle dump per genre, roughly
+GENRE_WEIGHTS = np.array([4761, 3793, 2908, 2385, 1712, 1637, 1471, 1355, 1231, 1230, 916, 810,
+                          699, 520, 408, 334, 270, 188, 167, 165], dtype=np.float64)
+
+LANGUAGES = ['en', 'fr', 'es', 'de', 'ja', 'it', 'zh', 'ru', 'hi', 'ko']
+
+
+def _zipf_weights(size, exponent=1.0):
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _names(prefix, size):
+    return np.array(['%s %d' % (prefix, i) for i in range(size)], dtype=object)
+
+
+# pipe separated lists of 1..max_items names drawn from pool with weights p; missing share -> NaN
+def _pipe_column(rng, n, pool, p, max_items, missing):
+    items = rng.integers(1, max_items + 1, n)
+    if len(pool) <= 100:
+        # small pools (genres): draw without replacement per row with the Gumbel top-k trick
+        keys = np.log(p) + rng.gumbel(size=(n, len(pool)))
+        ids = np.argsort(-keys, axis=1)[:, :max_items]
+    else:
+        ids = rng.choice(len(pool), size=(n, max_items), p=p)
+    result = pool[ids[:, 0]].copy()
+    for j in range(1, max_items):
+        more = items > j
+        result[more] = result[more] + '|' + pool[ids[more, j]]
+    result[rng.random(n) < missing] = np.nan
+    return result
+
+
+# this function generates n movies (plus about one duplicate per 10,000 rows)
+def generate(n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    actors = _names('Actor', max(100, min(int(n * 1.8), 2_000_000)))
+    directors = _names('Director', max(50, min(int(n * 0.5), 1_000_000)))
+    companies = _names('Company', max(50, min(int(n * 0.7), 1_000_000)))
+    keywords = _names('keyword', max(100, min(int(n * 0.9), 1_000_000)))
+
+    # more movies in recent years, like the dump (about 700 in 2014 against 30 in 1960)
+    years = np.arange(1960, 2016)
+    year_weights = np.exp((years - 1960) / 17.0)
+    release_year = rng.choice(years, size=n, p=year_weights / year_weights.sum()).astype(np.int16)
+    month = rng.choice(np.arange(1, 13), size=n, p=_zipf_weights(12, 0.1)[rng.permutation(12)])
+    day = rng.integers(1, 29, n)
+    release_date = pd.to_datetime(pd.DataFrame({'year': release_year, 'month': month, 'day': day}))
+
+    budget = np.minimum(np.rint(rng.lognormal(16.5, 1.6, n)), 425_000_000).astype(np.int64)
+    budget[rng.random(n) < 0.52] = 0
+    tiny = rng.random(n) < 0.003
+    budget[tiny] = rng.integers(1, 100, tiny.sum())
+    revenue = np.rint(rng.lognormal(17.5, 1.9, n)).astype(np.int64)
+    revenue[rng.random(n) < 0.55] = 0
+    revenue = np.minimum(revenue, 2_800_000_000)
+    runtime = np.rint(rng.gamma(11.0, 9.3, n)).astype(np.int32)
+    runtime[rng.random(n) < 0.003] = 0
+    long_tail = rng.random(n) < 0.001
+    runtime[long_tail] = rng.integers(200, 901, long_tail.sum())
+    inflation = 1.0 + (2010 - release_year) * 0.03
+
+    df = pd.DataFrame({
+        'id': rng.permutation(np.arange(1, 4 * n + 1))[:n].astype(np.int64),
+        'imdb_id': np.array(['tt%07d' % i for i in rng.integers(0, 9_999_999, n)], dtype=object),
+        'popularity': rng.lognormal(-1.0, 1.0, n),
+        'budget': budget,
+        'revenue': revenue,
+        'original_title': _names('Movie', n),
+        'cast': _pipe_column(rng, n, actors, _zipf_weights(len(actors), 0.8), 5, 0.007),
+        'homepage': np.where(rng.random(n) < 0.73, None, 'http://www.example.com/'),
+        'director': pd.Categorical(directors[rng.choice(len(directors), n, p=_zipf_weights(len(directors), 0.7))]),
+        'tagline': np.where(rng.random(n) < 0.26, None, 'A tagline.'),
+        'keywords': _pipe_column(rng, n, keywords, _zipf_weights(len(keywords), 0.9), 5, 0.137),
+        'overview': 'An overview of the movie.',
+        'runtime': runtime,
+        'genres': _pipe_column(rng, n, np.array(GENRES, dtype=object), GENRE_WEIGHTS / GENRE_WEIGHTS.sum(), 4, 0.002),
+        'production_companies': _pipe_column(rng, n, companies, _zipf_weights(len(companies), 0.9), 3, 0.095),
+        'release_date': release_date,
+        'vote_count': (np.rint(rng.lognormal(3.8, 1.5, n)) + 10).astype(np.int32),
+        'vote_average': np.clip(np.round(rng.normal(6.0, 0.93, n), 1), 1.5, 9.2),
+        'release_year': release_year,
+        'budget_adj': budget * inflation,
+        'revenue_adj': revenue * inflation,
+    })
+    duplicates = rng.choice(n, size=max(1, n // 10_000), replace=False)
+    return pd.concat([df, df.iloc[duplicates]], ignore_index=True)
+
+
+# this function writes generate(n) as a csv in the format of tmdb-movies.csv (dates like 6/9/15)
+def write_csv(path, n=10_000, seed=0):
+    df = generate(n, seed)
+    dates = df['release_date']
+    df['release_date'] = (dates.dt.month.astype(str) + '/' + dates.dt.day.astype(str) + '/'
+                          + (dates.dt.year % 100).map('{:02d}'.format))
+    df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,125 @@
+# Revenue, profit and rating per actor, director, genre and company.
+#
+# count_split_data only counts how often a value of a pipe separated column occurs, so it cannot say
+# which directors or studios earn the most. token_stats() aggregates per-movie columns over the
+# values of such a column from the integer codes of tmdb.multivalue: every (movie, value) entry
+# takes the movie's number, sums and counts are np.bincount over the codes, and medians are read
+# from the entries sorted by (code, value), at the middle of each code's segment.
+#
+#   token_stats(df, 'director', min_count=5)                        # every director with 5+ movies
+#   top_tokens(df, 'production_companies', 'Profit', 'sum', n=10)   # studios earning the most profit
+#   top_tokens(df, 'cast', 'revenue', 'median', n=20, min_count=10)
+#   python -m tmdb.tokenstats tmdb-movies.csv director --by revenue --how mean -n 10 --min-count 5
+#
+# Like count_split_data, a value listed twice for a movie counts the movie twice. Missing values
+# (NaN, e.g. a revenue of 0 after cleaning) are skipped per column, as pandas does.
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from tmdb.multivalue import MultiValueIndex
+from tmdb.planner import select_positions
+from tmdb.profiling import stage, traced
+
+TOKEN_COLUMNS = ('cast', 'director', 'genres', 'production_companies')
+
+VALUE_COLUMNS = ('revenue', 'Profit', 'vote_average')
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'median')
+
+# name of the column with the number of movies of every value
+MOVIES = 'movies'
+
+
+# this function aggregates values (one per entry) per code; it returns {how: array of length size}
+def _segment_stats(codes, values, size, hows):
+    valid = ~np.isnan(values)
+    if not valid.all():
+        codes, values = codes[valid], values[valid]
+    count = np.bincount(codes, minlength=size)
+    results = {}
+    if 'count' in hows:
+        results['count'] = count
+    if 'sum' in hows or 'mean' in hows:
+        total = np.bincount(codes, weights=values, minlength=size)
+        results['sum'] = total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            results['mean'] = total / count
+    if 'median' in hows:
+        # the values of code c are sorted[start[c]:start[c] + count[c]]
+        ordered = values[np.lexsort((values, codes))]
+        start = np.cumsum(count) - count
+        present = count > 0
+        middle = np.full(size, np.nan)
+        low = start[present] + (count[present] - 1) // 2
+        high = start[present] + count[present] // 2
+        middle[present] = (ordered[low] + ordered[high]) / 2
+        results['median'] = middle
+    return {how: results[how] for how in hows}
+
+
+# this function returns one row per value of a pipe separated column: the number of movies and the
+# hows (count, sum, mean, median) of every value column, for the values with at least min_count
+# movies, most movies first (ties in order of first appearance). index can be the MultiValueIndex
+# of the column already built (build_indexes).
+@traced('token_stats', 'question')
+def token_stats(df, column, values=VALUE_COLUMNS, hows=('sum', 'mean', 'median'), min_count=1, index=None):
+    for how in hows:
+        if how not in AGGREGATIONS:
+            raise ValueError("unknown aggregation %r, expected one of %s" % (how, AGGREGATIONS))
+    if index is None:
+        index = MultiValueIndex.from_series(df[column])
+    size = len(index.vocabulary)
+    codes = index.indices
+    movies = np.bincount(codes, minlength=size)
+    keep = np.flatnonzero(movies >= min_count)
+    keep = keep[np.argsort(-movies[keep], kind='stable')]
+    rows = index.rows()
+    columns = {(MOVIES, ''): movies[keep]}
+    for value in values:
+        with stage('token_stats %s' % value, 'question', column=column):
+            per_entry = df[value].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+            for how, result in _segment_stats(codes, per_entry, size, hows).items():
+                columns[(value, how)] = result[keep]
+    result = pd.DataFrame(columns, index=pd.Index(index.vocabulary[keep], name=column))
+    result.columns = pd.MultiIndex.from_tuples(list(columns))
+    return result
+
+
+# this function returns the n values of a pipe separated column with the largest how of the value
+# column by (e.g. the 10 directors with the highest mean revenue), among those with at least
+# min_count movies. Ties keep the order of token_stats.
+def top_tokens(df, column, by='revenue', how='sum', n=10, min_count=1, index=None):
+    return ranked(token_stats(df, column, [by], [how], min_count, index), by, how, n)
+
+
+# this function returns the n rows of a token_stats table with the largest (by, how) column
+def ranked(stats, by, how, n=10):
+    return stats.iloc[select_positions(stats[(by, how)].to_numpy(dtype=np.float64), n)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tmdb.tokenstats',
+                                     description="Revenue, profit and rating per actor, director, genre or company.")
+    parser.add_argument('csv', nargs='?', default='tmdb-movies.csv')
+    parser.add_argument('column', nargs='?', default='director', choices=TOKEN_COLUMNS)
+    parser.add_argument('--by', default='revenue', help="value column to rank by")
+    parser.add_argument('--how', default='sum', choices=AGGREGATIONS)
+    parser.add_argument('-n', type=int, default=10, help="number of values shown")
+    parser.add_argument('--min-count', type=int, default=1, help="fewest movies a value needs to be ranked")
+    args = parser.parse_args(argv)
+    from tmdb.cache import load_clean
+
+    values = list(VALUE_COLUMNS) + ([args.by] if args.by not in VALUE_COLUMNS else [])
+    hows = ['sum', 'mean', 'median'] + ([args.how] if args.how == 'count' else [])
+    stats = token_stats(load_clean(args.csv), args.column, values, hows, args.min_count)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(ranked(stats, args.by, args.how, args.n))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
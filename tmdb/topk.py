@@ -0,0 +1,180 @@
+# Sorted index of numeric columns for repeated top/bottom-N, min/max and quantile queries.
+#
+# top_10, small_10 and find_minmax scan Profit, revenue and budget again on every call, and an API
+# answering "top N by metric" for arbitrary N would do the same many times a second. SortedIndex
+# sorts a column once (a stable argsort kept as an int32 permutation, NaN rows last); afterwards a
+# top/bottom-N query is a slice of n positions and a quantile is a lookup in the sorted values.
+#
+#   top(df, 'Profit', 25)          # same rows as df.nlargest(25, 'Profit')
+#   bottom(df, 'budget', 10)       # same rows as df.nsmallest(10, 'budget')
+#   minmax(df, 'revenue')          # same table as find_minmax
+#   quantile(df, 'runtime', [0.5, 0.99])
+#
+# The index of every column is cached per frame and rebuilt when the column changes: the cache
+# holds a view of the column, so with copy-on-write any change to it (setitem, loc/iloc assignment,
+# in-place sort, replacing the column) gives the frame a new buffer, which the next query notices.
+# The first write after a column was indexed therefore copies that column once. Copy-on-write is
+# always on from pandas 3; with an older pandas that does not have it switched on
+# (pd.options.mode.copy_on_write = True), an in-place edit keeps the buffer, so nothing is cached.
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from tmdb.profiling import stage
+
+
+class SortedIndex:
+
+    def __init__(self, order, values):
+        # positions of the rows in ascending order of value, ties in row order, NaN last
+        self.order = order
+        # the non-NaN values in that order
+        self.values = values
+
+    @classmethod
+    def from_series(cls, series):
+        with stage('sort', 'index', column=str(series.name), rows=len(series)):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            dtype = np.int32 if len(values) < 2 ** 31 else np.int64
+            # argsort puts NaN last
+            order = np.argsort(values, kind='stable').astype(dtype)
+            count = len(values) - int(np.isnan(values).sum())
+            return cls(order, values[order[:count]])
+
+    # number of non-NaN values
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.values.nbytes
+
+    # positions of the n smallest values in the order nsmallest returns them (padded with the NaN
+    # rows when n is larger than the number of values)
+    def smallest(self, n):
+        return self.order[:max(n, 0)]
+
+    # positions of the n largest values in the order nlargest returns them: descending, ties in row
+    # order, padded with the NaN rows
+    def largest(self, n):
+        end = len(self)
+        if n > end:
+            return np.concatenate([self.largest(end), self.order[end:n]])
+        if n <= 0:
+            return self.order[:0]
+        cut = self.values[end - n]
+        # rows above the cut value are all kept; reversing the ascending order would put their
+        # ties in reverse row order, so they are sorted again (fewer than n of them)
+        above = np.searchsorted(self.values, cut, side='right')
+        positions = self.order[above:end]
+        positions = positions[np.lexsort((positions, -self.values[above:end]))]
+        # the first rows holding the cut value fill up the rest
+        first = np.searchsorted(self.values, cut, side='left')
+        return np.concatenate([positions, self.order[first:first + n - len(positions)]])
+
+    # positions of the first row with the largest and the first row with the smallest value, as
+    # idxmax and idxmin find them. None for a column without values.
+    def argmax(self):
+        return int(self.largest(1)[0]) if len(self) else None
+
+    def argmin(self):
+        return int(self.order[0]) if len(self) else None
+
+    # quantile(s) with linear interpolation, like Series.quantile
+    def quantile(self, q):
+        q = np.asarray(q, dtype=np.float64)
+        if len(self) == 0:
+            return np.full(q.shape, np.nan)[()]
+        position = q * (len(self) - 1)
+        low = np.floor(position).astype(np.intp)
+        high = np.minimum(low + 1, len(self) - 1)
+        weight = position - low
+        return (self.values[low] * (1 - weight) + self.values[high] * weight)[()]
+
+
+# id(df) -> (weak reference to df, {(column, build): (column view, buffer, structure)})
+_memo = {}
+
+
+# this function tells whether pandas copies a column's buffer on write while a view of it is kept,
+# which is what the caches here and in tmdb.correlation rely on to see an edit
+def copy_on_write():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+# this function identifies the buffer behind a column, which changes whenever the column is written
+def column_buffer(series):
+    values = series.values
+    if isinstance(values, np.ndarray):
+        return values.__array_interface__['data'][0], values.shape, values.dtype.str
+    # extension arrays (nullable integers, categoricals) are kept by the frame as one object
+    return id(values)
+
+
+# this function returns build(df[column]), computed on first use and again after every change of
+# the column (every time without copy-on-write). Other modules cache their per-column structures
+# here too (tmdb.dates).
+def cached(df, column, build):
+    if not copy_on_write():
+        return build(df[column])
+    key = id(df)
+    entry = _memo.get(key)
+    if entry is None or entry[0]() is not df:
+        entry = _memo[key] = (weakref.ref(df, lambda _, key=key: _memo.pop(key, None)), {})
+    structures = entry[1]
+    series = df[column]
+    buffer = column_buffer(series)
+    found = structures.get((column, build))
+    if found is not None and found[1] == buffer:
+        return found[2]
+    structure = build(series)
+    structures[(column, build)] = (series, buffer, structure)
+    return structure
+
+
+# this function returns the SortedIndex of a column of df, built on first use and after every change of the column
+def sorted_index(df, column):
+    return cached(df, column, SortedIndex.from_series)
+
+
+# this function forgets the sorted indexes of df (or of every frame)
+def clear(df=None):
+    if df is None:
+        _memo.clear()
+    else:
+        _memo.pop(id(df), None)
+
+
+# this function returns the n movies with the largest values of a column, like df.nlargest(n, x)
+def top(df, x, n=10):
+    return df.iloc[sorted_index(df, x).largest(n)]
+
+
+# this function returns the n movies with the smallest values of a column, like df.nsmallest(n, x)
+def bottom(df, x, n=10):
+    return df.iloc[sorted_index(df, x).smallest(n)]
+
+
+# this function returns the find_minmax table of a column without any value: no highest or lowest
+# movie, so both columns are NaN
+def no_minmax(columns):
+    return pd.DataFrame(np.nan, index=columns, columns=['highest', 'lowest'], dtype=object)
+
+
+# this function returns the rows of the movies with the highest and the lowest value of a column, like find_minmax
+def minmax(df, x):
+    index = sorted_index(df, x)
+    if not len(index):
+        return no_minmax(df.columns)
+    high = pd.DataFrame(df.iloc[index.argmax()])
+    low = pd.DataFrame(df.iloc[index.argmin()])
+    return pd.concat([high, low], axis = 1)
+
+
+# this function returns the q quantile(s) of a column (0.99 is the 99th percentile)
+def quantile(df, x, q):
+    return sorted_index(df, x).quantile(q)